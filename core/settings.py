@@ -1,14 +1,21 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = 'django-insecure-dndoxxc*dr!@iy_)a-%q3ab@hmx+bh0we_(v9!)78rqt#!&hia'
 
+# Perfil de execução: DJANGO_ENV=production no deploy (gunicorn.conf.py)
+DJANGO_ENV = os.environ.get('DJANGO_ENV', 'development')
+PRODUCTION = DJANGO_ENV == 'production'
+
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True # Pode manter True para ver erros caso o deploy falhe, depois mude para False
+# Em produção fica desligado (DJANGO_DEBUG=1 liga para ver erros caso o deploy falhe)
+DEBUG = os.environ.get('DJANGO_DEBUG', '0' if PRODUCTION else '1') == '1'
 
 # LIBERANDO O SITE PARA O RENDER
 ALLOWED_HOSTS = ['*']
@@ -27,6 +34,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # <--- OBRIGATÓRIO PARA DEPLOY
+    'twitter.perf.PerformanceMiddleware', # Tempos por rota e Server-Timing (ver PERF_*)
+    'twitter.db_router.ReplicaMiddleware', # Leitura nas réplicas (ver DB_REPLICAS)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -41,27 +50,135 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
+        'APP_DIRS': not PRODUCTION,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'twitter.context_processors.sidebar',
             ],
         },
     },
 ]
+if PRODUCTION:
+    # Templates compilados uma vez por processo e nunca relidos do disco; o
+    # gunicorn.conf.py compila todos no mestre antes do fork (twitter/warmup.py)
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
 
 WSGI_APPLICATION = 'core.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# SQLite por padrão; DB_ENGINE=postgres para usar PostgreSQL (DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT).
+# Réplicas de leitura em DB_REPLICAS (hosts separados por vírgula), só com o Postgres:
+# cada host é um hot standby alimentado pela replicação por streaming do principal
+# (primary_conninfo). O SQLite não replica: um arquivo separado ficaria vazio ou velho.
+# Ver twitter/db_router.py.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_REPLICAS = [r for r in os.environ.get('DB_REPLICAS', '').split(',') if r]
+if DB_REPLICAS and DB_ENGINE != 'postgres':
+    raise ImproperlyConfigured('DB_REPLICAS exige DB_ENGINE=postgres com replicação por streaming; o SQLite não tem réplicas.')
+# Conexões persistentes (segundos). Sob ASGI use 0: cada requisição roda em outra thread.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', '60'))
+
+# WAL: leitores não bloqueiam o escritor. IMMEDIATE: a transação já pega o lock de
+# escrita no BEGIN, em vez de falhar com "database is locked" ao tentar escalar.
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL;'
+    'PRAGMA synchronous=NORMAL;' # Seguro com WAL; só perde a última transação se a máquina cair
+    'PRAGMA temp_store=MEMORY;'
+    'PRAGMA cache_size=-20000;' # ~20 MB por conexão
+    'PRAGMA mmap_size=134217728;'
+)
+
+
+def _database(host_or_path, replica=False):
+    if DB_ENGINE == 'postgres':
+        database = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'twitter'),
+            'USER': os.environ.get('DB_USER', 'postgres'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': host_or_path,
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'OPTIONS': {},
+        }
+        pool_size = int(os.environ.get('DB_POOL_MAX_SIZE', '0'))
+        if pool_size:
+            # Pool do psycopg (pip install "psycopg[pool]"); com pool o CONN_MAX_AGE tem que ser 0
+            database['OPTIONS']['pool'] = {'min_size': min(2, pool_size), 'max_size': pool_size, 'timeout': 10}
+            database['CONN_MAX_AGE'] = 0
+        else:
+            database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+    else:
+        database = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': host_or_path,
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                'init_command': SQLITE_PRAGMAS,
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20, # segundos esperando o lock antes de "database is locked"
+            },
+        }
+    database['CONN_HEALTH_CHECKS'] = True
+    if replica:
+        database['TEST'] = {'MIRROR': 'default'} # Nos testes a réplica é o próprio banco de teste
+    return database
+
+
+DATABASES = {'default': _database(os.environ.get('DB_HOST', 'localhost') if DB_ENGINE == 'postgres' else BASE_DIR / 'db.sqlite3')}
+for n, replica in enumerate(DB_REPLICAS, 1):
+    DATABASES[f'replica{n}'] = _database(replica, replica=True)
+
+DATABASE_ROUTERS = ['twitter.db_router.ReplicaRouter']
+# Views que leem das réplicas (nomes do urls.py); o resto lê do banco principal
+REPLICA_VIEWS = {'home', 'home_feed', 'profile', 'profile_feed', 'post_comments', 'search_users', 'search_autocomplete', 'followers_list', 'following_list'}
+# Depois de uma escrita, o usuário lê do principal por esse tempo (ler o que acabou de escrever)
+REPLICA_STICKY_SECONDS = 10
+
+# Cache (trending, sugestões; os cards têm alias próprio, ver POST_CARD_CACHE_TIMEOUT)
+# Em produção, CACHE_URL aponta para um Redis compartilhado pelos workers (ex.: redis://cache.internal:6379/0,
+# precisa do pacote redis). Sem ele, cada processo tem o seu LocMem, limitado a MAX_ENTRIES.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+
+
+def _cache(prefix, timeout, max_entries):
+    if CACHE_URL:
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL, 'KEY_PREFIX': prefix, 'TIMEOUT': timeout}
+    return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': prefix, 'TIMEOUT': timeout, 'OPTIONS': {'MAX_ENTRIES': max_entries}}
+
+
+CACHES = {
+    'default': _cache('default', 60 * 5, 5_000),
 }
 
+# Notificações gravadas em lote por um thread de fundo
+NOTIFICATIONS_ASYNC = os.environ.get('NOTIFICATIONS_ASYNC', '1') == '1' # Os testes gravam na hora (override_settings)
+NOTIFICATION_FLUSH_INTERVAL = 2.0 # segundos
+NOTIFICATION_BATCH_SIZE = 500
+NOTIFICATION_PAGE_SIZE = 30 # Por página em /notifications/
+# Manutenção (comando compact_notifications)
+NOTIFICATION_COMPACT_AFTER_DAYS = 7 # Lidas mais velhas que isso viram uma linha por (tipo, post)
+NOTIFICATION_RETENTION_DAYS = 90 # Mais velhas que isso são apagadas
+NOTIFICATION_COMPACT_BATCH = 500 # Linhas (ou grupos) por transação
+
+# Exclusão em segundo plano (comando reap_deleted, twitter/deletion.py)
+REAPER_BATCH_SIZE = 200 # Linhas por transação
+REAPER_THROTTLE = 1.0 # Dorme N vezes o tempo de cada lote: com 1.0, segura o lock de escrita no máximo metade do tempo
+REAPER_PAUSE = 0.05 # Espera mínima entre lotes (segundos)
+REAPER_MEDIA_GRACE_HOURS = 24 # sweep_media não apaga arquivos mais novos que isso (upload em andamento)
+
+# Tempo real (SSE em /events/). Desligado por padrão: o deploy é gunicorn/WSGI, onde /events/ só
+# responde 204, e o broker (twitter/events.py) é por processo. Ligue só servindo via ASGI num processo.
+REALTIME_EVENTS = os.environ.get('REALTIME_EVENTS', '0') == '1'
+EVENTS_KEEPALIVE = 20 # segundos entre comentários de keep-alive
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -95,8 +212,95 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Processamento de imagens (variantes WebP, blurhash) em um pool de threads
+MEDIA_ASYNC = os.environ.get('MEDIA_ASYNC', '1') == '1' # Os testes processam na hora (override_settings)
+MEDIA_WORKERS = 2
+
+# Entrega da mídia (twitter/serving.py). Atrás do nginx, use 'X-Accel-Redirect' com
+# um location internal em MEDIA_SENDFILE_PREFIX apontando para o MEDIA_ROOT
+MEDIA_SENDFILE_HEADER = os.environ.get('MEDIA_SENDFILE_HEADER') # ou 'X-Sendfile'
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24
+
+# Upload de vídeo em partes (twitter/uploads.py); as partes ficam fora do MEDIA_ROOT
+VIDEO_UPLOAD_TEMP_DIR = BASE_DIR / 'uploads_tmp'
+VIDEO_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+VIDEO_UPLOAD_MAX_SIZE = 512 * 1024 * 1024
+
 # Configurações de Usuário e Login
 AUTH_USER_MODEL = 'twitter.User'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'login'
-LOGIN_URL = 'login'
\ No newline at end of file
+LOGIN_URL = 'login'
+
+# Timeline da página inicial (fan-out na escrita)
+# Use 'twitter.timeline.LocMemTimelineBackend' para guardar as timelines em memória
+TIMELINE_BACKEND = 'twitter.timeline.DatabaseTimelineBackend'
+TIMELINE_MAX_LENGTH = 800 # Quantos posts cada timeline guarda
+TIMELINE_TRIM_SAMPLE_RATE = 0.02 # Fração dos fan-outs que corta as timelines que passaram do limite
+# Fan-out para os seguidores (e o corte amostrado) em um pool de threads, fora da requisição
+TIMELINE_ASYNC = os.environ.get('TIMELINE_ASYNC', '1') == '1' # Os testes fazem na hora (override_settings)
+TIMELINE_WORKERS = 2
+
+# Posts por página nos feeds (paginação por cursor)
+FEED_PAGE_SIZE = 20
+# Início, perfil e notificações em streaming (twitter/streaming.py): o topo da página sai antes da lista
+STREAMING_PAGES = True
+STREAM_CHUNK_SIZE = 5 # Itens por bloco enviado (e por leitura do .iterator())
+
+# Cards de post em cache (twitter/cards.py); a chave muda com Post.version
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Alias separado: milhares de cards não expulsam trending e sugestões do 'default' (~3 KB por card)
+CACHES['cards'] = _cache('cards', POST_CARD_CACHE_TIMEOUT, 5_000)
+COMMENT_PREVIEW_SIZE = 3 # Comentários mais recentes no card; o resto vem de /post/<id>/comments/
+COMMENT_PAGE_SIZE = 20
+
+# Grafo social em memória (twitter/graph.py), por processo
+SOCIAL_GRAPH_MAX_USERS = 100_000 # Arrays guardados (seguindo + seguidores, cada um conta)
+SOCIAL_GRAPH_TTL = 60 * 5 # segundos; pega escritas feitas por outros processos
+USER_LIST_PAGE_SIZE = 50 # Listas de seguidores/seguindo
+
+# Interações enviadas juntas pela fila do front (/interactions/batch/)
+INTERACTION_BATCH_MAX = 50
+
+# Entra no ETag das páginas (twitter/conditional.py): mude a cada deploy que altere templates
+ETAG_RELEASE = os.environ.get('RELEASE', '')
+
+# Resultados por página na busca
+SEARCH_PAGE_SIZE = 20
+
+# Assuntos do momento (recalculados pelo comando refresh_trends)
+TRENDS_WINDOW_HOURS = 24
+TRENDS_HALF_LIFE_HOURS = 6 # Um uso de 6 horas atrás vale metade de um uso agora
+TRENDS_TOP_K = 10
+TRENDS_CACHE_TIMEOUT = 60 * 5
+
+# Quem seguir (recalculado pelo comando compute_suggestions, twitter/suggestions.py)
+SUGGESTIONS_TOP_K = 10 # Linhas guardadas por usuário
+SUGGESTIONS_BATCH_SIZE = 500 # Usuários por transação
+SUGGESTIONS_WEIGHTS = {'follows': 1.0, 'likes': 0.5, 'engagement': 2.0} # Amigos de amigos, likes em comum, coengajamento
+SUGGESTIONS_MAX_LIKERS = 1000 # Posts com mais likes que isso não entram em "likes em comum"
+SUGGESTIONS_CACHE_TIMEOUT = 60 * 10
+
+# Instrumentação por requisição (twitter/perf.py); relatório em /perf/ (staff)
+# Fração das requisições medida em detalhe (os testes desligam com override_settings)
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', '0.05'))
+PERF_SERVER_TIMING = True
+PERF_SLOW_QUERY_MS = 100
+PERF_SLOW_QUERY_KEEP = 50
+PERF_DUPLICATE_THRESHOLD = 3 # Mesmo SQL repetido tantas vezes na requisição = suspeita de N+1
+PERF_WINDOW_MINUTES = 15
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_line': {'format': '%(asctime)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'perf': {'class': 'logging.StreamHandler', 'formatter': 'json_line'},
+    },
+    'loggers': {
+        'twitter.perf': {'handlers': ['perf'], 'level': os.environ.get('PERF_LOG_LEVEL', 'INFO'), 'propagate': False},
+    },
+}
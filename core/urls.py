@@ -1,12 +1,12 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from twitter import serving
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('twitter.urls')), # O Django vai procurar o arquivo que você acabou de mover
-]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Uploads servidos com Range/ETag (e X-Accel-Redirect/X-Sendfile, se configurado)
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serving.serve),
+]
\ No newline at end of file
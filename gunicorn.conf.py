@@ -0,0 +1,34 @@
+"""
+Configuração do gunicorn para produção: `DJANGO_ENV=production gunicorn core.wsgi`
+(o gunicorn lê este arquivo sozinho quando roda da raiz do projeto).
+
+Com `preload_app` o mestre importa o Django uma vez e aquece URLs e templates
+antes do fork (twitter/warmup.py); cada worker só abre a própria conexão com o
+banco. Um worker novo (reinício, `max_requests`, autoscaling) já atende a
+primeira requisição quente. Para medir: `python manage.py startup_benchmark`.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+# Recicla workers aos poucos (vazamentos de memória); o jitter evita reiniciar todos juntos
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    # No mestre, depois do preload e antes do fork dos workers
+    from django.db import connections
+    from twitter import warmup
+
+    timings = warmup.warm(database=False)
+    connections.close_all() # Nenhuma conexão aberta pode ser herdada pelos workers
+    server.log.info('Aquecido no mestre: %s', ', '.join(f'{name} {n} em {ms} ms' for name, (n, ms) in timings.items()))
+
+
+def post_fork(server, worker):
+    from twitter import warmup
+
+    warmup.connect()
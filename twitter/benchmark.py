@@ -0,0 +1,276 @@
+"""
+Benchmark das rotas do site (comando `benchmark`).
+
+As rotas vêm do próprio `twitter/urls.py`: cada padrão de URL vira um cenário,
+com os parâmetros (`username`, `post_id`, `name`) sorteados da base. As rotas
+de escrita que são toggles (like, retweet, seguir) rodam em pares, para a base
+terminar como começou. O resto das escritas fica de fora.
+
+Dois modos:
+- test client (padrão): roda no mesmo processo e mede, além da latência, as
+  queries e as linhas lidas do banco por requisição;
+- HTTP (`--base-url`, ou `--gunicorn` para subir um local): mede só a
+  latência vista pelo cliente, com servidor e middlewares reais.
+
+O resultado é um JSON (p50/p95/p99, média, queries e linhas por requisição)
+que serve de baseline para comparar commits (`--compare`).
+"""
+import contextlib
+import json
+import statistics
+import subprocess
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends import utils as db_utils
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+# Rotas que alteram dados e não são toggles (ou que não terminam, como o SSE)
+SKIP_ROUTES = {
+    'signup', 'login', 'logout', 'password_change', 'edit_profile', 'add_comment', 'delete_post',
+    'event_stream', 'video_upload_start', 'video_upload_chunk', 'perf_report', 'interactions_batch',
+}
+TOGGLE_ROUTES = {'like_post', 'retweet', 'follow_unfollow'}
+# Como o JS do site: like/retweet respondem JSON em vez de redirecionar
+HEADERS = {'X-Requested-With': 'XMLHttpRequest'}
+QUERY_STRINGS = {
+    'search_users': 'q=bom',
+    'search_autocomplete': 'q=lo',
+}
+
+
+def routes():
+    """[(nome, padrão)] das rotas do app, na ordem do urls.py."""
+    from . import urls
+
+    return [(p.name, p) for p in urls.urlpatterns if isinstance(p, URLPattern) and p.name and p.name not in SKIP_ROUTES]
+
+
+def sample_kwargs(pattern, user, rng):
+    """Valores reais da base para os parâmetros da rota."""
+    from .models import Hashtag, Post, User
+
+    kwargs = {}
+    for name in pattern.pattern.converters:
+        if name == 'username':
+            kwargs[name] = User.objects.filter(pk__in=user.following.values('pk')[:50]).values_list('username', flat=True).first() or user.username
+        elif name == 'post_id':
+            ids = list(Post.objects.exclude(author=user).filter(repost_of__isnull=True).order_by('-like_count').values_list('pk', flat=True)[:50])
+            if not ids:
+                return None # Nenhum post de outra pessoa: a rota fica fora da medição
+            kwargs[name] = rng.choice(ids)
+        elif name == 'name':
+            kwargs[name] = Hashtag.objects.values_list('name', flat=True).first() or 'django'
+        else:
+            return None
+    return kwargs
+
+
+@contextlib.contextmanager
+def count_rows():
+    """Conta as linhas que o Django buscou do banco (fetchone/fetchmany/fetchall)."""
+    counter = {'rows': 0}
+    originals = {}
+
+    def wrap(name):
+        def fetch(self, *args):
+            result = getattr(self.cursor, name)(*args)
+            if name == 'fetchone':
+                counter['rows'] += result is not None
+            else:
+                counter['rows'] += len(result)
+            return result
+        return fetch
+
+    for name in ('fetchone', 'fetchmany', 'fetchall'):
+        originals[name] = db_utils.CursorWrapper.__dict__.get(name)
+        setattr(db_utils.CursorWrapper, name, wrap(name))
+    try:
+        yield counter
+    finally:
+        for name, original in originals.items():
+            if original is None:
+                delattr(db_utils.CursorWrapper, name)
+            else:
+                setattr(db_utils.CursorWrapper, name, original)
+
+
+def percentile(samples, p):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[p - 1]
+
+
+def summarize(path, timings, queries, rows, statuses):
+    timings_ms = [t * 1000 for t in timings]
+    return {
+        'path': path,
+        'requests': len(timings),
+        'p50_ms': round(percentile(timings_ms, 50), 2),
+        'p95_ms': round(percentile(timings_ms, 95), 2),
+        'p99_ms': round(percentile(timings_ms, 99), 2),
+        'mean_ms': round(statistics.fmean(timings_ms), 2),
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+        'rows_per_request': round(statistics.fmean(rows), 2) if rows else None,
+        'statuses': sorted(set(statuses)),
+    }
+
+
+class ClientDriver:
+    """Requisições pelo test client, no mesmo processo (mede queries e linhas)."""
+    measures_db = True
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def get(self, path):
+        with CaptureQueriesContext(connection) as queries, count_rows() as rows:
+            start = time.perf_counter()
+            response = self.client.get(path, headers=HEADERS)
+            # Respostas em streaming só terminam quando o corpo é consumido
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        return elapsed, response.status_code, len(queries), rows['rows']
+
+
+class HTTPDriver:
+    """Requisições HTTP de verdade contra um servidor rodando (latência do cliente)."""
+    measures_db = False
+
+    def __init__(self, user, base_url):
+        client = Client()
+        client.force_login(user)
+        self.base_url = base_url.rstrip('/')
+        self.cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    def get(self, path):
+        request = urllib.request.Request(self.base_url + path, headers={'Cookie': self.cookie, **HEADERS})
+        start = time.perf_counter()
+        try:
+            with _opener.open(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            status = error.code
+        return time.perf_counter() - start, status, None, None
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Mede a rota em si, não a página para onde ela redireciona
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_opener = urllib.request.build_opener(_NoRedirect)
+
+
+def run(driver, user, rng, requests=50, warmup=5, only=None, log=print):
+    results = {}
+    for name, pattern in routes():
+        if only and name not in only:
+            continue
+        kwargs = sample_kwargs(pattern, user, rng)
+        if kwargs is None:
+            continue
+        path = reverse(name, kwargs=kwargs)
+        if name in QUERY_STRINGS:
+            path += '?' + QUERY_STRINGS[name]
+
+        # Toggles em pares: cada medição liga e desliga, e a base volta ao estado inicial
+        rounds = 2 if name in TOGGLE_ROUTES else 1
+        for _ in range(warmup * rounds):
+            driver.get(path)
+        timings, queries, rows, statuses = [], [], [], []
+        for _ in range(requests * rounds):
+            elapsed, status, n_queries, n_rows = driver.get(path)
+            timings.append(elapsed)
+            statuses.append(status)
+            if driver.measures_db:
+                queries.append(n_queries)
+                rows.append(n_rows)
+        results[name] = summarize(path, timings, queries, rows, statuses)
+        log(format_row(name, results[name]))
+    return results
+
+
+def format_row(name, result):
+    db = f"{result['queries_per_request']:>6} q {result['rows_per_request']:>9} linhas" if result['queries_per_request'] is not None else ''
+    return f"{name:<22} p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  {db}"
+
+
+def metadata(mode):
+    from .models import Comment, Notification, Post, User
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'mode': mode,
+        'database': connection.vendor,
+        'rows': {
+            'users': User.objects.count(),
+            'posts': Post.objects.count(),
+            'likes': Post.likes.through.objects.count(),
+            'follows': User.following.through.objects.count(),
+            'comments': Comment.objects.count(),
+            'notifications': Notification.objects.count(),
+        },
+    }
+
+
+def compare(baseline, current, threshold):
+    """Linhas de comparação e lista de regressões (p95 ou queries acima do limite)."""
+    lines, regressions = [], []
+    for name, now in current['routes'].items():
+        before = baseline.get('routes', {}).get(name)
+        if before is None:
+            lines.append(f'{name:<22} (nova rota)')
+            continue
+        change = (now['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0
+        line = f"{name:<22} p95 {before['p95_ms']:>8.2f} -> {now['p95_ms']:>8.2f}ms ({change:+.0%})"
+        if change > threshold:
+            regressions.append(f'{name}: p95 {change:+.0%}')
+        if now.get('queries_per_request') is not None and before.get('queries_per_request') is not None:
+            line += f"  queries {before['queries_per_request']} -> {now['queries_per_request']}"
+            if now['queries_per_request'] > before['queries_per_request']:
+                regressions.append(f"{name}: queries {before['queries_per_request']} -> {now['queries_per_request']}")
+        lines.append(line)
+    return lines, regressions
+
+
+@contextlib.contextmanager
+def gunicorn(port, workers):
+    """Sobe um gunicorn local com o projeto e espera ele responder."""
+    process = subprocess.Popen(
+        ['gunicorn', 'core.wsgi', '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning'],
+        cwd=settings.BASE_DIR,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base_url + reverse('login'), timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
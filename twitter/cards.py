@@ -0,0 +1,66 @@
+"""
+Cache dos cards de post.
+
+A parte do card que é igual para todo mundo (texto, mídia, contadores e os
+últimos `COMMENT_PREVIEW_SIZE` comentários) é renderizada uma vez e guardada
+no cache com a chave
+`card:<id>:<versão>:<criação>`, no alias `CACHES['cards']`. `Post.version` sobe a cada like, retweet,
+comentário, edição ou processamento de mídia, então uma chave nunca fica
+desatualizada: a versão nova simplesmente não está no cache ainda.
+
+O que depende de quem vê (coração/retweet marcados, botão de excluir,
+"Você retuitou", token CSRF) fica em `post_card.html`, por cima do HTML
+cacheado. Uma página do feed faz um único `get_many` no cache e só consulta
+os comentários dos cards que não estavam lá. A lista completa de comentários
+só é buscada quando a seção é aberta (view `post_comments`, paginada).
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Prefetch, prefetch_related_objects
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Comment
+
+CACHE_ALIAS = 'cards'
+
+
+def card_key(post):
+    # created_at protege contra ids reaproveitados (banco recriado com o cache ainda cheio)
+    return f'card:{post.pk}:{post.version}:{post.created_at.timestamp():.6f}'
+
+
+def _render(original_post):
+    context = {'original_post': original_post}
+    return (
+        render_to_string('twitter/partials/post_card_body.html', context),
+        render_to_string('twitter/partials/post_card_comments.html', context),
+    )
+
+
+def attach(posts):
+    """Preenche post.card_body e post.card_comments (do cache ou renderizando) e devolve a lista."""
+    originals = {}
+    for post in posts:
+        original = post.repost_of or post
+        originals.setdefault(card_key(original), original)
+    cache = caches[CACHE_ALIAS]
+    fragments = cache.get_many(list(originals))
+
+    missing = [original for key, original in originals.items() if key not in fragments]
+    if missing:
+        # Prefetch fatiado: o Django usa ROW_NUMBER() OVER (PARTITION BY post_id), uma query para todos
+        preview = Comment.objects.filter(author__deleted_at__isnull=True).select_related('author').order_by('-created_at', '-pk')[:settings.COMMENT_PREVIEW_SIZE]
+        prefetch_related_objects(missing, Prefetch('comments', queryset=preview, to_attr='comment_preview'))
+        rendered = {card_key(original): _render(original) for original in missing}
+        cache.set_many(rendered)
+        fragments.update(rendered)
+
+    for post in posts:
+        body, comments = fragments[card_key(post.repost_of or post)]
+        post.card_body, post.card_comments = mark_safe(body), mark_safe(comments)
+    return posts
+
+
+def forget(post):
+    caches[CACHE_ALIAS].delete(card_key(post))
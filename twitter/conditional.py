@@ -0,0 +1,137 @@
+"""
+Validadores HTTP (ETag) do feed, do perfil e das listas de seguidores.
+
+O ETag de uma página é um hash do que aparece nela, lido por consultas
+pequenas e indexadas, sem renderizar nada:
+
+- quem vê: id, nome e foto (menu lateral), não lidas (badge), assuntos em
+  alta e sugestões de quem seguir, os três do cache, e o segredo CSRF (o
+  login troca o segredo: sem ele, sair e entrar de novo daria 304 e o HTML
+  guardado mandaria o token velho em todo POST, com 403);
+- os posts da página: ids e `Post.version` do post e do original (a versão
+  sobe a cada like, retweet, comentário ou edição, inclusive os de quem vê),
+  numa consulta só;
+- no perfil, os dados e contadores do dono e o número de posts; nas listas,
+  os usuários da página.
+
+Com `If-None-Match` igual, o `@condition` do Django responde 304 antes da
+view rodar: sem EXISTS por post, cards, comentários nem template. Sem 304 a
+view reaproveita o que o ETag já leu (`memo`), e o custo extra é só a
+consulta das versões.
+
+O ETag é fraco (W/): o HTML muda a cada renderização pela máscara do token
+CSRF, mas é equivalente. Não há Last-Modified: likes e comentários mudam a
+página sem mudar nenhuma data, e um cliente que mandasse só
+If-Modified-Since receberia um 304 errado.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.middleware.csrf import get_token
+from django.shortcuts import get_object_or_404
+
+from . import notifications, suggestions, timeline, trends
+from .graph import graph
+from .models import Post, User
+from .pagination import decode_cursor, paginate
+
+
+def memo(request, key, compute):
+    """Calcula uma vez por requisição: o ETag e a view usam o mesmo resultado."""
+    store = request.__dict__.setdefault('_conditional_memo', {})
+    if key not in store:
+        store[key] = compute()
+    return store[key]
+
+
+def _etag(request, *parts):
+    user = request.user
+    get_token(request) # Garante o segredo em META['CSRF_COOKIE'] (sem máscara, estável até o próximo login)
+    viewer = (
+        request.META['CSRF_COOKIE'], settings.ETAG_RELEASE, user.pk, user.username, user.profile_pic.name, user.profile_pic_variants,
+        notifications.unread_count(user), trends.get_trending(), request.headers.get('x-requested-with'),
+        [(s.suggested_id, s.suggested.username, s.suggested.profile_pic.name, s.mutual_count) for s in suggestions.for_user(user)],
+    )
+    digest = hashlib.blake2b(repr((viewer, parts)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _versions(post_ids):
+    rows = Post.objects.filter(pk__in=post_ids).values_list('pk', 'version', 'repost_of__version')
+    return sorted(rows)
+
+
+def _user_state(user):
+    return (
+        user.pk, user.username, user.bio, user.profile_pic.name, user.cover_image.name,
+        user.profile_pic_variants, user.cover_image_variants, user.follower_count, user.following_count,
+    )
+
+
+# --- Dados compartilhados com as views ---
+
+def home_entries(request):
+    """(created_at, post_id) da página da timeline, com um a mais para saber se há próxima."""
+    return memo(request, 'home', lambda: timeline.get_backend().fetch(
+        request.user.id, limit=settings.FEED_PAGE_SIZE + 1, before=decode_cursor(request.GET.get('cursor')),
+    ))
+
+
+def profile_user(request, username):
+    return memo(request, ('user', username), lambda: get_object_or_404(User, username=username))
+
+
+def profile_keys(request, user):
+    """Chaves da página do perfil (pk, created_at e versões, sem o resto do post) e o próximo cursor."""
+    return memo(request, ('profile', user.pk), lambda: paginate(
+        Post.objects.filter(author=user).select_related('repost_of').only('created_at', 'version', 'repost_of__version'),
+        request.GET.get('cursor'), settings.FEED_PAGE_SIZE,
+    ))
+
+
+def post_count(request, user):
+    return memo(request, ('post_count', user.pk), lambda: Post.objects.filter(author=user).count())
+
+
+def list_users(request, ids):
+    """Uma página da lista de ids do grafo: (usuários, próximo cursor)."""
+    cursor = request.GET.get('cursor')
+    if cursor and not cursor.isdigit():
+        raise BadRequest('Cursor inválido.')
+
+    def compute():
+        page, next_cursor = graph.page(ids, int(cursor) if cursor else None, settings.USER_LIST_PAGE_SIZE)
+        by_id = User.objects.in_bulk(page)
+        return [by_id[pk] for pk in page if pk in by_id], next_cursor
+    return memo(request, ('list', cursor), compute)
+
+
+# --- ETags (etag_func do @condition) ---
+
+def home_etag(request):
+    if request.method not in ('GET', 'HEAD'):
+        return None # POST do formulário de post
+    entries = home_entries(request)
+    return _etag(request, 'home', entries, _versions([post_id for _, post_id in entries]))
+
+
+def profile_etag(request, username):
+    view_user = profile_user(request, username)
+    posts, _ = profile_keys(request, view_user)
+    versions = [(post.pk, post.version, post.repost_of and post.repost_of.version) for post in posts]
+    return _etag(request, 'profile', _user_state(view_user), post_count(request, view_user), request.user.following_count, versions)
+
+
+def followers_etag(request, username):
+    return _list_etag(request, username, 'followers', graph.followers)
+
+
+def following_etag(request, username):
+    return _list_etag(request, username, 'following', graph.following)
+
+
+def _list_etag(request, username, title, side):
+    view_user = profile_user(request, username)
+    users, next_cursor = list_users(request, side(view_user))
+    return _etag(request, title, next_cursor, [(u.pk, u.username, u.profile_pic.name, u.profile_pic_variants) for u in users])
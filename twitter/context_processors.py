@@ -0,0 +1,12 @@
+from django.conf import settings
+
+from . import suggestions, trends
+
+
+def sidebar(request):
+    """Dados da barra lateral direita. São funções: só consultam se o template usar."""
+    return {
+        'trending_tags': trends.get_trending,
+        'follow_suggestions': lambda: suggestions.for_user(request.user),
+        'realtime_events': settings.REALTIME_EVENTS,
+    }
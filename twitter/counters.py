@@ -0,0 +1,81 @@
+"""
+Contadores denormalizados de Post e User.
+
+Os incrementos são atômicos (UPDATE ... SET campo = campo + n), então duas
+requisições simultâneas não perdem contagem. `recount` recalcula tudo a
+partir das tabelas de origem para corrigir qualquer desvio.
+"""
+from django.db import connections, router
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def bump(model, pks, field, delta, touch=None):
+    """Soma `delta` ao contador `field` das linhas `pks` (nunca abaixo de zero).
+
+    `touch` é um campo de versão incrementado no mesmo UPDATE (ex.: 'version'
+    do Post, que invalida o card em cache).
+    """
+    if not pks or not delta:
+        return
+    expr = F(field) + delta if delta > 0 else Greatest(F(field) + delta, Value(0))
+    updates = {field: expr}
+    if touch:
+        updates[touch] = F(touch) + 1
+    model._base_manager.filter(pk__in=pks).update(**updates) # Sem o filtro de visíveis: UPDATE direto pela pk
+
+
+def bump_one(model, pk, field, delta, returning=None, touch=None):
+    """Como `bump`, para uma linha, devolvendo colunas dela já atualizadas.
+
+    Um único `UPDATE ... RETURNING` (SQLite 3.35+ e PostgreSQL) em vez de
+    UPDATE + SELECT. `returning`
+    são nomes de campos (padrão: o próprio contador). Retorna None se a linha
+    não existe ou se o manager padrão não a enxerga (post ou conta excluída):
+    o filtro de visíveis entra no próprio UPDATE, como subquery.
+    """
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    column = lambda name: qn(model._meta.get_field(name).column)
+    counter = column(field)
+    sets = [f'{counter} = CASE WHEN {counter} + %s < 0 THEN 0 ELSE {counter} + %s END']
+    if touch:
+        sets.append(f'{column(touch)} = {column(touch)} + 1')
+    visible_sql, visible_params = model._default_manager.filter(pk=pk).values('pk').query.get_compiler(connection=connection).as_sql()
+    pk_column = qn(model._meta.pk.column)
+    sql = 'UPDATE {} SET {} WHERE {} = %s AND {} IN ({}) RETURNING {}'.format(
+        qn(model._meta.db_table), ', '.join(sets), pk_column, pk_column, visible_sql,
+        ', '.join(column(name) for name in returning or (field,)),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [delta, delta, pk, *visible_params])
+        return cursor.fetchone()
+
+
+def _count(queryset, key):
+    subquery = queryset.filter(**{key: OuterRef('pk')}).order_by().values(key).annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+def recount(Post, User, Comment, post_ids=None, user_ids=None):
+    """Recalcula os contadores (todos, ou só dos ids informados). Retorna as linhas atualizadas.
+
+    Recebe os models como argumento (os testes passam os da app). As migrations
+    têm a própria cópia da consulta: não importam código da app.
+    """
+    Like = Post.likes.through
+    Follow = User.following.through
+
+    # Pelas pks, sem o filtro de visíveis: os signals contam todo retweet sem tombstone, mesmo de conta excluída
+    posts = Post.all_objects.all() if post_ids is None else Post.all_objects.filter(pk__in=post_ids)
+    users = User.all_objects.all() if user_ids is None else User.all_objects.filter(pk__in=user_ids)
+    updated = posts.update(
+        like_count=_count(Like.objects.all(), 'post_id'),
+        repost_count=_count(Post.all_objects.filter(deleted_at__isnull=True), 'repost_of_id'),
+        comment_count=_count(Comment.objects.all(), 'post_id'),
+    )
+    updated += users.update(
+        follower_count=_count(Follow.objects.all(), 'to_user_id'),
+        following_count=_count(Follow.objects.all(), 'from_user_id'),
+    )
+    return updated
@@ -0,0 +1,93 @@
+"""
+Leitura nas réplicas (settings.DB_REPLICAS), escrita no banco principal.
+
+As réplicas são hot standbys do Postgres, alimentados pela replicação por
+streaming do principal; o Django não copia dados para elas. Com SQLite não
+há réplicas (settings.py recusa DB_REPLICAS). `REPLICA_STICKY_SECONDS`
+precisa ficar acima do atraso normal da replicação.
+
+- Escritas sempre vão para o 'default'.
+- Só as views de `REPLICA_VIEWS` (GET/HEAD) leem de uma réplica, sorteada uma
+  vez por requisição para não misturar réplicas com atrasos diferentes.
+- Ler o que acabou de escrever:
+  - depois da primeira escrita na requisição, o resto dela lê do principal;
+  - dentro de uma transação no principal, também;
+  - quem escreveu recebe um cookie e lê do principal por
+    `REPLICA_STICKY_SECONDS`, para ver o próprio post, like ou follow mesmo
+    com a réplica atrasada.
+- Fora de uma requisição (comandos, threads de fundo) tudo vai para o principal.
+- Sessões são sempre lidas do principal: uma sessão ainda não replicada
+  deslogaria o usuário logo depois do login.
+
+Sem réplicas configuradas, o roteador sempre responde 'default'.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'db_primary'
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+class _State:
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+_state = contextvars.ContextVar('db_routing', default=None)
+
+
+def replicas():
+    return [f'replica{n}' for n in range(1, len(settings.DB_REPLICAS) + 1)]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.replica is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # Réplicas têm os mesmos dados do principal
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Sem reset no fim: respostas em streaming ainda consultam o banco depois que o
+        # middleware retorna. A próxima requisição da thread começa com um estado novo.
+        state = _State()
+        _state.set(state)
+        response = self.get_response(request)
+        if state.wrote:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        aliases = replicas()
+        if (
+            aliases
+            and request.method in ('GET', 'HEAD')
+            and request.resolver_match.url_name in settings.REPLICA_VIEWS
+            and STICKY_COOKIE not in request.COOKIES
+        ):
+            _state.get().replica = random.choice(aliases)
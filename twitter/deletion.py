@@ -0,0 +1,308 @@
+"""
+Exclusão de posts e contas: tombstone na hora, remoção em segundo plano.
+
+O `post.delete()` na requisição apagava tudo em cascata de uma vez
+(comentários, likes, notificações, entradas de timeline, o SET NULL dos
+retweets) e segurava o lock de escrita do SQLite pelo tempo todo: um post
+viral ou uma conta com anos de histórico travavam o worker e as escritas dos
+outros.
+
+Agora excluir só grava `deleted_at` numa linha. Os managers padrão
+(`Post.objects`, `User.objects`) já escondem o conteúdo na hora: o post, os
+retweets dele, os posts de uma conta excluída, o perfil e o login dela.
+
+O comando `reap_deleted` (`reap`) apaga de verdade, em lotes de
+`REAPER_BATCH_SIZE` linhas, cada lote na sua transação curta e com DELETE
+direto pela pk (sem o coletor de cascata). Entre um lote e outro ele dorme
+`REAPER_THROTTLE` vezes o tempo que o lote levou (no mínimo `REAPER_PAUSE`):
+com 1.0 o reaper fica com o lock no máximo metade do tempo, e mais devagar
+justamente quando o banco está lento.
+
+Ordem:
+
+1. contas excluídas: os posts delas ganham tombstone; comentários, likes,
+   ligações de seguir, notificações e sugestões de quem seguir delas saem,
+   corrigindo os contadores do outro lado (posts comentados, seguidores...);
+2. posts excluídos: primeiro os retweets, depois comentários, likes,
+   hashtags, notificações e entradas de timeline, e por fim a linha (os
+   signals de delete ainda rodam: busca, card, timeline em memória). Depois
+   do commit os arquivos do post (original e variantes) saem do storage;
+3. as linhas das contas, e as fotos delas.
+
+`sweep_media` apaga do MEDIA_ROOT os arquivos que nenhuma linha usa (de
+exclusões antigas ou uploads abandonados), com uma carência de
+`REAPER_MEDIA_GRACE_HOURS` para não pegar um upload ainda em andamento.
+
+Comentários de uma conta excluída que já estão no cache de um card só somem
+quando o reaper passa (a versão do post sobe junto com o contador).
+"""
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import counters, media, notifications
+from .graph import graph
+from .models import Comment, FollowSuggestion, Notification, Post, PostHashtag, TimelineEntry, User, VideoUpload
+
+FILE_FIELDS = {Post: ('image', 'video'), User: ('profile_pic', 'cover_image')}
+
+
+def delete_post(post):
+    """Exclui um post ou retweet (só o tombstone). Retorna False se já estava excluído."""
+    with transaction.atomic():
+        deleted = Post.all_objects.filter(pk=post.pk, deleted_at__isnull=True).update(deleted_at=timezone.now())
+        if deleted and post.repost_of_id:
+            # O signal de delete não desconta de novo um retweet que já tinha tombstone
+            counters.bump(Post, [post.repost_of_id], 'repost_count', -1, touch='version')
+    return bool(deleted)
+
+
+def delete_user(user):
+    """Exclui uma conta (só o tombstone): perfil, posts e login somem na hora."""
+    return bool(User.all_objects.filter(pk=user.pk, deleted_at__isnull=True).update(deleted_at=timezone.now(), is_active=False))
+
+
+def _delete_rows(model, pks):
+    """DELETE direto pelas pks, sem signals nem coletor de cascata: quem chama já cuidou dos dependentes."""
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {qn(model._meta.db_table)} WHERE {qn(model._meta.pk.column)} IN ({placeholders})', pks)
+        return cursor.rowcount
+
+
+def _bump_grouped(model, ids, field, touch=None):
+    """Desconta uma vez por ocorrência: um UPDATE por valor distinto de desconto."""
+    by_delta = {}
+    for pk, n in Counter(ids).items():
+        by_delta.setdefault(n, []).append(pk)
+    for n, pks in by_delta.items():
+        counters.bump(model, pks, field, -n, touch=touch)
+
+
+def _files(instance):
+    """Arquivos de mídia da linha: originais (menos o padrão do campo) e variantes."""
+    names = set()
+    for field_name in FILE_FIELDS[type(instance)]:
+        field_file = getattr(instance, field_name)
+        if field_file and field_file.name != instance._meta.get_field(field_name).default:
+            names.add(field_file.name)
+            names |= media.variant_names(getattr(instance, f'{field_name}_variants'))
+    return names
+
+
+class Reaper:
+    def __init__(self, batch_size=None, throttle=None, pause=None):
+        self.batch_size = batch_size or settings.REAPER_BATCH_SIZE
+        self.throttle = settings.REAPER_THROTTLE if throttle is None else throttle
+        self.pause = settings.REAPER_PAUSE if pause is None else pause
+        self.counts = Counter() # Linhas apagadas por tabela (e arquivos em 'files')
+
+    def _wait(self, started):
+        time.sleep(max(self.pause, (time.monotonic() - started) * self.throttle))
+
+    def _batches(self, queryset, fields, apply):
+        """Chama `apply(rows)` com lotes de (pk, *fields) de `queryset` até não sobrar nada.
+
+        Cada lote na sua transação; `apply` precisa tirar as linhas do queryset.
+        """
+        while True:
+            started = time.monotonic()
+            with transaction.atomic():
+                rows = list(queryset.values_list('pk', *fields)[:self.batch_size])
+                if rows:
+                    apply(rows)
+            if not rows:
+                return
+            self._wait(started)
+
+    def _drain(self, queryset, *fields, after=None):
+        """Apaga as linhas do queryset em lotes; `after(rows)` roda na mesma transação."""
+        model = queryset.model
+
+        def apply(rows):
+            self.counts[model._meta.db_table] += _delete_rows(model, [row[0] for row in rows])
+            if after is not None:
+                after(rows)
+        self._batches(queryset, fields, apply)
+
+    def _drain_notifications(self, queryset):
+        def after(rows):
+            notifications.recount_unread({to_user_id for _, to_user_id, is_read in rows if not is_read})
+        self._drain(queryset, 'to_user_id', 'is_read', after=after)
+
+    def _remove_files(self, names):
+        for name in names:
+            default_storage.delete(name)
+        self.counts['files'] += len(names)
+
+    # --- Contas ---
+
+    def user_content(self, user_id):
+        """Passo 1: tira tudo o que a conta deixou no conteúdo dos outros."""
+        def tombstone(rows):
+            Post.all_objects.filter(pk__in=[pk for pk, _ in rows]).update(deleted_at=timezone.now())
+            _bump_grouped(Post, [source for _, source in rows if source], 'repost_count', touch='version')
+        self._batches(Post.all_objects.filter(author_id=user_id, deleted_at__isnull=True), ('repost_of_id',), tombstone)
+
+        self._drain(
+            Comment.objects.filter(author_id=user_id), 'post_id',
+            after=lambda rows: _bump_grouped(Post, [post_id for _, post_id in rows], 'comment_count', touch='version'),
+        )
+        self._drain(
+            Post.likes.through.objects.filter(user_id=user_id), 'post_id',
+            after=lambda rows: _bump_grouped(Post, [post_id for _, post_id in rows], 'like_count', touch='version'),
+        )
+
+        Follow = User.following.through
+
+        def unfollow(rows, field, edge):
+            # Cada outro lado aparece uma vez só (a ligação é única)
+            others = [other for _, other in rows]
+            counters.bump(User, others, field, -1)
+            edges = [edge(other) for other in others]
+            transaction.on_commit(lambda: graph.remove_edges(edges))
+        self._drain(
+            Follow.objects.filter(from_user_id=user_id), 'to_user_id',
+            after=lambda rows: unfollow(rows, 'follower_count', lambda other: (user_id, other)),
+        )
+        self._drain(
+            Follow.objects.filter(to_user_id=user_id), 'from_user_id',
+            after=lambda rows: unfollow(rows, 'following_count', lambda other: (other, user_id)),
+        )
+
+        self._drain_notifications(Notification.objects.filter(from_user_id=user_id))
+        self._drain(Notification.objects.filter(to_user_id=user_id))
+        self._drain(TimelineEntry.objects.filter(user_id=user_id))
+        # Uma conta popular está nas sugestões de quase todo mundo
+        self._drain(FollowSuggestion.objects.filter(suggested_id=user_id))
+        self._drain(FollowSuggestion.objects.filter(user_id=user_id))
+
+    def user(self, user_id):
+        """Passo 3: a linha da conta (os posts já foram) e as fotos."""
+        with transaction.atomic():
+            user = User.all_objects.filter(pk=user_id).first()
+            if user is None:
+                return
+            files = _files(user)
+            self.counts[User._meta.db_table] += user.delete()[1].get(User._meta.label, 0)
+        graph.forget(user_id)
+        self._remove_files(files)
+
+    # --- Posts ---
+
+    def post(self, post_id):
+        """Passo 2: os retweets, os dependentes e a linha do post."""
+        reposts = Post.all_objects.filter(repost_of_id=post_id)
+        while repost_ids := list(reposts.values_list('pk', flat=True)[:self.batch_size]):
+            for repost_id in repost_ids:
+                self.post(repost_id)
+
+        self._drain(Comment.objects.filter(post_id=post_id))
+        self._drain(Post.likes.through.objects.filter(post_id=post_id))
+        self._drain(PostHashtag.objects.filter(post_id=post_id))
+        self._drain_notifications(Notification.objects.filter(post_id=post_id))
+        self._drain(TimelineEntry.objects.filter(post_id=post_id))
+
+        started = time.monotonic()
+        with transaction.atomic():
+            post = Post.all_objects.filter(pk=post_id).first()
+            if post is None:
+                return
+            files = _files(post)
+            # Sobras que chegaram no meio (um like atrasado) vão na cascata, que agora é pequena
+            self.counts[Post._meta.db_table] += post.delete()[1].get(Post._meta.label, 0)
+        self._remove_files(files)
+        self._wait(started)
+
+    def run(self):
+        deleted_users = User.all_objects.filter(deleted_at__isnull=False)
+        user_ids = list(deleted_users.order_by('pk').values_list('pk', flat=True))
+        for user_id in user_ids:
+            self.user_content(user_id)
+        tombstones = Post.all_objects.filter(deleted_at__isnull=False).order_by('pk')
+        while post_ids := list(tombstones.values_list('pk', flat=True)[:self.batch_size]):
+            for post_id in post_ids:
+                self.post(post_id)
+        for user_id in user_ids:
+            self.user(user_id)
+        return self.counts
+
+
+def reap(batch_size=None, throttle=None, pause=None):
+    """Apaga de vez as contas e os posts excluídos. Retorna {tabela: linhas apagadas, 'files': arquivos}."""
+    return Reaper(batch_size, throttle, pause).run()
+
+
+def purge_users(users, batch_size=None):
+    """Apaga de vez as contas do queryset e tudo o que é delas ou aponta para elas, sem tombstone.
+
+    Para dados descartáveis (carga sintética do `generate_load --clear`): os
+    mesmos DELETEs diretos em lotes do reaper, dependentes primeiro, sem pausa
+    entre os lotes. Não corrige os contadores do outro lado: rode `recount`
+    depois. Retorna {tabela: linhas apagadas}.
+    """
+    reaper = Reaper(batch_size, throttle=0, pause=0)
+    user_ids = users.values('pk')
+    # Retweets de outras pessoas dos posts dessas contas também saem (o SET NULL os deixaria vazios)
+    posts = Post.all_objects.filter(Q(author_id__in=user_ids) | Q(repost_of__author_id__in=user_ids))
+    post_ids = posts.values('pk')
+    Follow, Like = User.following.through, Post.likes.through
+
+    for model in (Comment, Like, PostHashtag, TimelineEntry):
+        reaper._drain(model.objects.filter(post_id__in=post_ids))
+    reaper._drain_notifications(Notification.objects.filter(post_id__in=post_ids))
+    reaper._drain(Comment.objects.filter(author_id__in=user_ids))
+    reaper._drain(Like.objects.filter(user_id__in=user_ids))
+    reaper._drain(Follow.objects.filter(Q(from_user_id__in=user_ids) | Q(to_user_id__in=user_ids)))
+    reaper._drain_notifications(Notification.objects.filter(Q(from_user_id__in=user_ids) | Q(to_user_id__in=user_ids)))
+    reaper._drain(TimelineEntry.objects.filter(user_id__in=user_ids))
+    reaper._drain(FollowSuggestion.objects.filter(Q(user_id__in=user_ids) | Q(suggested_id__in=user_ids)))
+    reaper._drain(VideoUpload.objects.filter(user_id__in=user_ids))
+    for through in (User.groups.through, User.user_permissions.through):
+        reaper._drain(through.objects.filter(user_id__in=user_ids))
+    reaper._drain(posts.filter(repost_of__isnull=False))
+    reaper._drain(posts)
+    reaper._drain(User.all_objects.filter(pk__in=user_ids))
+    graph.forget()
+    return reaper.counts
+
+
+def _referenced_files():
+    names = set()
+    for model, field_names in FILE_FIELDS.items():
+        columns = [name for field_name in field_names for name in (field_name, f'{field_name}_variants')]
+        for row in model._base_manager.values_list(*columns).iterator(chunk_size=2000):
+            for name, variants in zip(row[::2], row[1::2]):
+                if name:
+                    names.add(name)
+                    names |= media.variant_names(variants)
+    return names
+
+
+def sweep_media(grace_hours=None):
+    """Apaga do MEDIA_ROOT os arquivos de upload que nenhuma linha usa. Retorna quantos."""
+    grace_hours = settings.REAPER_MEDIA_GRACE_HOURS if grace_hours is None else grace_hours
+    cutoff = timezone.now() - timedelta(hours=grace_hours)
+    referenced = _referenced_files()
+    directories = {model._meta.get_field(name).upload_to.strip('/') for model, names in FILE_FIELDS.items() for name in names}
+    removed = 0
+    for directory in sorted(directories):
+        try:
+            _, filenames = default_storage.listdir(directory)
+        except FileNotFoundError:
+            continue
+        for filename in filenames:
+            name = f'{directory}/{filename}'
+            if name in referenced or default_storage.get_modified_time(name) > cutoff:
+                continue
+            default_storage.delete(name)
+            removed += 1
+    return removed
@@ -0,0 +1,66 @@
+"""
+Eventos em tempo real enviados por Server-Sent Events (SSE).
+
+Cada conexão aberta em `/events/` assina uma `asyncio.Queue` do usuário. O
+código síncrono (views, thread de notificações) publica com `publish()`, que
+entrega a mensagem no event loop de cada assinante via `call_soon_threadsafe`.
+
+Conexões ociosas custam só uma fila e um timer de keep-alive.
+
+Limites: o broker é local ao processo (sem Redis pub/sub nem LISTEN/NOTIFY),
+então um evento só chega às conexões abertas no processo que o publicou. O
+deploy padrão (gunicorn/WSGI, vários workers) não serve SSE nenhum, e por isso
+o recurso vem desligado (`REALTIME_EVENTS`): a página não abre o EventSource e
+o badge se atualiza na próxima navegação. Ligue só servindo via ASGI
+(`core.asgi`) num processo único.
+"""
+import asyncio
+import threading
+
+QUEUE_SIZE = 100 # Cliente lento perde eventos em vez de acumular memória
+
+
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user_id -> {(loop, queue)}
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_put, queue, (event, data))
+            except RuntimeError:
+                pass # Loop já fechado; a conexão será removida no finally do stream
+
+    def publish_many(self, user_ids, event, data):
+        with self._lock:
+            targets = [uid for uid in user_ids if uid in self._subscribers]
+        for user_id in targets:
+            self.publish(user_id, event, data)
+
+
+def _put(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        pass
+
+
+broker = EventBroker()
+publish = broker.publish
+publish_many = broker.publish_many
@@ -1,19 +1,24 @@
+import copy
+
 from django import forms
+from django.core.exceptions import BadRequest
 from django.contrib.auth.forms import UserCreationForm
+from . import uploads
 from .models import User, Post
 
+SIGNUP_INPUT_CLASS = 'w-full bg-transparent border border-gray-300 dark:border-gray-600 p-4 rounded-xl outline-none focus:ring-2 focus:ring-blue-500 dark:text-white transition-all placeholder-gray-500'
+
 # Formulário de Cadastro Inicial
 class CustomUserCreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('username', 'email')
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        for field in self.fields.values():
-            field.widget.attrs.update({
-                'class': 'w-full bg-transparent border border-gray-300 dark:border-gray-600 p-4 rounded-xl outline-none focus:ring-2 focus:ring-blue-500 dark:text-white transition-all placeholder-gray-500'
-            })
+# As classes vão nos campos da classe, uma vez na importação; cada formulário só copia
+# os campos prontos. Cópias: os campos de senha são os mesmos objetos do UserCreationForm (admin)
+CustomUserCreationForm.base_fields = copy.deepcopy(CustomUserCreationForm.base_fields)
+for _field in CustomUserCreationForm.base_fields.values():
+    _field.widget.attrs['class'] = SIGNUP_INPUT_CLASS
 
 # Formulário de Edição de Perfil
 class UserUpdateForm(forms.ModelForm):
@@ -38,6 +43,9 @@ class UserUpdateForm(forms.ModelForm):
 
 # Formulário de Postagem
 class PostForm(forms.ModelForm): 
+    # Id de um upload de vídeo em partes já concluído (ver twitter/uploads.py)
+    video_upload = forms.UUIDField(required=False, widget=forms.HiddenInput(attrs={'id': 'input-video-upload'}))
+
     class Meta:
         model = Post
         fields = ['content', 'image', 'video'] 
@@ -47,4 +55,14 @@ class PostForm(forms.ModelForm):
                 'placeholder': 'O que está acontecendo?',
                 'rows': '3'
             }),
-        }
\ No newline at end of file
+        }
+
+    def clean_video(self):
+        # Vídeo enviado direto no formulário passa pela mesma lista do upload em partes
+        video = self.cleaned_data.get('video')
+        if video and hasattr(video, 'content_type'):
+            try:
+                uploads.check_video_type(video.name, video.content_type)
+            except BadRequest as e:
+                raise forms.ValidationError(str(e))
+        return video
@@ -0,0 +1,163 @@
+"""
+Grafo social em memória (quem segue quem), por processo.
+
+Cada usuário consultado vira dois `array('i')` ordenados: os ids que ele
+segue e os ids dos seus seguidores (4 bytes por ligação). Com eles:
+
+- `is_following` é uma busca binária;
+- interseções (seguidores em comum, "seguido por quem você segue") percorrem
+  a lista menor fazendo busca binária na maior;
+- as listas de seguidores/seguindo são paginadas pelo id, sem OFFSET.
+
+Os arrays são carregados da tabela do M2M `following` sob demanda, guardados
+num LRU (`SOCIAL_GRAPH_MAX_USERS`) com validade (`SOCIAL_GRAPH_TTL`) e
+atualizados na escrita (signals, depois do commit). Os arrays nunca são
+alterados no lugar: cada escrita troca por uma cópia, então uma leitura em
+andamento não vê um array pela metade.
+
+Quando a consulta recebe o objeto `User`, o tamanho do array é conferido com
+os contadores denormalizados (`following_count`/`follower_count`), que vêm
+do banco a cada requisição: se outro processo mudou as ligações desse
+usuário, o array é recarregado na hora em vez de esperar o TTL.
+"""
+import bisect
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def intersect(a, b):
+    """Interseção de dois arrays ordenados, em ordem."""
+    small, large = (a, b) if len(a) <= len(b) else (b, a)
+    result = []
+    for value in small:
+        i = bisect.bisect_left(large, value)
+        if i < len(large) and large[i] == value:
+            result.append(value)
+    return result
+
+
+class _Side:
+    """Um lado do grafo (seguindo ou seguidores): LRU de user_id -> (array, carregado em)."""
+
+    def __init__(self, own, other, count_field):
+        self.own, self.other, self.count_field = own, other, count_field
+        self.entries = OrderedDict()
+
+    def load(self, user_id):
+        from .models import User
+
+        Follow = User.following.through
+        ids = Follow.objects.filter(**{self.own: user_id}).values_list(self.other, flat=True)
+        return array('i', sorted(ids))
+
+
+class SocialGraph:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.following_side = _Side('from_user_id', 'to_user_id', 'following_count')
+        self.followers_side = _Side('to_user_id', 'from_user_id', 'follower_count')
+
+    def _get(self, side, user):
+        user_id = getattr(user, 'pk', user)
+        expected = getattr(user, side.count_field, None)
+        now = time.monotonic()
+        with self.lock:
+            entry = side.entries.get(user_id)
+            if entry is not None:
+                ids, loaded_at = entry
+                if now - loaded_at < settings.SOCIAL_GRAPH_TTL and (expected is None or expected == len(ids)):
+                    side.entries.move_to_end(user_id)
+                    return ids
+        ids = side.load(user_id) # Fora do lock: duas cargas simultâneas só repetem trabalho
+        with self.lock:
+            side.entries[user_id] = (ids, now)
+            side.entries.move_to_end(user_id)
+            while len(side.entries) > settings.SOCIAL_GRAPH_MAX_USERS:
+                side.entries.popitem(last=False)
+        return ids
+
+    def following(self, user):
+        """Ids que o usuário segue (array ordenado). Aceita um User ou um id."""
+        return self._get(self.following_side, user)
+
+    def followers(self, user):
+        """Ids dos seguidores do usuário (array ordenado). Aceita um User ou um id."""
+        return self._get(self.followers_side, user)
+
+    def is_following(self, user, target):
+        ids = self.following(user)
+        target_id = getattr(target, 'pk', target)
+        i = bisect.bisect_left(ids, target_id)
+        return i < len(ids) and ids[i] == target_id
+
+    def following_count(self, user):
+        return len(self.following(user))
+
+    def follower_count(self, user):
+        return len(self.followers(user))
+
+    def mutuals(self, user):
+        """Quem o usuário segue e também o segue de volta."""
+        return intersect(self.following(user), self.followers(user))
+
+    def followed_by_followed(self, viewer, target):
+        """Seguidores do `target` que o `viewer` segue ("Seguido por ...")."""
+        return intersect(self.following(viewer), self.followers(target))
+
+    def page(self, ids, after=None, limit=50):
+        """Uma página de um array ordenado a partir do id `after` (exclusivo): (ids, próximo cursor)."""
+        start = bisect.bisect_right(ids, after) if after is not None else 0
+        chunk = list(ids[start:start + limit])
+        next_after = chunk[-1] if start + limit < len(ids) else None
+        return chunk, next_after
+
+    # --- Escrita ---
+
+    def _update(self, side, user_id, values, add):
+        entry = side.entries.get(user_id)
+        if entry is None:
+            return # Não está na memória: a próxima leitura carrega do banco
+        ids, loaded_at = entry
+        updated = array('i', ids)
+        for value in values:
+            i = bisect.bisect_left(updated, value)
+            present = i < len(updated) and updated[i] == value
+            if add and not present:
+                updated.insert(i, value)
+            elif not add and present:
+                del updated[i]
+        side.entries[user_id] = (updated, loaded_at)
+
+    def add_edges(self, edges):
+        """Aplica ligações novas [(seguidor, seguido)] nos arrays que estão em memória."""
+        self._apply(edges, add=True)
+
+    def remove_edges(self, edges):
+        self._apply(edges, add=False)
+
+    def _apply(self, edges, add):
+        by_follower, by_followed = {}, {}
+        for follower, followed in edges:
+            by_follower.setdefault(follower, []).append(followed)
+            by_followed.setdefault(followed, []).append(follower)
+        with self.lock:
+            for user_id, values in by_follower.items():
+                self._update(self.following_side, user_id, values, add)
+            for user_id, values in by_followed.items():
+                self._update(self.followers_side, user_id, values, add)
+
+    def forget(self, user_id=None):
+        """Descarta um usuário (ou tudo) da memória."""
+        with self.lock:
+            for side in (self.following_side, self.followers_side):
+                if user_id is None:
+                    side.entries.clear()
+                else:
+                    side.entries.pop(user_id, None)
+
+
+graph = SocialGraph()
@@ -0,0 +1,183 @@
+"""
+Interações (like, retweet, seguir, comentar) como operações atômicas.
+
+Cada função roda numa transação e decide pelo próprio banco, sem "ler e
+depois escrever":
+
+- desligar é um DELETE condicional; ligar é um INSERT que ignora conflito
+  com a chave única (`INSERT ... ON CONFLICT DO NOTHING`). O número de linhas
+  afetadas diz se algo mudou, então duas requisições simultâneas nunca
+  contam um like duas vezes;
+- o contador sobe ou desce no mesmo `UPDATE ... RETURNING` que devolve o
+  valor novo (e o autor, para a notificação);
+- `value=None` alterna; `value=True/False` fixa o estado final, o que torna
+  a operação idempotente (a fila do front pode reenviar sem efeito).
+
+Like e follow gravam direto na tabela do M2M, sem os m2m_changed: os efeitos
+dos signals (contadores, timeline, grafo) são feitos aqui mesmo. Retweet e
+comentário continuam pelo ORM, porque criam posts/comentários de verdade.
+
+Um post ou usuário inexistente ou excluído (tombstone) levanta
+`DoesNotExist` e desfaz a transação, inclusive a ligação já inserida.
+Chamadas dentro de outra transação (o lote) usam a de fora, sem savepoint.
+"""
+from django.db import IntegrityError, connections, router, transaction
+
+from . import counters, notifications, timeline
+from .graph import graph
+from .models import Comment, Post, User
+
+
+def _insert_ignore(model, **values):
+    """INSERT que não falha se a linha já existe. Retorna True se inseriu."""
+    connection = connections[router.db_for_write(model)]
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(model._meta.get_field(name).column) for name in values)
+    placeholders = ', '.join(['%s'] * len(values))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(model._meta.db_table)} ({columns}) VALUES ({placeholders}) ON CONFLICT DO NOTHING',
+            list(values.values()),
+        )
+        return cursor.rowcount == 1
+
+
+def _toggle(model, value, **values):
+    """Aplica o toggle numa tabela de ligação. Retorna (ligado, delta)."""
+    removed = model.objects.filter(**values).delete()[0] if value is not True else 0
+    if removed or value is False:
+        return False, -removed
+    return True, int(_insert_ignore(model, **values))
+
+
+def like(user, post_id, value=None):
+    """Retorna {'liked', 'count'}."""
+    Like = Post.likes.through
+    with transaction.atomic(savepoint=False):
+        liked, delta = _toggle(Like, value, post_id=post_id, user_id=user.pk)
+        if delta:
+            row = counters.bump_one(Post, post_id, 'like_count', delta, returning=('like_count', 'author_id'), touch='version')
+        else:
+            row = Post.objects.filter(pk=post_id).values_list('like_count', 'author_id').first()
+        if row is None:
+            raise Post.DoesNotExist
+    count, author_id = row
+    if delta > 0:
+        notifications.notify(author_id, user.pk, 'L', post_id)
+    elif delta < 0:
+        notifications.cancel(author_id, user.pk, 'L', post_id)
+    return {'liked': liked, 'count': count}
+
+
+def retweet(user, post_id, value=None):
+    """Retweeta sempre o post original. Retorna {'retweeted', 'count', 'post_id'}."""
+    # Uma leitura só: o post e, se ele mesmo for um retweet, o original
+    row = Post.objects.filter(pk=post_id).values_list(
+        'repost_of_id', 'repost_count', 'author_id', 'repost_of__repost_count', 'repost_of__author_id',
+    ).first()
+    if row is None:
+        raise Post.DoesNotExist
+    source_id, count, author_id = (row[0], row[3], row[4]) if row[0] else (post_id, row[1], row[2])
+
+    with transaction.atomic(savepoint=False):
+        removed, created = 0, False
+        if value is not True:
+            # A constraint unique_author_repost garante no máximo uma linha
+            removed = Post.all_objects.filter(author=user, repost_of_id=source_id, deleted_at__isnull=True).delete()[1].get(Post._meta.label, 0)
+        if not removed and value is not False:
+            try:
+                with transaction.atomic():
+                    Post.objects.create(author=user, repost_of_id=source_id) # O signal soma repost_count
+                created = True
+            except IntegrityError:
+                pass # Já existia (outra requisição chegou antes)
+
+    if created:
+        notifications.notify(author_id, user.pk, 'R', source_id)
+    elif removed:
+        notifications.cancel(author_id, user.pk, 'R', source_id)
+    retweeted = not removed and value is not False
+    return {'retweeted': retweeted, 'count': max(count + created - removed, 0), 'post_id': source_id}
+
+
+def follow(user, target_id, value=None):
+    """Retorna {'following', 'followers'} (seguidores do alvo)."""
+    if target_id == user.pk:
+        raise ValueError('Um usuário não pode seguir a si mesmo.')
+    Follow = User.following.through
+    with transaction.atomic(savepoint=False):
+        following, delta = _toggle(Follow, value, from_user_id=user.pk, to_user_id=target_id)
+        if delta:
+            row = counters.bump_one(User, target_id, 'follower_count', delta)
+        else:
+            row = User.objects.filter(pk=target_id).values_list('follower_count').first()
+        if row is None:
+            raise User.DoesNotExist # Também para contas excluídas: a transação desfaz a ligação
+        if delta:
+            counters.bump(User, [user.pk], 'following_count', delta)
+            transaction.on_commit(lambda: _sync_follow(user.pk, target_id, delta))
+
+    if delta > 0:
+        notifications.notify(target_id, user.pk, 'F')
+    elif delta < 0:
+        notifications.cancel(target_id, user.pk, 'F')
+    return {'following': following, 'followers': row[0]}
+
+
+def _sync_follow(user_id, target_id, delta):
+    # O que os m2m_changed fariam: timeline e grafo em memória
+    if delta > 0:
+        timeline.follow(user_id, [target_id])
+        graph.add_edges([(user_id, target_id)])
+    else:
+        timeline.unfollow(user_id, [target_id])
+        graph.remove_edges([(user_id, target_id)])
+
+
+def comment(user, post_id, content):
+    """Retorna {'comment_id', 'count'}."""
+    with transaction.atomic(savepoint=False):
+        row = Post.objects.filter(pk=post_id).values_list('author_id').first()
+        if row is None:
+            raise Post.DoesNotExist
+        instance = Comment.objects.create(post_id=post_id, author=user, content=content) # O signal soma comment_count
+        count = Post.all_objects.filter(pk=post_id).values_list('comment_count', flat=True).get() # Já conferido acima: sem os JOINs de visibilidade
+    notifications.notify(row[0], user.pk, 'C', post_id)
+    return {'comment_id': instance.pk, 'count': count}
+
+
+ACTIONS = {'like': like, 'retweet': retweet, 'follow': follow}
+
+
+def apply_batch(user, actions):
+    """Aplica várias interações numa única transação (um commit só).
+
+    Cada ação roda num savepoint: uma que falha (post apagado, dado inválido)
+    não desfaz as outras. Retorna um resultado por ação, na mesma ordem.
+    """
+    results = []
+    with transaction.atomic():
+        for action in actions:
+            try:
+                with transaction.atomic():
+                    results.append({'ok': True, **_apply(user, action)})
+            except (Post.DoesNotExist, User.DoesNotExist):
+                results.append({'ok': False, 'error': 'not_found'})
+            except (KeyError, TypeError, ValueError):
+                results.append({'ok': False, 'error': 'invalid'})
+    return results
+
+
+def _apply(user, action):
+    kind = action['type']
+    if kind == 'comment':
+        content = str(action['content']).strip()[:Comment._meta.get_field('content').max_length or None]
+        if not content:
+            raise ValueError
+        return comment(user, int(action['post_id']), content)
+    value = action.get('value')
+    if not (value is None or isinstance(value, bool)): # 1 == True: um 1 viraria toggle a cada reenvio
+        raise ValueError
+    if kind == 'follow':
+        return follow(user, int(action['user_id']), value)
+    return ACTIONS[kind](user, int(action['post_id']), value)
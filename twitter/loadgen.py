@@ -0,0 +1,205 @@
+"""
+Gerador de carga sintética para medir o site (comando `generate_load`).
+
+Monta um grafo social realista em escala configurável:
+
+- seguidores em lei de potência (Zipf): poucos usuários concentram a maior
+  parte dos seguidores, e quem é popular também posta mais;
+- likes, retweets, comentários e notificações caem principalmente nos posts
+  dos usuários populares;
+- parte dos posts leva hashtags, também em Zipf (alimenta feeds de tag e trends);
+- datas espalhadas pelos últimos N dias.
+
+Tudo é gerado em lotes com `bulk_create`, sem segurar o grafo inteiro na
+memória, para chegar a 100 mil usuários e 10 milhões de likes. Os signals não
+rodam no bulk_create, então contadores, timelines e índice de busca são
+recalculados no fim (ver o comando).
+"""
+import contextlib
+import itertools
+import random
+from datetime import timedelta
+
+from django.utils import timezone
+
+from . import trends
+from .models import Comment, Hashtag, Notification, Post, PostHashtag, TrendBucket, User
+
+SENTENCES = (
+    'Bom dia a todos', 'Alguém viu o jogo ontem?', 'Café é vida', 'Terminei mais um projeto em Django',
+    'Que calor hoje', 'Lendo um livro ótimo', 'Fim de semana chegando', 'Essa música não sai da cabeça',
+    'Hoje tem deploy', 'Quem mais está trabalhando até tarde?', 'Nova foto do meu gato', 'Aprendendo algo novo',
+)
+TAGS = ('django', 'python', 'cafe', 'futebol', 'deploy', 'musica', 'gatos', 'livros', 'viagem', 'series')
+TAGGED_RATIO = 0.3
+
+
+def zipf_weights(n, alpha):
+    """Pesos acumulados de uma Zipf (o índice 0 é o mais popular), para random.choices."""
+    return list(itertools.accumulate((rank + 1) ** -alpha for rank in range(n)))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+@contextlib.contextmanager
+def explicit_timestamps(*models):
+    """Desliga o auto_now_add de created_at para o bulk_create gravar as datas geradas."""
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class LoadGenerator:
+    def __init__(self, users, posts_per_user=20, follows_per_user=50, likes=100_000, comments=20_000,
+                 repost_ratio=0.1, notifications=50_000, alpha=1.1, days=30, prefix='load_', batch_size=5000,
+                 seed=42, log=print):
+        self.users = users
+        self.posts_per_user = posts_per_user
+        self.follows_per_user = follows_per_user
+        self.likes = likes
+        self.comments = comments
+        self.repost_ratio = repost_ratio
+        self.notifications = notifications
+        self.alpha = alpha
+        self.days = days
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.log = log
+        self.now = timezone.now()
+
+    def _when(self):
+        return self.now - timedelta(seconds=self.rng.uniform(0, self.days * 86400))
+
+    def _insert(self, model, objects, ignore_conflicts=False):
+        total = 0
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+            total += len(batch)
+        return total
+
+    def run(self):
+        with explicit_timestamps(Post, Comment, Notification):
+            user_ids = self.create_users()
+            popularity = zipf_weights(len(user_ids), self.alpha)
+            self.create_follows(user_ids, popularity)
+            post_ids = self.create_posts(user_ids, popularity)
+            self.create_hashtags()
+            post_popularity = zipf_weights(len(post_ids), self.alpha)
+            self.create_reposts(user_ids, post_ids, post_popularity)
+            self.create_likes(user_ids, post_ids, post_popularity)
+            self.create_comments(user_ids, post_ids, post_popularity)
+            self.create_notifications(user_ids, popularity, post_ids)
+        return user_ids
+
+    def create_users(self):
+        # Senha inutilizável: o benchmark loga com force_login
+        users = (User(username=f'{self.prefix}{i}', password='!', bio=self.rng.choice(SENTENCES)) for i in range(self.users))
+        self._insert(User, users)
+        # Ordem de criação = ranking de popularidade (o primeiro é o mais seguido)
+        user_ids = list(User.objects.filter(username__startswith=self.prefix).order_by('pk').values_list('pk', flat=True))
+        self.log(f'{len(user_ids)} usuários')
+        return user_ids
+
+    def create_follows(self, user_ids, popularity):
+        Follow = User.following.through
+        everyone = range(len(user_ids))
+
+        def follows():
+            for follower in user_ids:
+                # Quantos cada um segue também varia bastante (lognormal em torno da média)
+                k = min(int(self.rng.lognormvariate(0, 1) * self.follows_per_user / 1.65) + 1, len(user_ids) - 1)
+                for target in set(self.rng.choices(everyone, cum_weights=popularity, k=k)):
+                    if user_ids[target] != follower:
+                        yield Follow(from_user_id=follower, to_user_id=user_ids[target])
+
+        self.log(f'{self._insert(Follow, follows(), ignore_conflicts=True)} follows')
+
+    def create_posts(self, user_ids, popularity):
+        total = self.users * self.posts_per_user
+        everyone = range(len(user_ids))
+        # Autores sorteados pela popularidade e inseridos em ordem de ranking: ids baixos = posts de quem é popular
+        authors = sorted(self.rng.choices(everyone, cum_weights=popularity, k=total // 2) + [i % len(user_ids) for i in range(total - total // 2)])
+        tag_popularity = zipf_weights(len(TAGS), self.alpha)
+
+        def content(n):
+            text = f'{self.rng.choice(SENTENCES)} ({n})'
+            if self.rng.random() < TAGGED_RATIO:
+                text += ' #' + self.rng.choices(TAGS, cum_weights=tag_popularity)[0]
+            return text
+
+        posts = (Post(author_id=user_ids[rank], content=content(n), created_at=self._when()) for n, rank in enumerate(authors))
+        self._insert(Post, posts)
+        post_ids = list(Post.objects.filter(author__username__startswith=self.prefix, repost_of__isnull=True).order_by('pk').values_list('pk', flat=True))
+        self.log(f'{len(post_ids)} posts')
+        return post_ids
+
+    def create_hashtags(self):
+        # O mesmo que trends.record_post faz por post, mas em lote
+        Hashtag.objects.bulk_create([Hashtag(name=name) for name in TAGS], ignore_conflicts=True)
+        tag_ids = dict(Hashtag.objects.filter(name__in=TAGS).values_list('name', 'id'))
+        buckets = {}
+
+        def links():
+            posts = Post.objects.filter(author__username__startswith=self.prefix, content__contains='#').values_list('pk', 'content', 'created_at')
+            for pk, content, created_at in posts.iterator(chunk_size=self.batch_size):
+                for name in trends.extract_hashtags(content):
+                    key = (tag_ids[name], trends.bucket_start(created_at))
+                    buckets[key] = buckets.get(key, 0) + 1
+                    yield PostHashtag(post_id=pk, hashtag_id=tag_ids[name], created_at=created_at)
+
+        self.log(f'{self._insert(PostHashtag, links())} hashtags')
+        self._insert(TrendBucket, (TrendBucket(hashtag_id=tag, bucket=bucket, count=count) for (tag, bucket), count in buckets.items()), ignore_conflicts=True)
+
+    def create_reposts(self, user_ids, post_ids, post_popularity):
+        count = int(len(post_ids) * self.repost_ratio)
+        everyone = range(len(post_ids))
+        pairs = {(self.rng.choice(user_ids), post_ids[i]) for i in self.rng.choices(everyone, cum_weights=post_popularity, k=count)}
+        self.log(f'{self._insert(Post, (Post(author_id=u, repost_of_id=p, created_at=self._when()) for u, p in pairs))} retweets')
+
+    def create_likes(self, user_ids, post_ids, post_popularity):
+        Like = Post.likes.through
+        everyone = range(len(post_ids))
+
+        def likes():
+            remaining = self.likes
+            while remaining > 0:
+                k = min(self.batch_size, remaining)
+                for i in self.rng.choices(everyone, cum_weights=post_popularity, k=k):
+                    yield Like(post_id=post_ids[i], user_id=self.rng.choice(user_ids))
+                remaining -= k
+
+        self._insert(Like, likes(), ignore_conflicts=True)
+        self.log(f'{Like.objects.filter(user__username__startswith=self.prefix).count()} likes')
+
+    def create_comments(self, user_ids, post_ids, post_popularity):
+        everyone = range(len(post_ids))
+        comments = (
+            Comment(post_id=post_ids[i], author_id=self.rng.choice(user_ids), content=self.rng.choice(SENTENCES), created_at=self._when())
+            for i in self.rng.choices(everyone, cum_weights=post_popularity, k=self.comments)
+        )
+        self.log(f'{self._insert(Comment, comments)} comentários')
+
+    def create_notifications(self, user_ids, popularity, post_ids):
+        everyone = range(len(user_ids))
+        types = [code for code, _ in Notification.TYPES]
+
+        def notifications():
+            for rank in self.rng.choices(everyone, cum_weights=popularity, k=self.notifications):
+                notification_type = self.rng.choice(types)
+                yield Notification(
+                    to_user_id=user_ids[rank], from_user_id=self.rng.choice(user_ids), notification_type=notification_type,
+                    post_id=None if notification_type == 'F' else self.rng.choice(post_ids),
+                    is_read=self.rng.random() < 0.7, created_at=self._when(),
+                )
+
+        self.log(f'{self._insert(Notification, notifications())} notificações')
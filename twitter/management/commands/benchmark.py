@@ -0,0 +1,62 @@
+import json
+import random
+import socket
+
+from django.core.management.base import BaseCommand, CommandError
+
+from twitter import benchmark
+from twitter.models import User
+
+
+class Command(BaseCommand):
+    help = 'Mede latência (p50/p95/p99), queries e linhas lidas por rota e grava um baseline em JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Requisições medidas por rota.')
+        parser.add_argument('--warmup', type=int, default=5, help='Requisições descartadas antes de medir.')
+        parser.add_argument('--routes', nargs='*', help='Só essas rotas (nomes do urls.py).')
+        parser.add_argument('--username', help='Usuário logado (padrão: quem segue mais gente).')
+        parser.add_argument('--base-url', help='Mede por HTTP um servidor já rodando (ex.: http://127.0.0.1:8000).')
+        parser.add_argument('--gunicorn', action='store_true', help='Sobe um gunicorn local e mede por HTTP.')
+        parser.add_argument('--workers', type=int, default=2, help='Workers do --gunicorn.')
+        parser.add_argument('--output', default='benchmark.json', help='Onde gravar o resultado.')
+        parser.add_argument('--compare', help='Baseline anterior para comparar.')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Piora de p95 tolerada no --compare (0.2 = 20%%).')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = User.objects.order_by('-following_count').first()
+        if user is None:
+            raise CommandError('Nenhum usuário para logar; rode generate_load antes.')
+        self.stdout.write(f'Logado como {user.username}')
+
+        rng = random.Random(options['seed'])
+        measure = lambda driver, mode: {
+            'meta': benchmark.metadata(mode),
+            'routes': benchmark.run(driver, user, rng, options['requests'], options['warmup'], options['routes'], self.stdout.write),
+        }
+        if options['gunicorn']:
+            with socket.socket() as s:
+                s.bind(('127.0.0.1', 0))
+                port = s.getsockname()[1]
+            with benchmark.gunicorn(port, options['workers']) as base_url:
+                result = measure(benchmark.HTTPDriver(user, base_url), 'gunicorn')
+        elif options['base_url']:
+            result = measure(benchmark.HTTPDriver(user, options['base_url']), 'http')
+        else:
+            result = measure(benchmark.ClientDriver(user), 'client')
+
+        benchmark.write(options['output'], result)
+        self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                lines, regressions = benchmark.compare(json.load(f), result, options['threshold'])
+            for line in lines:
+                self.stdout.write(line)
+            if regressions:
+                raise CommandError('Regressões: ' + '; '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Sem regressões em relação ao baseline.'))
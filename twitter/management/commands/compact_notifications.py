@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from twitter import notifications
+
+
+class Command(BaseCommand):
+    help = 'Junta notificações lidas antigas do mesmo post e tipo e apaga as que passaram da retenção.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Linhas (ou grupos) por transação (padrão: NOTIFICATION_COMPACT_BATCH).')
+        parser.add_argument('--pause', type=float, default=0, help='Segundos de espera entre lotes.')
+
+    def handle(self, *args, **options):
+        merged, pruned = notifications.compact(batch_size=options['batch_size'], pause=options['pause'])
+        self.stdout.write(self.style.SUCCESS(f'{merged} notificações juntadas, {pruned} apagadas.'))
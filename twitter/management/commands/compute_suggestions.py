@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from twitter import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as sugestões de quem seguir de cada usuário (rodar pelo cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Usuários por transação (padrão: SUGGESTIONS_BATCH_SIZE).')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = suggestions.compute(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{written} sugestões gravadas em {time.monotonic() - started:.1f}s.'))
@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from twitter import uploads
+
+
+class Command(BaseCommand):
+    help = 'Apaga uploads de vídeo em partes abandonados (e os arquivos .part).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Idade mínima, desde a última parte recebida.')
+
+    def handle(self, *args, **options):
+        removed = uploads.expire(timezone.now() - timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'{removed} uploads expirados removidos.'))
@@ -0,0 +1,52 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from twitter import deletion, search, trends
+from twitter.loadgen import LoadGenerator
+from twitter.models import User
+
+
+class Command(BaseCommand):
+    help = 'Gera um grafo social sintético (seguidores em lei de potência, posts, likes...) para benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts-per-user', type=int, default=20, help='Média; quem é popular posta mais.')
+        parser.add_argument('--follows-per-user', type=int, default=50, help='Média de pessoas seguidas.')
+        parser.add_argument('--likes', type=int, default=100_000)
+        parser.add_argument('--comments', type=int, default=20_000)
+        parser.add_argument('--repost-ratio', type=float, default=0.1, help='Retweets por post original.')
+        parser.add_argument('--notifications', type=int, default=50_000)
+        parser.add_argument('--alpha', type=float, default=1.1, help='Expoente da Zipf (maior = mais concentrado).')
+        parser.add_argument('--days', type=int, default=30, help='Janela das datas geradas.')
+        parser.add_argument('--prefix', default='load_', help='Prefixo dos nomes de usuário gerados.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help='Apaga antes os usuários gerados com o mesmo prefixo.')
+        parser.add_argument('--skip-derived', action='store_true', help='Não recalcula contadores, timelines, busca e trends no fim.')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        # Inclui as contas excluídas (tombstone) que o reaper ainda não apagou
+        existing = User.all_objects.filter(username__startswith=prefix)
+        if options['clear']:
+            self.stdout.write(f'Apagando {existing.count()} usuários com prefixo {prefix!r}...')
+            deletion.purge_users(existing, batch_size=options['batch_size'])
+        elif existing.exists():
+            raise CommandError(f'Já existem usuários com prefixo {prefix!r}; use --clear ou outro --prefix.')
+
+        generator = LoadGenerator(
+            users=options['users'], posts_per_user=options['posts_per_user'], follows_per_user=options['follows_per_user'],
+            likes=options['likes'], comments=options['comments'], repost_ratio=options['repost_ratio'],
+            notifications=options['notifications'], alpha=options['alpha'], days=options['days'], prefix=prefix,
+            batch_size=options['batch_size'], seed=options['seed'], log=self.stdout.write,
+        )
+        generator.run()
+
+        if not options['skip_derived']:
+            # bulk_create não dispara signals: deriva tudo das tabelas
+            call_command('recount', stdout=self.stdout)
+            call_command('rebuild_timelines', stdout=self.stdout)
+            search.rebuild_index()
+            trends.refresh()
+        self.stdout.write(self.style.SUCCESS('Carga sintética gerada.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from twitter import media
+from twitter.models import Post, User
+
+
+class Command(BaseCommand):
+    help = 'Gera as variantes WebP, o blurhash e os metadados de vídeo das mídias que ainda não foram processadas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Reprocessa mesmo os arquivos que já têm variantes.')
+
+    def handle(self, *args, **options):
+        jobs = [(Post, 'image'), (Post, 'video'), (User, 'profile_pic'), (User, 'cover_image')]
+        total = 0
+        for model, field_name in jobs:
+            queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True}).only('pk', field_name, f'{field_name}_variants')
+            for instance in queryset.iterator(chunk_size=500):
+                if options['force']:
+                    model.objects.filter(pk=instance.pk).update(**{f'{field_name}_variants': {}})
+                    setattr(instance, f'{field_name}_variants', {})
+                if media.needs_processing(instance, field_name):
+                    # Roda aqui mesmo, sem o pool: o comando já é o "worker"
+                    media.processor_for(field_name)(model, instance.pk, field_name)
+                    total += 1
+        self.stdout.write(self.style.SUCCESS(f'{total} arquivos processados.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from twitter import deletion
+
+
+class Command(BaseCommand):
+    help = 'Apaga de vez, em lotes, os posts e contas excluídos (e os arquivos de mídia deles).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Linhas por transação (padrão: REAPER_BATCH_SIZE).')
+        parser.add_argument('--throttle', type=float, help='Dorme N vezes o tempo de cada lote (padrão: REAPER_THROTTLE).')
+        parser.add_argument('--pause', type=float, help='Espera mínima entre lotes, em segundos (padrão: REAPER_PAUSE).')
+        parser.add_argument('--sweep-media', action='store_true', help='Também apaga do MEDIA_ROOT os arquivos que nenhuma linha usa.')
+
+    def handle(self, *args, **options):
+        counts = deletion.reap(options['batch_size'], options['throttle'], options['pause'])
+        for table, n in sorted(counts.items()):
+            self.stdout.write(f'{table}: {n}')
+        if options['sweep_media']:
+            self.stdout.write(f'arquivos órfãos: {deletion.sweep_media()}')
+        self.stdout.write(self.style.SUCCESS('Exclusões concluídas.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from twitter import timeline
+from twitter.models import User
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói do zero as timelines materializadas da página inicial.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Reconstrói só esses usuários (padrão: todos).')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        total = 0
+        for user_id in users.values_list('id', flat=True).iterator(chunk_size=options['batch_size']):
+            timeline.rebuild(user_id)
+            total += 1
+            if total % options['batch_size'] == 0:
+                self.stdout.write(f'{total} timelines reconstruídas...')
+        self.stdout.write(self.style.SUCCESS(f'{total} timelines reconstruídas.'))
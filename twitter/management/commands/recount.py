@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from twitter import counters
+from twitter.models import Comment, Post, User
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os contadores denormalizados (likes, retweets, comentários, seguidores).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+        # Em lotes de ids para não segurar o lock de escrita por muito tempo
+        for model, kwarg in ((Post, 'post_ids'), (User, 'user_ids')):
+            last_pk = 0
+            while True:
+                batch = list(model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if not batch:
+                    break
+                ids = {'post_ids': [], 'user_ids': []}
+                ids[kwarg] = batch
+                updated += counters.recount(Post, User, Comment, **ids)
+                last_pk = batch[-1]
+        self.stdout.write(self.style.SUCCESS(f'{updated} linhas recalculadas.'))
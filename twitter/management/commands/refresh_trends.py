@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from twitter import trends
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os assuntos do momento a partir dos contadores por hora (rodar pelo cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune-days', type=int, default=7, help='Apaga contadores mais antigos que isso.')
+
+    def handle(self, *args, **options):
+        rows = trends.refresh()
+        pruned = trends.prune(options['prune_days'])
+        for row in rows:
+            self.stdout.write(f'{row.rank:>2}. #{row.hashtag.name} ({row.post_count} posts, score {row.score:.1f})')
+        self.stdout.write(self.style.SUCCESS(f'{len(rows)} assuntos gravados, {pruned} contadores antigos apagados.'))
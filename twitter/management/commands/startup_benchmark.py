@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from twitter import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Mede o início a frio de workers novos (importação e primeiras requisições) e grava um baseline em JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=5, help='Processos novos medidos, um de cada vez.')
+        parser.add_argument('--paths', nargs='*', default=['/login/'], help='Requisições feitas por cada processo, em ordem.')
+        parser.add_argument('--repeat', type=int, default=2, help='Vezes que cada caminho é pedido (a 1ª é a fria).')
+        parser.add_argument('--username', help='Usuário logado nas requisições.')
+        parser.add_argument('--warmup', action='store_true', help='Aquece como o gunicorn.conf.py antes das requisições.')
+        parser.add_argument('--output', default='startup.json', help='Onde gravar o resultado.')
+        parser.add_argument('--compare', help='Baseline anterior para comparar.')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Piora de p95 tolerada no --compare (0.2 = 20%%).')
+
+    def probe(self, options):
+        args = {'paths': options['paths'], 'username': options['username'], 'warmup': options['warmup'], 'repeat': options['repeat']}
+        process = subprocess.run(
+            [sys.executable, '-m', 'twitter.warmup', json.dumps(args)],
+            cwd=settings.BASE_DIR, env=os.environ, capture_output=True, text=True,
+        )
+        if process.returncode:
+            raise CommandError(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'O processo medido falhou.')
+        return json.loads(process.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        # Métrica -> amostras em segundos (uma por processo), na ordem em que acontecem no worker
+        samples, statuses = {}, {}
+        for n in range(options['workers']):
+            result = self.probe(options)
+            samples.setdefault('setup', []).append(result['setup_ms'] / 1000)
+            samples.setdefault('import', []).append(result['import_ms'] / 1000)
+            for step, (_, ms) in result.get('warmup', {}).items():
+                samples.setdefault(f'warmup {step}', []).append(ms / 1000)
+            for path, request in result['requests'].items():
+                for i, ms in enumerate(request['ms'], 1):
+                    name = f'{i}ª {path}'
+                    samples.setdefault(name, []).append(ms / 1000)
+                    statuses.setdefault(name, []).append(request['status'])
+            self.stdout.write(f"worker {n + 1} (pid {result['pid']}): setup {result['setup_ms']} ms, import {result['import_ms']} ms")
+
+        routes = {name: benchmark.summarize(name, timings, [], [], statuses.get(name, [])) for name, timings in samples.items()}
+        for name, summary in routes.items():
+            self.stdout.write(benchmark.format_row(name, summary))
+        mode = 'startup-warm' if options['warmup'] else 'startup'
+        benchmark.write(options['output'], {'meta': benchmark.metadata(mode), 'routes': routes})
+        self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['output']}"))
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                lines, regressions = benchmark.compare(json.load(f), {'routes': routes}, options['threshold'])
+            for line in lines:
+                self.stdout.write(line)
+            if regressions:
+                raise CommandError('Regressões: ' + '; '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Sem regressões em relação ao baseline.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from twitter import timeline
+
+
+class Command(BaseCommand):
+    help = 'Corta as timelines materializadas que passaram de TIMELINE_MAX_LENGTH posts.'
+
+    def handle(self, *args, **options):
+        trimmed = timeline.get_backend().trim_many()
+        self.stdout.write(self.style.SUCCESS(f'{trimmed} timelines cortadas.'))
@@ -0,0 +1,268 @@
+"""
+Processamento de mídia em segundo plano.
+
+Depois do upload (no commit da transação), um pool de threads gera para cada
+imagem: variantes WebP redimensionadas, cópia sem EXIF (a orientação é
+aplicada antes) e um placeholder blurhash. O resultado vai para o campo
+`<campo>_variants` (JSON) do próprio model, e a template tag `variant_url`
+escolhe a menor variante que atende o tamanho exibido.
+
+Vídeos passam pelo `ffprobe` (duração e dimensões) e pelo `ffmpeg` (um
+frame vira o poster WebP, com blurhash), resultado em `video_variants`. Sem
+ffmpeg instalado, o vídeo aparece sem poster.
+
+Enquanto o processamento não termina, ou se ele falhar, as templates usam o
+arquivo original.
+"""
+import json
+import logging
+import math
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Larguras geradas por campo (px). Os avatares aparecem com 32-128px.
+VARIANT_WIDTHS = {
+    'profile_pic': (64, 128, 256),
+    'cover_image': (640, 1280),
+    'image': (640, 1280),
+}
+WEBP_QUALITY = 80
+POSTER_WIDTH = 1280
+FFMPEG_TIMEOUT = 120 # segundos
+
+_executor = None
+
+
+def submit(fn, *args):
+    """Roda fn(*args) no pool de mídia (ou na hora, se MEDIA_ASYNC for False)."""
+    global _executor
+    if not settings.MEDIA_ASYNC:
+        return fn(*args)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.MEDIA_WORKERS, thread_name_prefix='media')
+    _executor.submit(_run_job, fn, *args)
+
+
+def _run_job(fn, *args):
+    close_old_connections()
+    try:
+        fn(*args)
+    except Exception:
+        logger.exception('Falha no processamento de mídia: %s%r', fn.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def needs_processing(instance, field_name):
+    field_file = getattr(instance, field_name)
+    if not field_file or field_file.name == instance._meta.get_field(field_name).default:
+        return False
+    return getattr(instance, f'{field_name}_variants', {}).get('source') != field_file.name
+
+
+def processor_for(field_name):
+    return probe_video if field_name == 'video' else process_image
+
+
+def schedule(instance, field_name):
+    model, pk = type(instance), instance.pk
+    processor = processor_for(field_name)
+    transaction.on_commit(lambda: submit(processor, model, pk, field_name))
+
+
+def _save_variants(model, pk, field_name, field_file, variants):
+    # Só grava se o arquivo não mudou durante o processamento
+    updates = {f'{field_name}_variants': variants}
+    if hasattr(model, 'version'):
+        updates['version'] = F('version') + 1 # URLs novas: invalida o card em cache (twitter/cards.py)
+    model._base_manager.filter(pk=pk, **{field_name: field_file.name}).update(**updates)
+
+
+def _load(model, pk):
+    # Pela pk, sem os JOINs de visibilidade do manager padrão: basta a linha não ter tombstone
+    return model._base_manager.filter(pk=pk, deleted_at__isnull=True).first()
+
+
+def process_image(model, pk, field_name):
+    instance = _load(model, pk)
+    if instance is None or not needs_processing(instance, field_name):
+        return
+    field_file = getattr(instance, field_name)
+    storage = field_file.storage
+
+    with storage.open(field_file.name, 'rb') as f:
+        original = Image.open(f)
+        original.load()
+    had_exif = bool(original.info.get('exif'))
+    image = ImageOps.exif_transpose(original)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'P') else 'RGB')
+
+    if had_exif:
+        # Cópia sem EXIF (localização, câmera...), já na orientação certa, com nome novo: o
+        # campo passa para ela num UPDATE condicional e só então o original sai do storage
+        buffer = BytesIO()
+        image.save(buffer, format=original.format or 'JPEG', quality=90)
+        stem, ext = os.path.splitext(field_file.name)
+        clean_name = storage.save(f'{stem}.clean{ext}', ContentFile(buffer.getvalue()))
+        updates = {field_name: clean_name}
+        if hasattr(model, 'version'):
+            updates['version'] = F('version') + 1 # O card em cache ainda aponta para o original
+        if not model._base_manager.filter(pk=pk, **{field_name: field_file.name}).update(**updates):
+            storage.delete(clean_name) # O arquivo mudou durante o processamento
+            return
+        storage.delete(field_file.name)
+        field_file.name = clean_name
+
+    stem = os.path.splitext(field_file.name)[0]
+    webp = {}
+    for width in VARIANT_WIDTHS[field_name]:
+        if width >= image.width and webp:
+            break
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        buffer = BytesIO()
+        resized.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+        name = f'{stem}.{width}w.webp'
+        if storage.exists(name):
+            storage.delete(name)
+        webp[str(width)] = storage.save(name, ContentFile(buffer.getvalue()))
+
+    variants = {
+        'source': field_file.name,
+        'width': image.width,
+        'height': image.height,
+        'blurhash': blurhash(image),
+        'webp': webp,
+    }
+    _save_variants(model, pk, field_name, field_file, variants)
+
+
+def has_video_stream(path):
+    """True/False se o ffprobe acha uma stream de vídeo em `path`; None sem ffprobe instalado."""
+    ffprobe = shutil.which('ffprobe')
+    if not ffprobe:
+        logger.warning('ffprobe não encontrado; %s aceito só pela extensão', path)
+        return None
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v', '-show_entries', 'stream=codec_type', '-of', 'json', str(path)],
+        capture_output=True, timeout=FFMPEG_TIMEOUT,
+    )
+    return result.returncode == 0 and bool(json.loads(result.stdout or '{}').get('streams'))
+
+
+def probe_video(model, pk, field_name='video'):
+    instance = _load(model, pk)
+    if instance is None or not needs_processing(instance, field_name):
+        return
+    ffprobe, ffmpeg = shutil.which('ffprobe'), shutil.which('ffmpeg')
+    if not ffprobe:
+        logger.warning('ffprobe não encontrado; vídeo %s ficará sem metadados', pk)
+        return
+    field_file = getattr(instance, field_name)
+    path = field_file.path
+
+    result = subprocess.run(
+        [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width,height:format=duration', '-of', 'json', path],
+        capture_output=True, check=True, timeout=FFMPEG_TIMEOUT,
+    )
+    info = json.loads(result.stdout)
+    stream = (info.get('streams') or [{}])[0]
+    duration = float(info.get('format', {}).get('duration') or 0)
+    variants = {'source': field_file.name, 'duration': round(duration, 2), 'width': stream.get('width'), 'height': stream.get('height')}
+
+    if ffmpeg:
+        # Frame de 1s (ou do meio, em vídeos curtos) em PNG pelo stdout, sem arquivo temporário
+        result = subprocess.run(
+            [ffmpeg, '-v', 'error', '-ss', str(min(1.0, duration / 2)), '-i', path, '-frames:v', '1', '-f', 'image2pipe', '-c:v', 'png', '-'],
+            capture_output=True, check=True, timeout=FFMPEG_TIMEOUT,
+        )
+        if result.stdout:
+            frame = Image.open(BytesIO(result.stdout)).convert('RGB')
+            frame.thumbnail((POSTER_WIDTH, POSTER_WIDTH * 4), Image.LANCZOS)
+            buffer = BytesIO()
+            frame.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=4)
+            name = f'{os.path.splitext(field_file.name)[0]}.poster.webp'
+            if field_file.storage.exists(name):
+                field_file.storage.delete(name)
+            variants['poster'] = field_file.storage.save(name, ContentFile(buffer.getvalue()))
+            variants['blurhash'] = blurhash(frame)
+
+    _save_variants(model, pk, field_name, field_file, variants)
+
+
+def variant_names(variants):
+    """Arquivos gerados a partir de um original (para limpeza de mídia órfã)."""
+    variants = variants or {}
+    names = set(variants.get('webp', {}).values())
+    if variants.get('poster'):
+        names.add(variants['poster'])
+    return names
+
+
+# --- Blurhash (https://blurha.sh), com 4x3 componentes sobre uma miniatura 32x32 ---
+
+_BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+
+
+def _base83(value, length):
+    return ''.join(_BASE83[(value // 83 ** (length - 1 - i)) % 83] for i in range(length))
+
+
+def _to_linear(value):
+    v = value / 255
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _to_srgb(value):
+    v = max(0.0, min(1.0, value))
+    return int(v * 12.92 * 255 + 0.5) if v <= 0.0031308 else int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def blurhash(image, x_components=4, y_components=3):
+    small = image.convert('RGB')
+    small.thumbnail((32, 32))
+    width, height = small.size
+    linear = [tuple(_to_linear(c) for c in pixel) for pixel in small.getdata()]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors = []
+    for j in range(y_components):
+        for i in range(x_components):
+            norm = 1 if i == j == 0 else 2
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                cy = cos_y[j][y] * norm
+                for x in range(width):
+                    basis = cy * cos_x[i][x]
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = 1 / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    actual_max = max((abs(c) for factor in ac for c in factor), default=0)
+    quantised_max = max(0, min(82, int(actual_max * 166 - 0.5)))
+    max_value = (quantised_max + 1) / 166
+    result += _base83(quantised_max, 1)
+    result += _base83((_to_srgb(dc[0]) << 16) + (_to_srgb(dc[1]) << 8) + _to_srgb(dc[2]), 4)
+    for factor in ac:
+        q = [max(0, min(18, int(math.floor(math.copysign(abs(c / max_value) ** 0.5, c) * 9 + 9.5)))) for c in factor]
+        result += _base83(q[0] * 19 * 19 + q[1] * 19 + q[2], 2)
+    return result
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+TIMELINE_MAX_LENGTH = 800
+
+
+def build_timelines(apps, schema_editor):
+    User = apps.get_model('twitter', 'User')
+    Post = apps.get_model('twitter', 'Post')
+    TimelineEntry = apps.get_model('twitter', 'TimelineEntry')
+    Follow = User.following.through
+
+    for user_id in User.objects.values_list('id', flat=True).iterator():
+        author_ids = list(Follow.objects.filter(from_user_id=user_id).values_list('to_user_id', flat=True))
+        author_ids.append(user_id)
+        posts = Post.objects.filter(author_id__in=author_ids).order_by('-created_at', '-id')
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user_id=user_id, post_id=post_id, created_at=created_at)
+            for post_id, created_at in posts.values_list('id', 'created_at')[:TIMELINE_MAX_LENGTH]
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0004_alter_notification_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='twitter.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry')],
+            },
+        ),
+        migrations.RunPython(build_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:06
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, key):
+    subquery = queryset.filter(**{key: OuterRef('pk')}).order_by().values(key).annotate(n=Count('*')).values('n')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    # Cópia do twitter.counters.recount desta versão: a migration não acompanha o código da app
+    Post = apps.get_model('twitter', 'Post')
+    User = apps.get_model('twitter', 'User')
+    Comment = apps.get_model('twitter', 'Comment')
+    Like = Post.likes.through
+    Follow = User.following.through
+
+    Post.objects.update(
+        like_count=_count(Like.objects.all(), 'post_id'),
+        repost_count=_count(Post.objects.all(), 'repost_of_id'),
+        comment_count=_count(Comment.objects.all(), 'post_id'),
+    )
+    User.objects.update(
+        follower_count=_count(Follow.objects.all(), 'to_user_id'),
+        following_count=_count(Follow.objects.all(), 'from_user_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0005_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='repost_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='others_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
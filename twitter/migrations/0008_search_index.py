@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:12
+
+from django.db import migrations
+
+# SQL do twitter/search.py desta versão, copiado: a migration não acompanha o código da app
+USER_FTS = 'twitter_user_fts'
+POST_FTS = 'twitter_post_fts'
+FTS_OPTIONS = "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'"
+PG_USER_VECTOR = (
+    "setweight(to_tsvector('portuguese', COALESCE(username, '')), 'A') || "
+    "setweight(to_tsvector('portuguese', COALESCE(bio, '')), 'B')"
+)
+PG_POST_VECTOR = "to_tsvector('portuguese', COALESCE(content, ''))"
+PG_INDEXES = ('twitter_user_search_idx', 'twitter_post_search_idx', 'twitter_user_username_prefix_idx')
+
+
+def _sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite' and _sqlite_has_fts5(schema_editor.connection):
+        schema_editor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {USER_FTS} USING fts5(username, bio, {FTS_OPTIONS})')
+        schema_editor.execute(f'CREATE VIRTUAL TABLE IF NOT EXISTS {POST_FTS} USING fts5(content, {FTS_OPTIONS})')
+        schema_editor.execute(f'INSERT INTO {USER_FTS} (rowid, username, bio) SELECT id, username, bio FROM twitter_user')
+        schema_editor.execute(f"INSERT INTO {POST_FTS} (rowid, content) SELECT id, content FROM twitter_post WHERE content != ''")
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS twitter_user_search_idx ON twitter_user USING GIN (({PG_USER_VECTOR}))')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS twitter_post_search_idx ON twitter_post USING GIN (({PG_POST_VECTOR}))')
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS twitter_user_username_prefix_idx ON twitter_user (UPPER(username::text) text_pattern_ops)')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {USER_FTS}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {POST_FTS}')
+    elif vendor == 'postgresql':
+        for index in PG_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0007_notification_others_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
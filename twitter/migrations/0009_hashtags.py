@@ -0,0 +1,104 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:12
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Cópia do twitter/trends.py desta versão: a migration não acompanha o código da app
+HASHTAG_RE = re.compile(r'(?<![\w&])#(\w{1,100})', re.UNICODE)
+
+
+def extract_hashtags(text):
+    return list(dict.fromkeys(name.lower() for name in HASHTAG_RE.findall(text or '')))
+
+
+def bucket_start(when):
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def extract_existing_hashtags(apps, schema_editor):
+    Post = apps.get_model('twitter', 'Post')
+    Hashtag = apps.get_model('twitter', 'Hashtag')
+    PostHashtag = apps.get_model('twitter', 'PostHashtag')
+    TrendBucket = apps.get_model('twitter', 'TrendBucket')
+
+    links, buckets = [], {}
+    for post_id, content, created_at in Post.objects.filter(content__contains='#').values_list('id', 'content', 'created_at').iterator():
+        for name in extract_hashtags(content):
+            tag, _ = Hashtag.objects.get_or_create(name=name)
+            links.append(PostHashtag(post_id=post_id, hashtag_id=tag.id, created_at=created_at))
+            key = (tag.id, bucket_start(created_at))
+            buckets[key] = buckets.get(key, 0) + 1
+    PostHashtag.objects.bulk_create(links, batch_size=1000)
+    TrendBucket.objects.bulk_create([TrendBucket(hashtag_id=t, bucket=b, count=c) for (t, b), c in buckets.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hashtag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostHashtag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='twitter.hashtag')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='twitter.post')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='hashtags',
+            field=models.ManyToManyField(blank=True, related_name='posts', through='twitter.PostHashtag', to='twitter.hashtag'),
+        ),
+        migrations.CreateModel(
+            name='TrendBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='twitter.hashtag')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrendingTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(unique=True)),
+                ('score', models.FloatField()),
+                ('post_count', models.PositiveIntegerField()),
+                ('hashtag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='twitter.hashtag')),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='posthashtag',
+            index=models.Index(fields=['hashtag', '-created_at', '-id'], name='posthashtag_tag_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='posthashtag',
+            constraint=models.UniqueConstraint(fields=('post', 'hashtag'), name='unique_post_hashtag'),
+        ),
+        migrations.AddIndex(
+            model_name='trendbucket',
+            index=models.Index(fields=['bucket'], name='trendbucket_bucket_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='trendbucket',
+            constraint=models.UniqueConstraint(fields=('hashtag', 'bucket'), name='unique_trend_bucket'),
+        ),
+        migrations.RunPython(extract_existing_hashtags, migrations.RunPython.noop),
+    ]
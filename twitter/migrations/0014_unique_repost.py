@@ -0,0 +1,41 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:39
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicate_reposts(apps, schema_editor):
+    # Retweets repetidos (corridas no toggle antigo): fica o mais antigo de cada par (autor, post)
+    Post = apps.get_model('twitter', 'Post')
+    duplicates = (
+        Post.objects.filter(repost_of__isnull=False).order_by()
+        .values('author_id', 'repost_of_id').annotate(n=Count('id'), keep=Min('id')).filter(n__gt=1)
+    )
+    source_ids = set()
+    for row in duplicates.iterator():
+        Post.objects.filter(author_id=row['author_id'], repost_of_id=row['repost_of_id']).exclude(pk=row['keep']).delete()
+        source_ids.add(row['repost_of_id'])
+    if source_ids:
+        # Recontagem dos retweets dos originais afetados, sem depender de twitter.counters
+        reposts = Post.objects.filter(repost_of_id=OuterRef('pk')).order_by().values('repost_of_id').annotate(n=Count('*')).values('n')
+        Post.objects.filter(pk__in=source_ids).update(repost_count=Coalesce(Subquery(reposts, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0013_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_reposts, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_author_repost_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='post',
+            constraint=models.UniqueConstraint(condition=models.Q(('repost_of__isnull', False)), fields=('author', 'repost_of'), name='unique_author_repost'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:43
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_unread_count(apps, schema_editor):
+    # O badge saía de um cache por processo; agora é coluna, preenchida a partir da tabela
+    User = apps.get_model('twitter', 'User')
+    Notification = apps.get_model('twitter', 'Notification')
+    unread = Notification.objects.filter(to_user_id=OuterRef('pk'), is_read=False).order_by().values('to_user_id').annotate(n=Count('*')).values('n')
+    User.objects.update(unread_count=Coalesce(Subquery(unread, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twitter', '0017_follow_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_unread_count, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,14 @@
+import uuid
+
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.functions import Coalesce
+from django.contrib.auth.models import AbstractUser, UserManager
+
+class VisibleUserManager(UserManager):
+    # Manager padrão: contas excluídas somem na hora (perfil, busca, listas, login)
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 class User(AbstractUser):
     bio = models.TextField(max_length=500, blank=True)
@@ -7,24 +16,172 @@ class User(AbstractUser):
     cover_image = models.ImageField(upload_to='covers/', default='default_cover.png', blank=True)
     following = models.ManyToManyField('self', symmetrical=False, related_name='followers', blank=True)
 
-    
+    # Variantes WebP + blurhash geradas em segundo plano (ver twitter/media.py)
+    profile_pic_variants = models.JSONField(default=dict, blank=True, editable=False)
+    cover_image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Contadores denormalizados (atualizados com F() pelos signals, corrigidos pelo comando recount)
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    # Badge de não lidas: coluna, não cache, para todos os workers verem o mesmo valor (twitter/notifications.py)
+    unread_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Conta excluída (tombstone): some na hora; o comando reap_deleted apaga o resto em lotes
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = VisibleUserManager()
+    all_objects = UserManager() # Inclui as excluídas (reaper)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Só as excluídas entram no índice: é o que o reaper procura
+            models.Index(fields=['deleted_at'], condition=models.Q(deleted_at__isnull=False), name='user_deleted_idx'),
+        ]
+
     @property
     def unread_notifications_count(self):
-        return self.notifications.filter(is_read=False).count()
+        return self.unread_count
+
+class PostQuerySet(models.QuerySet):
+    def with_viewer_state(self, user):
+        """Anota viewer_liked / viewer_reposted do post exibido (o original, se for retweet).
+
+        São subqueries EXISTS na mesma consulta da página, usando o índice único
+        de likes, em vez de carregar todos os usuários que curtiram cada post.
+        """
+        shown_id = Coalesce(OuterRef('repost_of_id'), OuterRef('pk'))
+        liked = Post.likes.through.objects.filter(post_id=shown_id, user_id=user.pk)
+        reposted = Post.all_objects.filter(repost_of_id=shown_id, author_id=user.pk, deleted_at__isnull=True)
+        return self.annotate(viewer_liked=Exists(liked), viewer_reposted=Exists(reposted))
+
+# Post visível: sem tombstone, de conta não excluída e, se for retweet, com o original também visível
+VISIBLE_POSTS = Q(deleted_at__isnull=True, author__deleted_at__isnull=True) & (
+    Q(repost_of__isnull=True) | Q(repost_of__deleted_at__isnull=True, repost_of__author__deleted_at__isnull=True)
+)
+
+class VisiblePostManager(models.Manager.from_queryset(PostQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().filter(VISIBLE_POSTS)
 
 class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField(max_length=280, blank=True) # Agora pode ser vazio se tiver foto/video
     image = models.ImageField(upload_to='post_images/', blank=True, null=True)
     video = models.FileField(upload_to='post_videos/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False) # Ver twitter/media.py
+    video_variants = models.JSONField(default=dict, blank=True, editable=False) # Duração, dimensões e poster (ffprobe)
     created_at = models.DateTimeField(auto_now_add=True)
     likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
     
     # Sistema de Retweet (Repost)
     repost_of = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='reposts')
 
+    # Contadores denormalizados (atualizados com F() pelos signals, corrigidos pelo comando recount)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    repost_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    version = models.PositiveIntegerField(default=0, editable=False) # Muda a chave do card em cache (twitter/cards.py)
+
+    # Post excluído (tombstone): some na hora; o comando reap_deleted apaga o resto em lotes (twitter/deletion.py)
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    hashtags = models.ManyToManyField('Hashtag', through='PostHashtag', related_name='posts', blank=True)
+
+    objects = VisiblePostManager()
+    all_objects = PostQuerySet.as_manager() # Inclui os excluídos (reaper, contadores)
+
+    # Só mudam por UPDATE atômico nos signals
+    COUNTER_FIELDS = ('like_count', 'repost_count', 'comment_count', 'version')
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Perfil: WHERE author_id = ? ORDER BY created_at DESC, id DESC
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+            models.Index(fields=['deleted_at'], condition=models.Q(deleted_at__isnull=False), name='post_deleted_idx'),
+        ]
+        constraints = [
+            # Um retweet por pessoa e post (fora os excluídos); também é o índice do toggle (WHERE author_id = ? AND repost_of_id = ?)
+            models.UniqueConstraint(fields=['author', 'repost_of'], condition=models.Q(repost_of__isnull=False, deleted_at__isnull=True), name='unique_author_repost'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Um save() com a instância carregada antes não pode sobrescrever contadores e versão
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in self.COUNTER_FIELDS]
+        super().save(*args, **kwargs)
+
+class Hashtag(models.Model):
+    name = models.CharField(max_length=100, unique=True) # Sempre em minúsculas, sem o '#'
+
+    def __str__(self):
+        return f'#{self.name}'
+
+class PostHashtag(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE)
+    created_at = models.DateTimeField() # Cópia de post.created_at para paginar o feed da tag sem JOIN
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'hashtag'], name='unique_post_hashtag'),
+        ]
+        indexes = [
+            models.Index(fields=['hashtag', '-created_at', '-id'], name='posthashtag_tag_created_idx'),
+        ]
+
+class TrendBucket(models.Model):
+    # Contador de usos da hashtag por janela de tempo (uma linha por tag por hora)
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name='buckets')
+    bucket = models.DateTimeField() # Início da janela
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hashtag', 'bucket'], name='unique_trend_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket'], name='trendbucket_bucket_idx'),
+        ]
+
+class TrendingTag(models.Model):
+    # Resultado pré-calculado pelo comando refresh_trends; a barra lateral só lê esta tabela
+    hashtag = models.OneToOneField(Hashtag, on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField(unique=True)
+    score = models.FloatField()
+    post_count = models.PositiveIntegerField() # Usos na janela considerada
+
+    class Meta:
+        ordering = ['rank']
+
+class FollowSuggestion(models.Model):
+    # Top-K de "quem seguir" por usuário, pré-calculado pelo comando compute_suggestions (twitter/suggestions.py)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    mutual_count = models.PositiveIntegerField(default=0) # Quantos que o usuário segue já seguem o sugerido
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            # Também é o índice da barra lateral: WHERE user_id = ? ORDER BY rank
+            models.UniqueConstraint(fields=['user', 'rank'], name='unique_suggestion_rank'),
+        ]
+
+class TimelineEntry(models.Model):
+    # Timeline materializada: cada post é empurrado para a timeline dos seguidores na escrita
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField() # Cópia de post.created_at para ordenar sem JOIN
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_created_idx'),
+        ]
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
@@ -32,6 +189,12 @@ class Comment(models.Model):
     content = models.TextField(max_length=140)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Comentários de um post, paginados: WHERE post_id = ? ORDER BY created_at DESC
+            models.Index(fields=['post', 'created_at'], name='comment_post_created_idx'),
+        ]
+
 class Notification(models.Model):
     TYPES = (
         ('L', 'Like'),
@@ -44,7 +207,28 @@ class Notification(models.Model):
     notification_type = models.CharField(max_length=1, choices=TYPES)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True)
     is_read = models.BooleanField(default=False)
+    others_count = models.PositiveIntegerField(default=0) # Eventos agrupados: "X e mais N pessoas"
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Contador de não lidas e "marcar como lidas"
+            models.Index(fields=['to_user', 'is_read'], name='notif_user_unread_idx'),
+            # Lista de notificações: WHERE to_user_id = ? ORDER BY created_at DESC
+            models.Index(fields=['to_user', '-created_at'], name='notif_user_created_idx'),
+        ]
+
+class VideoUpload(models.Model):
+    """Upload de vídeo em partes (ver twitter/uploads.py). O arquivo parcial fica fora do MEDIA_ROOT."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField() # Tamanho total anunciado pelo cliente
+    received = models.PositiveBigIntegerField(default=0) # Bytes já gravados em disco (offset para retomar)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def complete(self):
+        return self.received == self.size
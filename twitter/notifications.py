@@ -0,0 +1,279 @@
+"""
+Notificações: fila assíncrona com agrupamento e contador de não lidas.
+
+As views só chamam `notify()` / `cancel()`, que colocam o evento numa fila em
+memória. Um thread de fundo grava a fila em lote (`bulk_create`) a cada
+`NOTIFICATION_FLUSH_INTERVAL` segundos, agrupando eventos do mesmo tipo para o
+mesmo post ("X e mais 41 pessoas curtiram seu post"). Descurtir ou deixar de
+seguir antes do flush cancela o evento pendente.
+
+O badge do menu lateral aparece em todas as páginas, então ele vem da coluna
+`User.unread_count` (já carregada com o usuário da requisição), e não de um
+COUNT(*) nem de um cache por processo, que cada worker veria diferente.
+Gravar notificações incrementa a coluna na mesma transação; a página de
+notificações marca como lidas só as que mostrou e desconta essas.
+
+A tabela não cresce sem limite: `compact()` (comando compact_notifications)
+junta as lidas antigas do mesmo (tipo, post) numa linha só e apaga as que
+passaram da retenção.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import counters, events
+
+logger = logging.getLogger(__name__)
+
+def unread_count(user):
+    return user.unread_count
+
+
+def incr_unread(user_id, delta=1):
+    from .models import User
+    counters.bump(User, [user_id], 'unread_count', delta)
+
+
+def decr_unread(user_id, delta):
+    """Desconta do contador. Retorna o valor novo ou None se a conta não existe (ou foi excluída)."""
+    from .models import User
+    row = counters.bump_one(User, user_id, 'unread_count', -delta)
+    return row[0] if row else None
+
+
+def reset_unread(user_id):
+    from .models import User
+    User.all_objects.filter(pk=user_id).update(unread_count=0)
+    transaction.on_commit(lambda: events.publish(user_id, 'unread', {'count': 0}))
+
+
+def recount_unread(user_ids):
+    """Recalcula o contador a partir da tabela (depois de apagar notificações em lote)."""
+    from .models import Notification, User
+    unread = Notification.objects.filter(to_user_id=OuterRef('pk'), is_read=False).order_by().values('to_user_id').annotate(n=Count('*')).values('n')
+    User.all_objects.filter(pk__in=list(user_ids)).update(unread_count=Coalesce(Subquery(unread, output_field=IntegerField()), 0))
+
+
+def mark_read(user, shown):
+    """Marca como lidas só as notificações mostradas. Retorna quantas mudaram."""
+    from .models import Notification
+
+    ids = [n.pk for n in shown if not n.is_read]
+    if not ids:
+        return 0
+    marked = Notification.objects.filter(pk__in=ids, is_read=False).update(is_read=True)
+    if marked:
+        count = decr_unread(user.pk, marked)
+        if count is not None:
+            user.unread_count = count # O badge desta mesma página já sai atualizado
+            transaction.on_commit(lambda: events.publish(user.pk, 'unread', {'count': count}))
+    return marked
+
+
+def group(notifs):
+    """Agrupa uma página (já em ordem) por (tipo, post), na posição da mais recente.
+
+    Cada grupo é um dict com a notificação mais recente (`latest`), até três
+    autores distintos (`actors`), quantas pessoas além deles (`others`) e se
+    há algo não lido no grupo. A soma de `others_count` de linhas diferentes
+    pode contar a mesma pessoa duas vezes: o "e mais N" é aproximado.
+    """
+    groups = {}
+    for n in notifs:
+        g = groups.get((n.notification_type, n.post_id))
+        if g is None:
+            g = groups[(n.notification_type, n.post_id)] = {'latest': n, 'actors': [], 'total': 0, 'unread': False}
+        if n.from_user not in g['actors']:
+            g['actors'].append(n.from_user)
+        g['total'] += 1 + n.others_count
+        g['unread'] |= not n.is_read
+    for g in groups.values():
+        g['actors'] = g['actors'][:3]
+        g['others'] = max(g.pop('total') - len(g['actors']), 0)
+    return list(groups.values())
+
+
+class NotificationQueue:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # (to_user_id, tipo, post_id) -> {from_user_id: None}, em ordem de chegada
+        self._size = 0
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def put(self, to_user_id, from_user_id, notification_type, post_id=None):
+        with self._lock:
+            actors = self._pending.setdefault((to_user_id, notification_type, post_id), {})
+            if from_user_id in actors:
+                del actors[from_user_id] # Move para o fim: o último ator é o que aparece
+            else:
+                self._size += 1
+            actors[from_user_id] = None
+            full = self._size >= settings.NOTIFICATION_BATCH_SIZE
+        if not settings.NOTIFICATIONS_ASYNC:
+            self.flush()
+            return
+        self._ensure_worker()
+        if full:
+            self._wakeup.set()
+
+    def cancel(self, to_user_id, from_user_id, notification_type, post_id=None):
+        """Remove um evento que ainda não foi gravado. Retorna True se havia algo pendente."""
+        key = (to_user_id, notification_type, post_id)
+        with self._lock:
+            actors = self._pending.get(key)
+            if not actors or from_user_id not in actors:
+                return False
+            del actors[from_user_id]
+            self._size -= 1
+            if not actors:
+                del self._pending[key]
+        return True
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending, self._size = self._pending, {}, 0
+        if pending:
+            with transaction.atomic():
+                write_batch(pending)
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='notification-flusher', daemon=True)
+                self._thread.start()
+                atexit.register(self._flush_at_exit)
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Falha ao gravar notificações pendentes na saída')
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(settings.NOTIFICATION_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Falha ao gravar notificações em lote')
+            finally:
+                close_old_connections()
+
+
+def write_batch(pending):
+    """Grava os eventos agrupados, juntando com notificações não lidas equivalentes."""
+    from .models import Notification
+
+    keys = list(pending)
+    existing = {}
+    for i in range(0, len(keys), 200):
+        chunk = keys[i:i + 200]
+        match = Q()
+        for to_user_id, notification_type, post_id in chunk:
+            match |= Q(to_user_id=to_user_id, notification_type=notification_type, post_id=post_id)
+        for n in Notification.objects.filter(match, is_read=False).order_by('created_at'):
+            existing[(n.to_user_id, n.notification_type, n.post_id)] = n
+
+    new, replaced, unread_delta = [], [], {}
+    for key, actors in pending.items():
+        to_user_id, notification_type, post_id = key
+        actor_ids = list(actors)
+        others = len(actor_ids) - 1
+        old = existing.get(key)
+        if old is not None:
+            # Junta com a não lida que já existe ("e mais N") e a traz para o topo
+            others += old.others_count + (old.from_user_id not in actors)
+            replaced.append(old.pk)
+        unread_delta[to_user_id] = unread_delta.get(to_user_id, 0) + 1 # A substituída é descontada pelo signal de delete
+        new.append(Notification(to_user_id=to_user_id, from_user_id=actor_ids[-1], notification_type=notification_type, post_id=post_id, others_count=others))
+
+    if replaced:
+        Notification.objects.filter(pk__in=replaced).delete()
+    Notification.objects.bulk_create(new)
+    for user_id, delta in unread_delta.items():
+        incr_unread(user_id, delta) # Na mesma transação: o badge nunca conta notificação que não foi gravada
+    transaction.on_commit(lambda: _announce(new))
+    return new
+
+
+def _announce(new):
+    """Avisa os clientes conectados por SSE, com o badge lido da tabela de usuários."""
+    from .models import User
+
+    for n in new:
+        events.publish(n.to_user_id, 'notification', {'type': n.notification_type, 'from_user_id': n.from_user_id, 'post_id': n.post_id, 'others_count': n.others_count})
+    for user_id, count in User.all_objects.filter(pk__in={n.to_user_id for n in new}).values_list('pk', 'unread_count'):
+        events.publish(user_id, 'unread', {'count': count})
+
+
+queue = NotificationQueue()
+
+
+def notify(to_user_id, from_user_id, notification_type, post_id=None):
+    if to_user_id == from_user_id:
+        return
+    transaction.on_commit(lambda: queue.put(to_user_id, from_user_id, notification_type, post_id))
+
+
+def cancel(to_user_id, from_user_id, notification_type, post_id=None):
+    return queue.cancel(to_user_id, from_user_id, notification_type, post_id)
+
+
+# --- Manutenção ---
+
+def compact(now=None, batch_size=None, pause=0):
+    """Junta as lidas antigas e apaga as que passaram da retenção, em lotes.
+
+    Lotes pequenos, cada um na sua transação (e `pause` segundos entre eles),
+    para não segurar o lock de escrita do banco. Retorna (linhas juntadas, linhas apagadas).
+    """
+    from .models import Notification
+
+    now = now or timezone.now()
+    batch_size = batch_size or settings.NOTIFICATION_COMPACT_BATCH
+    retention = now - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    compact_before = now - timedelta(days=settings.NOTIFICATION_COMPACT_AFTER_DAYS)
+
+    pruned = 0
+    while True:
+        # Em ordem de pk (que cresce com created_at): as velhas estão no começo da tabela
+        rows = list(Notification.objects.filter(created_at__lt=retention).order_by('pk').values_list('pk', 'to_user_id', 'is_read')[:batch_size])
+        if not rows:
+            break
+        with transaction.atomic():
+            pruned += Notification.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()[0]
+            recount_unread({user_id for _, user_id, is_read in rows if not is_read})
+        time.sleep(pause)
+
+    merged = 0
+    old_read = Notification.objects.filter(is_read=True, created_at__lt=compact_before)
+    while True:
+        groups = list(
+            old_read.values('to_user_id', 'notification_type', 'post_id')
+            .annotate(rows=Count('pk'), keep=Max('pk'), others=Sum('others_count'))
+            .filter(rows__gt=1).order_by()[:batch_size]
+        )
+        if not groups:
+            break
+        with transaction.atomic():
+            for g in groups:
+                # Fica a mais recente, com todo mundo no "e mais N"
+                Notification.objects.filter(pk=g['keep']).update(others_count=g['others'] + g['rows'] - 1)
+                merged += old_read.filter(
+                    to_user_id=g['to_user_id'], notification_type=g['notification_type'], post_id=g['post_id'], pk__lt=g['keep'],
+                ).delete()[0]
+        time.sleep(pause)
+    return merged, pruned
@@ -0,0 +1,46 @@
+"""
+Paginação por cursor (keyset) sobre (created_at, id), sem OFFSET.
+
+O cursor é o par (created_at, id) do último item da página, codificado em
+base64 para poder ir na query string (`?cursor=...`).
+"""
+import base64
+from datetime import datetime
+
+from django.core.exceptions import BadRequest
+from django.db.models import Q
+
+
+def encode_cursor(created_at, pk):
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Retorna (created_at, id) ou None se não houver cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequest('Cursor inválido.')
+
+
+def paginate(queryset, cursor=None, page_size=20, field='created_at'):
+    """Retorna (itens da página, cursor da próxima página ou None).
+
+    Busca page_size + 1 linhas só para saber se existe uma próxima página.
+    """
+    before = decode_cursor(cursor)
+    if before is not None:
+        created_at, pk = before
+        queryset = queryset.filter(Q(**{f'{field}__lt': created_at}) | Q(**{field: created_at, 'pk__lt': pk}))
+    items = list(queryset.order_by(f'-{field}', '-pk')[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return items, next_cursor
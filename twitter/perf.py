@@ -0,0 +1,319 @@
+"""
+Instrumentação de desempenho por requisição (`PerformanceMiddleware`).
+
+Toda requisição entra no histograma da sua rota (só um `perf_counter` a
+mais). Uma amostra delas (`PERF_SAMPLE_RATE`) é medida em detalhe:
+
+- tempo e número de queries, via `connection.execute_wrapper`;
+- queries repetidas com o mesmo SQL (assinatura de N+1);
+- tempo de renderização de templates e acertos/faltas no cache;
+- header `Server-Timing` (aparece na aba Network do navegador) e uma linha
+  de log em JSON no logger `twitter.perf`;
+- queries lentas (`PERF_SLOW_QUERY_MS`) vão para `twitter.perf.slow_queries`.
+
+Sob ASGI só o histograma é alimentado (ver `__acall__`). Em páginas em
+streaming (twitter/streaming.py) a medição vai até o primeiro pedaço: as
+queries da lista rodam depois, enquanto o corpo é enviado.
+
+Os histogramas ficam na memória do processo, em janelas de um minuto
+(`PERF_WINDOW_MINUTES`): com vários workers, cada um tem os seus. A página
+`perf/` (só staff) mostra as rotas mais lentas, os N+1 e as queries lentas.
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(__name__ + '.slow_queries')
+
+# Limites (ms) dos buckets do histograma; o último bucket é "acima de 10s"
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_current = contextvars.ContextVar('perf_sample', default=None)
+
+
+class Sample:
+    """O que uma requisição amostrada gastou em banco, templates e cache."""
+
+    def __init__(self):
+        self.db_ms = 0.0
+        self.queries = Counter() # SQL (com placeholders) -> vezes executado
+        self.slow_queries = []
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def duplicates(self):
+        threshold = settings.PERF_DUPLICATE_THRESHOLD
+        return [(sql, count) for sql, count in self.queries.most_common() if count >= threshold]
+
+    def __call__(self, execute, sql, params, many, context):
+        # Wrapper do connection.execute_wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.db_ms += elapsed
+            self.queries[sql] += 1
+            if elapsed >= settings.PERF_SLOW_QUERY_MS:
+                self.slow_queries.append((elapsed, sql))
+
+
+class RouteStats:
+    """Histograma de latência de uma rota, em janelas de um minuto."""
+
+    def __init__(self):
+        self.windows = deque() # (minuto, contagem por bucket, soma ms, amostras, soma db ms, soma queries)
+        self.duplicates = Counter()
+
+    def _window(self, minute):
+        if not self.windows or self.windows[-1][0] != minute:
+            self.windows.append([minute, [0] * (len(BUCKETS_MS) + 1), 0.0, 0, 0.0, 0])
+        oldest = minute - settings.PERF_WINDOW_MINUTES
+        while self.windows[0][0] <= oldest:
+            self.windows.popleft()
+        return self.windows[-1]
+
+    def add(self, wall_ms, minute, sample=None):
+        window = self._window(minute)
+        window[1][bisect.bisect_left(BUCKETS_MS, wall_ms)] += 1
+        window[2] += wall_ms
+        if sample is not None:
+            window[3] += 1
+            window[4] += sample.db_ms
+            window[5] += sum(sample.queries.values())
+            for sql, count in sample.duplicates():
+                self.duplicates[sql] = max(self.duplicates[sql], count)
+
+    def summary(self, now_minute):
+        oldest = now_minute - settings.PERF_WINDOW_MINUTES
+        windows = [w for w in self.windows if w[0] > oldest]
+        counts = [sum(column) for column in zip(*(w[1] for w in windows))] or [0] * (len(BUCKETS_MS) + 1)
+        total = sum(counts)
+        if not total:
+            return None
+        sampled = sum(w[3] for w in windows)
+        return {
+            'requests': total,
+            'mean_ms': round(sum(w[2] for w in windows) / total, 1),
+            'p50_ms': _percentile(counts, total, 0.50),
+            'p95_ms': _percentile(counts, total, 0.95),
+            'p99_ms': _percentile(counts, total, 0.99),
+            'sampled': sampled,
+            'db_ms': round(sum(w[4] for w in windows) / sampled, 1) if sampled else None,
+            'queries': round(sum(w[5] for w in windows) / sampled, 1) if sampled else None,
+            'duplicates': self.duplicates.most_common(5),
+        }
+
+
+def _percentile(counts, total, fraction):
+    """Limite superior do bucket onde cai o percentil (None = acima do último limite)."""
+    target = fraction * total
+    seen = 0
+    for limit, count in zip(BUCKETS_MS + (None,), counts):
+        seen += count
+        if seen >= target:
+            return limit
+    return None
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.slow_queries = [] # As piores (ms, rota, sql), no máximo PERF_SLOW_QUERY_KEEP
+
+    def record(self, route, wall_ms, sample=None):
+        minute = int(time.time() // 60)
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteStats()
+            stats.add(wall_ms, minute, sample)
+            if sample is not None and sample.slow_queries:
+                self.slow_queries.extend((round(ms, 1), route, sql) for ms, sql in sample.slow_queries)
+                self.slow_queries.sort(reverse=True)
+                del self.slow_queries[settings.PERF_SLOW_QUERY_KEEP:]
+
+    def report(self):
+        """Rotas da mais lenta (p95, depois média) para a mais rápida, e as queries lentas."""
+        minute = int(time.time() // 60)
+        with self.lock:
+            rows = [(route, stats.summary(minute)) for route, stats in self.routes.items()]
+            slow_queries = list(self.slow_queries)
+        rows = [dict(summary, route=route) for route, summary in rows if summary]
+        rows.sort(key=lambda row: (row['p95_ms'] is None, row['p95_ms'] or 0, row['mean_ms']), reverse=True)
+        return {'routes': rows, 'slow_queries': slow_queries}
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+            self.slow_queries.clear()
+
+
+registry = Registry()
+
+
+def _instrument_templates():
+    original = Template.render
+
+    def render(self, context):
+        sample = _current.get()
+        if sample is None:
+            return original(self, context)
+        # Includes chamam Template.render de novo: só o nível mais externo conta
+        sample.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            sample.template_depth -= 1
+            if not sample.template_depth:
+                sample.template_ms += (time.perf_counter() - start) * 1000
+
+    Template.render = render
+
+
+def _instrument_cache(backend_class):
+    original_get, original_get_many = backend_class.get, backend_class.get_many
+
+    def get(self, key, default=None, version=None):
+        value = original_get(self, key, default, version)
+        sample = _current.get()
+        if sample is not None:
+            if value is default:
+                sample.cache_misses += 1
+            else:
+                sample.cache_hits += 1
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = original_get_many(self, keys, version)
+        sample = _current.get()
+        if sample is not None:
+            sample.cache_hits += len(values)
+            sample.cache_misses += len(keys) - len(values)
+        return values
+
+    backend_class.get, backend_class.get_many = get, get_many
+
+
+@contextlib.contextmanager
+def _wrap_connections(sample):
+    with contextlib.ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(sample))
+        yield
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """Instrumenta Template.render e os backends de cache (uma vez por processo)."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        _instrument_templates()
+        for backend_class in {type(caches[alias]) for alias in settings.CACHES}:
+            _instrument_cache(backend_class)
+        _installed = True
+
+
+def server_timing(wall_ms, sample):
+    queries = sum(sample.queries.values())
+    return ', '.join((
+        f'db;dur={sample.db_ms:.1f};desc="{queries} queries"',
+        f'tpl;dur={sample.template_ms:.1f}',
+        f'cache;desc="{sample.cache_hits} hit {sample.cache_misses} miss"',
+        f'total;dur={wall_ms:.1f}',
+    ))
+
+
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        install()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= settings.PERF_SAMPLE_RATE:
+            start = time.perf_counter()
+            response = self.get_response(request)
+            registry.record(_route(request), (time.perf_counter() - start) * 1000)
+            return response
+
+        sample = Sample()
+        token = _current.set(sample)
+        start = time.perf_counter()
+        try:
+            with _wrap_connections(sample):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        route = _route(request)
+        registry.record(route, wall_ms, sample)
+        if settings.PERF_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(wall_ms, sample)
+        self.log(request, response, route, wall_ms, sample)
+        return response
+
+    async def __acall__(self, request):
+        # Sob ASGI as queries rodam em outras threads (sync_to_async), com outras
+        # conexões: aqui só entra o tempo no histograma. Sem isso o SSE seria
+        # consumido de forma síncrona por um middleware só-sync.
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        registry.record(_route(request), (time.perf_counter() - start) * 1000)
+        return response
+
+    def log(self, request, response, route, wall_ms, sample):
+        duplicates = sample.duplicates()
+        logger.info(json.dumps({
+            'route': route,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'wall_ms': round(wall_ms, 1),
+            'db_ms': round(sample.db_ms, 1),
+            'queries': sum(sample.queries.values()),
+            'duplicates': [{'sql': sql[:200], 'count': count} for sql, count in duplicates],
+            'template_ms': round(sample.template_ms, 1),
+            'cache_hits': sample.cache_hits,
+            'cache_misses': sample.cache_misses,
+        }))
+        for ms, sql in sample.slow_queries:
+            slow_query_logger.warning(json.dumps({'route': route, 'ms': round(ms, 1), 'sql': sql}))
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<404>'
+    return match.view_name or match._func_path
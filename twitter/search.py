@@ -0,0 +1,172 @@
+"""
+Busca de usuários e posts com índice.
+
+- SQLite: tabelas virtuais FTS5 (`twitter_user_fts`, `twitter_post_fts`) com
+  rowid = id do usuário/post, mantidas pelos signals de save/delete. O
+  autocomplete usa o índice de prefixo do FTS5.
+- PostgreSQL: full-text (`to_tsvector`) com índices GIN de expressão e
+  prefixo em UPPER(username) com text_pattern_ops, criados na migration.
+- Outros bancos: `icontains` com LIMIT (sem índice).
+
+Os resultados vêm ordenados por relevância e paginados por número de página.
+"""
+import functools
+import re
+
+from django.db import connection
+
+USER_FTS = 'twitter_user_fts'
+POST_FTS = 'twitter_post_fts'
+MAX_PAGES = 50
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_query(text, prefix=True):
+    """Converte o texto digitado numa query FTS5 segura: termos entre aspas, o último como prefixo."""
+    words = _WORD.findall(text)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    if prefix:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _page_bounds(page, per_page):
+    page = min(max(page, 1), MAX_PAGES)
+    return (page - 1) * per_page, per_page
+
+
+class SQLiteFTSBackend:
+    def index_user(self, user):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {USER_FTS} WHERE rowid = %s', [user.pk])
+            cursor.execute(f'INSERT INTO {USER_FTS} (rowid, username, bio) VALUES (%s, %s, %s)', [user.pk, user.username, user.bio])
+
+    def index_post(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {POST_FTS} WHERE rowid = %s', [post.pk])
+            if post.content:
+                cursor.execute(f'INSERT INTO {POST_FTS} (rowid, content) VALUES (%s, %s)', [post.pk, post.content])
+
+    def remove_user(self, user_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {USER_FTS} WHERE rowid = %s', [user_id])
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {POST_FTS} WHERE rowid = %s', [post_id])
+
+    def _match(self, table, query, offset, limit, weights=''):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY bm25({table}{weights}) LIMIT %s OFFSET %s',
+                [query, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def user_ids(self, text, page=1, per_page=20):
+        query = fts_query(text)
+        if not query:
+            return []
+        # Nome de usuário pesa mais que a bio
+        return self._match(USER_FTS, query, *_page_bounds(page, per_page), weights=', 10.0, 1.0')
+
+    def post_ids(self, text, page=1, per_page=20):
+        query = fts_query(text)
+        if not query:
+            return []
+        return self._match(POST_FTS, query, *_page_bounds(page, per_page))
+
+    def autocomplete_ids(self, prefix, limit=8):
+        query = fts_query(prefix)
+        if not query:
+            return []
+        return self._match(USER_FTS, '{username} : (' + query + ')', 0, limit)
+
+
+class PostgresSearchBackend:
+    config = 'portuguese'
+    # As mesmas expressões dos índices GIN criados na migration, para o planner usá-los
+    user_vector = (
+        "setweight(to_tsvector('portuguese', COALESCE(username, '')), 'A') || "
+        "setweight(to_tsvector('portuguese', COALESCE(bio, '')), 'B')"
+    )
+    post_vector = "to_tsvector('portuguese', COALESCE(content, ''))"
+
+    def index_user(self, user):
+        pass # Os índices são de expressão, o próprio banco mantém
+
+    index_post = index_user
+
+    def remove_user(self, user_id):
+        pass
+
+    remove_post = remove_user
+
+    def _match(self, table, vector, text, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM {table} WHERE {vector} @@ websearch_to_tsquery('{self.config}', %s) "
+                f"ORDER BY ts_rank({vector}, websearch_to_tsquery('{self.config}', %s)) DESC, id DESC LIMIT %s OFFSET %s",
+                [text, text, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def user_ids(self, text, page=1, per_page=20):
+        return self._match('twitter_user', self.user_vector, text, *_page_bounds(page, per_page))
+
+    def post_ids(self, text, page=1, per_page=20):
+        return self._match('twitter_post', self.post_vector, text, *_page_bounds(page, per_page))
+
+    def autocomplete_ids(self, prefix, limit=8):
+        from .models import User
+
+        # istartswith vira UPPER(username) LIKE UPPER('ab%'), coberto pelo índice text_pattern_ops
+        return list(User.objects.filter(username__istartswith=prefix).order_by('username').values_list('id', flat=True)[:limit])
+
+
+class SimpleSearchBackend(PostgresSearchBackend):
+    """Sem índice: só para bancos sem FTS disponível."""
+
+    def user_ids(self, text, page=1, per_page=20):
+        from .models import User
+
+        offset, limit = _page_bounds(page, per_page)
+        return list(User.objects.filter(username__icontains=text).order_by('username').values_list('id', flat=True)[offset:offset + limit])
+
+    def post_ids(self, text, page=1, per_page=20):
+        from .models import Post
+
+        offset, limit = _page_bounds(page, per_page)
+        return list(Post.objects.filter(content__icontains=text).values_list('id', flat=True)[offset:offset + limit])
+
+
+@functools.cache
+def _backend_for(vendor, database):
+    if vendor == 'sqlite' and USER_FTS in connection.introspection.table_names():
+        return SQLiteFTSBackend()
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return SimpleSearchBackend()
+
+
+def get_backend():
+    return _backend_for(connection.vendor, str(connection.settings_dict['NAME']))
+
+
+_SQLITE_FILL = (
+    f'INSERT INTO {USER_FTS} (rowid, username, bio) SELECT id, username, bio FROM twitter_user',
+    f"INSERT INTO {POST_FTS} (rowid, content) SELECT id, content FROM twitter_post WHERE content != ''",
+)
+
+
+def rebuild_index():
+    """Reindexa tudo a partir das tabelas (depois de cargas com bulk_create, que não disparam signals)."""
+    if isinstance(get_backend(), SQLiteFTSBackend):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {USER_FTS}')
+            cursor.execute(f'DELETE FROM {POST_FTS}')
+            for sql in _SQLITE_FILL:
+                cursor.execute(sql)
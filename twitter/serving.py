@@ -0,0 +1,146 @@
+"""
+Entrega dos arquivos de mídia com suporte a Range (206), ETag e sendfile.
+
+Substitui o `django.views.static.serve`, que não entende Range: sem isso,
+cada salto no `<video>` baixava o arquivo de novo desde o início.
+
+- Arquivo inteiro ou intervalo aberto até o fim (`bytes=N-`, o que os
+  navegadores pedem ao tocar vídeo): `FileResponse` com o arquivo real, e o
+  servidor WSGI pode usar `sendfile` (cópia zero).
+- Intervalo fechado (`bytes=N-M`): leitura limitada ao trecho.
+- Com `MEDIA_SENDFILE_HEADER` (ex.: 'X-Accel-Redirect' no nginx ou
+  'X-Sendfile' no Apache/lighttpd), o Django só confere o caminho e o
+  servidor web entrega o arquivo, inclusive os ranges.
+
+Os arquivos vêm dos usuários e saem da origem do site: só imagem, vídeo e
+áudio mantêm o tipo (menos SVG, que roda script); o resto vai como
+`application/octet-stream` para download, sempre com `nosniff`.
+"""
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotAllowed
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+SAFE_TYPE_PREFIXES = ('image/', 'video/', 'audio/')
+UNSAFE_TYPES = {'image/svg+xml'}
+
+
+class _BoundedFile:
+    """Lê no máximo `length` bytes de um arquivo já posicionado."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Um único intervalo 'bytes=a-b' -> (início, fim). None = ignorar; ValueError = 416."""
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None # Vários intervalos ou formato desconhecido: responde o arquivo inteiro
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size - 1 # Sufixo: os últimos N bytes
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+def content_type_for(name):
+    """Tipo pela extensão, só se o navegador não puder executá-lo (nada de HTML ou SVG)."""
+    content_type = mimetypes.guess_type(name)[0]
+    if content_type and content_type.startswith(SAFE_TYPE_PREFIXES) and content_type not in UNSAFE_TYPES:
+        return content_type
+    return None
+
+
+def serve(request, path, document_root=None):
+    document_root = document_root or settings.MEDIA_ROOT
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    try:
+        full_path = Path(safe_join(document_root, path))
+    except SuspiciousFileOperation:
+        raise Http404
+    if not full_path.is_file():
+        raise Http404
+
+    stat = full_path.stat()
+    size = stat.st_size
+    etag = f'"{stat.st_mtime_ns:x}-{size:x}"'
+    content_type = content_type_for(full_path.name)
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _file_response(request, path, full_path, size, content_type, etag, stat.st_mtime)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    response['X-Content-Type-Options'] = 'nosniff'
+    if content_type is None:
+        response['Content-Disposition'] = 'attachment'
+    patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
+
+
+def _file_response(request, path, full_path, size, content_type, etag, mtime):
+    content_type = content_type or 'application/octet-stream'
+    header = settings.MEDIA_SENDFILE_HEADER
+    if header:
+        response = HttpResponse(content_type=content_type)
+        if header == 'X-Accel-Redirect':
+            # Location 'internal' do nginx apontando para o MEDIA_ROOT
+            response[header] = settings.MEDIA_SENDFILE_PREFIX.rstrip('/') + '/' + path.lstrip('/')
+        else:
+            response[header] = str(full_path)
+        return response
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range in (etag, http_date(mtime))):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+        return response
+    if byte_range is None:
+        return FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    start, end = byte_range
+    length = end - start + 1
+    file = open(full_path, 'rb')
+    file.seek(start)
+    # Intervalo até o fim: o próprio arquivo (sendfile continua valendo a partir do offset)
+    body = file if end == size - 1 else _BoundedFile(file, length)
+    response = FileResponse(body, status=206, content_type=content_type)
+    response['Content-Length'] = length
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
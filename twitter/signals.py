@@ -0,0 +1,205 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import cards, counters, events, media, notifications, search, timeline, trends
+from .graph import graph
+from .models import Comment, Notification, Post, User
+
+
+def _fan_out(post):
+    if not Post.all_objects.filter(pk=post.pk, deleted_at__isnull=True).exists():
+        return # Excluído enquanto esperava no pool
+    user_ids = timeline.fan_out(post)
+    # Aviso de "N novos posts" para quem está com a página inicial aberta
+    events.publish_many(user_ids - {post.author_id}, 'feed', {'new_posts': 1})
+
+
+def _publish(post):
+    # O autor vê o próprio post ao voltar para a home; os seguidores recebem pelo pool (O(seguidores))
+    timeline.get_backend().push([post.author_id], post.id, post.created_at)
+    timeline.submit(_fan_out, post)
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: _publish(instance))
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_timelines(sender, instance, **kwargs):
+    post_id = instance.id
+    transaction.on_commit(lambda: timeline.get_backend().remove([post_id]))
+
+
+@receiver(m2m_changed, sender=User.following.through)
+def sync_timelines_on_follow(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    # reverse=False: instance.following.add(...); reverse=True: instance.followers.add(...)
+    pairs = [(pk, [instance.pk]) for pk in pk_set] if reverse else [(instance.pk, list(pk_set))]
+    sync = timeline.follow if action == 'post_add' else timeline.unfollow
+    for user_id, author_ids in pairs:
+        transaction.on_commit(lambda u=user_id, a=author_ids: sync(u, a))
+
+
+@receiver(m2m_changed, sender=User.following.through)
+def sync_social_graph(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_clear':
+        transaction.on_commit(graph.forget)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        edges = [(pk, instance.pk) for pk in pk_set] if reverse else [(instance.pk, pk) for pk in pk_set]
+        apply = graph.add_edges if action == 'post_add' else graph.remove_edges
+        transaction.on_commit(lambda: apply(edges))
+
+
+# --- Contadores denormalizados ---
+
+def _changed_pks(instance, action, pk_set, existing):
+    """Retorna (pks que mudaram, +1/-1) para um m2m_changed.
+
+    Nas remoções, o pk_set do Django não é filtrado, então guardamos no pre_*
+    só as ligações que existem de verdade para não descontar a mais.
+    """
+    if action in ('pre_remove', 'pre_clear'):
+        instance._removed_pks = set(existing)
+    elif action == 'post_add':
+        return set(pk_set or ()), 1
+    elif action in ('post_remove', 'post_clear'):
+        return instance.__dict__.pop('_removed_pks', set()), -1
+    return set(), 0
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def count_likes(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse=False: post.likes.add(usuários); reverse=True: user.liked_posts.add(posts)
+    own, other = ('user_id', 'post_id') if reverse else ('post_id', 'user_id')
+    existing = sender.objects.filter(**{own: instance.pk})
+    if pk_set is not None:
+        existing = existing.filter(**{f'{other}__in': pk_set})
+    pks, delta = _changed_pks(instance, action, pk_set, existing.values_list(other, flat=True))
+    if not pks:
+        return
+    if reverse:
+        counters.bump(Post, pks, 'like_count', delta, touch='version')
+    else:
+        counters.bump(Post, [instance.pk], 'like_count', delta * len(pks), touch='version')
+
+
+@receiver(m2m_changed, sender=User.following.through)
+def count_follows(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse=False: user.following.add(alvos); reverse=True: user.followers.add(seguidores)
+    own, other = ('to_user_id', 'from_user_id') if reverse else ('from_user_id', 'to_user_id')
+    existing = sender.objects.filter(**{own: instance.pk})
+    if pk_set is not None:
+        existing = existing.filter(**{f'{other}__in': pk_set})
+    pks, delta = _changed_pks(instance, action, pk_set, existing.values_list(other, flat=True))
+    if not pks:
+        return
+    own_field, other_field = ('follower_count', 'following_count') if reverse else ('following_count', 'follower_count')
+    counters.bump(User, [instance.pk], own_field, delta * len(pks))
+    counters.bump(User, pks, other_field, delta)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment_added(sender, instance, created, **kwargs):
+    if created:
+        counters.bump(Post, [instance.post_id], 'comment_count', 1, touch='version')
+
+
+@receiver(post_delete, sender=Comment)
+def count_comment_removed(sender, instance, **kwargs):
+    counters.bump(Post, [instance.post_id], 'comment_count', -1, touch='version')
+
+
+@receiver(post_save, sender=Post)
+def count_repost_added(sender, instance, created, **kwargs):
+    if created and instance.repost_of_id:
+        counters.bump(Post, [instance.repost_of_id], 'repost_count', 1, touch='version')
+
+
+@receiver(post_delete, sender=Post)
+def count_repost_removed(sender, instance, **kwargs):
+    # Um retweet com tombstone já foi descontado ao ser excluído (twitter/deletion.py)
+    if instance.repost_of_id and instance.deleted_at is None:
+        counters.bump(Post, [instance.repost_of_id], 'repost_count', -1, touch='version')
+
+
+# --- Cache dos cards de post ---
+
+@receiver(post_save, sender=Post)
+def bump_card_version(sender, instance, created, **kwargs):
+    # Post editado: a versão nova muda a chave do card em cache
+    if not created:
+        Post.all_objects.filter(pk=instance.pk).update(version=F('version') + 1)
+
+
+@receiver(post_delete, sender=Post)
+def forget_card(sender, instance, **kwargs):
+    cards.forget(instance)
+
+
+# --- Badge de notificações não lidas ---
+
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        notifications.incr_unread(instance.to_user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def forget_unread_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        notifications.decr_unread(instance.to_user_id, 1)
+
+
+# --- Índice de busca ---
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    # O login salva só last_login; não precisa reindexar
+    if update_fields is not None and not {'username', 'bio'} & set(update_fields):
+        return
+    search.get_backend().index_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    search.get_backend().remove_user(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.get_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove_post(instance.pk)
+
+
+# --- Hashtags e trends ---
+
+@receiver(post_save, sender=Post)
+def record_hashtags(sender, instance, created, **kwargs):
+    if created and '#' not in instance.content:
+        return
+    trends.record_post(instance)
+
+
+# --- Processamento de mídia ---
+
+@receiver(post_save, sender=Post)
+def process_post_media(sender, instance, **kwargs):
+    for field_name in ('image', 'video'):
+        if media.needs_processing(instance, field_name):
+            media.schedule(instance, field_name)
+
+
+@receiver(post_save, sender=User)
+def process_user_images(sender, instance, **kwargs):
+    for field_name in ('profile_pic', 'cover_image'):
+        if media.needs_processing(instance, field_name):
+            media.schedule(instance, field_name)
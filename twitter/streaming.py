@@ -0,0 +1,68 @@
+"""
+Páginas renderizadas em streaming (`StreamingHttpResponse`).
+
+A página é renderizada uma vez com um marcador no lugar da lista (posts ou
+notificações). Tudo antes dele (o <head>, o menu, a caixa de postagem) sai
+no primeiro pedaço, antes de a consulta pesada da lista rodar. Depois os
+itens saem em blocos de `STREAM_CHUNK_SIZE`, conforme o
+`.iterator(chunk_size=...)` do queryset entrega as linhas, e por fim o resto
+da página (a barra lateral). Na memória fica um bloco por vez, não a página.
+
+O link "Carregar mais" vem depois da lista, então o cursor da próxima página
+precisa estar pronto antes do primeiro pedaço: as views leem antes só as
+chaves da página, numa consulta pelo índice.
+
+Sob WSGI o servidor consome o gerador e envia cada pedaço assim que ele sai.
+Sob ASGI o gerador vira um iterador assíncrono que pede um bloco por vez com
+`sync_to_async`, na mesma thread das outras consultas da requisição. Um
+gerador síncrono seria lido inteiro pelo Django antes do envio.
+
+Com `STREAMING_PAGES = False` as views usam o `render` de sempre.
+"""
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+MARKER = '<!--stream-->'
+
+
+def batches(items, size):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+def render(request, template_name, context, items, item_template, item_name, prepare=None):
+    """Resposta em streaming: o template com `stream_marker` no lugar da lista, e a lista em blocos.
+
+    `items` é consumido de forma preguiçosa (um queryset com `.iterator()`);
+    `prepare` recebe cada bloco antes de renderizar (ex.: `cards.attach`).
+    """
+    # O começo é renderizado aqui, não no gerador: o token CSRF e a sessão são
+    # usados antes de a resposta passar pelos middlewares (cookies e Vary)
+    html = render_to_string(template_name, {**context, 'stream_marker': mark_safe(MARKER)}, request=request)
+    head, tail = html.split(MARKER, 1)
+
+    def chunks():
+        yield head
+        for batch in batches(items, settings.STREAM_CHUNK_SIZE):
+            if prepare is not None:
+                batch = prepare(batch)
+            yield render_to_string(item_template, {item_name: batch}, request=request)
+        yield tail
+
+    content = chunks()
+    if isinstance(request, ASGIRequest):
+        content = _async_chunks(content)
+    return StreamingHttpResponse(content, content_type='text/html; charset=utf-8')
+
+
+async def _async_chunks(chunks):
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
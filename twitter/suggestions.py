@@ -0,0 +1,157 @@
+"""
+Quem seguir: sugestões pré-calculadas por usuário.
+
+O comando `compute_suggestions` (rodar pelo cron, ex. uma vez por hora) lê
+uma vez as ligações de seguir, os likes e os retweets e monta as matrizes
+esparsas em memória: por usuário (ou post), um `array('i')` ordenado de ids,
+como no grafo social. A pontuação de cada candidato para um usuário soma:
+
+- amigos de amigos: quantos que ele segue seguem o candidato (linha de A·A);
+- likes em comum: quem curtiu os mesmos posts (linha de L·Lᵀ), com peso
+  1/log2(1 + likes do post), para um post viral não dominar. Posts com mais
+  de `SUGGESTIONS_MAX_LIKERS` likes ficam de fora desse produto;
+- coengajamento: curtiu ou retweetou posts do candidato.
+
+Os pesos estão em `SUGGESTIONS_WEIGHTS`. Ficam de fora o próprio usuário,
+quem ele já segue e contas excluídas; quem não tem sinal nenhum (conta nova)
+recebe as contas com mais seguidores.
+
+O top-K (`SUGGESTIONS_TOP_K`) vai para `FollowSuggestion`, em lotes de
+`SUGGESTIONS_BATCH_SIZE` usuários, cada lote na sua transação. A barra
+lateral lê as primeiras linhas numa consulta pelo índice (user_id, rank),
+guardada no cache; a chave inclui `following_count`, então seguir alguém
+descarta a lista e a próxima leitura já exclui quem foi seguido.
+"""
+import heapq
+import math
+from array import array
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+
+def _cache_key(user):
+    return f'suggestions:{user.pk}:{user.following_count}'
+
+
+def for_user(user, limit=3):
+    """Sugestões da barra lateral (FollowSuggestion com `suggested` carregado), do cache ou de uma leitura indexada."""
+    from .models import FollowSuggestion, User
+
+    key = _cache_key(user)
+    rows = cache.get(key)
+    if rows is None:
+        followed = User.following.through.objects.filter(from_user_id=user.pk, to_user_id=OuterRef('suggested_id'))
+        rows = list(
+            FollowSuggestion.objects.filter(user=user, suggested__deleted_at__isnull=True)
+            .exclude(Exists(followed))
+            .select_related('suggested')
+            .only('rank', 'mutual_count', 'suggested__username', 'suggested__profile_pic', 'suggested__profile_pic_variants')
+            [:settings.SUGGESTIONS_TOP_K]
+        )
+        cache.set(key, rows, settings.SUGGESTIONS_CACHE_TIMEOUT)
+    return rows[:limit]
+
+
+def _sparse(pairs):
+    """{linha: array('i') ordenado} a partir de pares (linha, coluna)."""
+    rows = defaultdict(list)
+    for row, column in pairs:
+        rows[row].append(column)
+    return {row: array('i', sorted(columns)) for row, columns in rows.items()}
+
+
+class Matrices:
+    """Seguir, likes e engajamento, carregados uma vez para todos os lotes."""
+
+    def __init__(self):
+        from .models import Post, User
+
+        chunk = 5000
+        self.active = set(User.objects.values_list('pk', flat=True).iterator(chunk_size=chunk))
+        self.following = _sparse(User.following.through.objects.values_list('from_user_id', 'to_user_id').iterator(chunk_size=chunk))
+
+        # Só posts visíveis; um retweet conta como engajamento com o autor do original
+        author_of, reposted = {}, []
+        for pk, author_id, source_id in Post.objects.values_list('pk', 'author_id', 'repost_of_id').iterator(chunk_size=chunk):
+            if source_id:
+                reposted.append((author_id, source_id))
+            else:
+                author_of[pk] = author_id
+        self.author_of = author_of
+        self.reposted = _sparse((user_id, post_id) for user_id, post_id in reposted if post_id in author_of)
+
+        likes = [
+            (user_id, post_id)
+            for user_id, post_id in Post.likes.through.objects.values_list('user_id', 'post_id').iterator(chunk_size=chunk)
+            if post_id in author_of
+        ]
+        self.liked = _sparse(likes)
+        self.likers = _sparse((post_id, user_id) for user_id, post_id in likes)
+
+        by_followers = User.objects.order_by('-follower_count', 'pk').values_list('pk', flat=True)
+        self.popular = list(by_followers[:settings.SUGGESTIONS_TOP_K * 2])
+
+    def scores(self, user_id):
+        """(pontuação, amigos de amigos) de cada candidato: a linha do usuário nos produtos esparsos."""
+        weights = settings.SUGGESTIONS_WEIGHTS
+        empty = array('i')
+        mutual = Counter()
+        for followed in self.following.get(user_id, empty):
+            mutual.update(self.following.get(followed, empty))
+
+        scores = Counter({candidate: n * weights['follows'] for candidate, n in mutual.items()})
+        for post_id in self.liked.get(user_id, empty):
+            likers = self.likers[post_id]
+            if len(likers) <= settings.SUGGESTIONS_MAX_LIKERS:
+                weight = weights['likes'] / math.log2(1 + len(likers))
+                for liker in likers:
+                    scores[liker] += weight
+            scores[self.author_of[post_id]] += weights['engagement']
+        for post_id in self.reposted.get(user_id, empty):
+            scores[self.author_of[post_id]] += weights['engagement']
+        return scores, mutual
+
+    def top(self, user_id, k):
+        """[(sugerido, pontuação, amigos de amigos)], do melhor para o pior."""
+        scores, mutual = self.scores(user_id)
+        following = set(self.following.get(user_id, ()))
+        candidates = (
+            (candidate, score) for candidate, score in scores.items()
+            if candidate != user_id and candidate not in following and candidate in self.active
+        )
+        best = heapq.nlargest(k, candidates, key=lambda item: (item[1], -item[0]))
+        if len(best) < k:
+            # Sem sinal suficiente (conta nova): completa com as contas mais seguidas
+            seen = {candidate for candidate, _ in best} | following | {user_id}
+            best += [(pk, 0.0) for pk in self.popular if pk not in seen][:k - len(best)]
+        return [(candidate, score, mutual[candidate]) for candidate, score in best]
+
+
+def compute(batch_size=None, user_ids=None):
+    """Recalcula as sugestões (de todos os usuários, ou dos ids informados). Retorna quantas linhas gravou."""
+    from .models import FollowSuggestion, User
+
+    matrices = Matrices()
+    if user_ids is None:
+        user_ids = sorted(matrices.active)
+    k = settings.SUGGESTIONS_TOP_K
+    written = 0
+    batch_size = batch_size or settings.SUGGESTIONS_BATCH_SIZE
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        rows = [
+            FollowSuggestion(user_id=user_id, suggested_id=suggested, rank=rank, score=score, mutual_count=mutual)
+            for user_id in batch
+            for rank, (suggested, score, mutual) in enumerate(matrices.top(user_id, k), 1)
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=batch).delete()
+            FollowSuggestion.objects.bulk_create(rows)
+        users = User.objects.filter(pk__in=batch).only('following_count')
+        cache.delete_many([_cache_key(user) for user in users])
+        written += len(rows)
+    return written
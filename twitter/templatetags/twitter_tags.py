@@ -0,0 +1,46 @@
+from django import template
+from django.urls import reverse
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+from ..trends import HASHTAG_RE
+
+register = template.Library()
+
+
+@register.filter(needs_autoescape=True)
+def link_hashtags(text, autoescape=True):
+    """Transforma #tags do texto em links para o feed da tag."""
+    if autoescape:
+        text = conditional_escape(text)
+
+    def link(match):
+        url = reverse('tag_feed', args=[match.group(1).lower()])
+        return f'<a href="{url}" class="text-blue-500 hover:underline">{match.group(0)}</a>'
+
+    return mark_safe(HASHTAG_RE.sub(link, text))
+
+
+@register.simple_tag
+def variant_url(field_file, variants, size):
+    """URL da menor variante WebP com pelo menos 2x `size` px (telas retina), ou do original."""
+    if not field_file:
+        return ''
+    variants = variants or {}
+    if variants.get('source') == field_file.name:
+        webp = variants.get('webp', {})
+        widths = sorted(int(w) for w in webp)
+        if widths:
+            wanted = int(size) * 2
+            width = next((w for w in widths if w >= wanted), widths[-1])
+            return field_file.storage.url(webp[str(width)])
+    return field_file.url
+
+
+@register.simple_tag
+def video_poster(field_file, variants):
+    """URL do poster gerado pelo ffmpeg, se já existir para este vídeo."""
+    variants = variants or {}
+    if field_file and variants.get('source') == field_file.name and variants.get('poster'):
+        return field_file.storage.url(variants['poster'])
+    return ''
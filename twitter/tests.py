@@ -1,3 +1,1222 @@
-from django.test import TestCase
+"""
+Testes de regressão de desempenho.
 
-# Create your tests here.
+Um grafo sintético (centenas de usuários, milhares de posts, likes, follows e
+notificações) é gravado uma vez por classe. Os testes conferem:
+
+- o plano (`EXPLAIN QUERY PLAN`) das consultas do feed, perfil, notificações e
+  retweet: cada uma precisa usar o índice composto certo, sem varrer tabelas
+  grandes nem ordenar em B-tree temporária;
+- o número de queries por view, que não pode crescer com o tamanho da página
+  (um N+1 novo quebra o teste).
+"""
+import base64
+import json
+import random
+import re
+from collections import Counter
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.exceptions import BadRequest
+from django.db import IntegrityError, connection, router, transaction
+from django.db.models import F, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import cards, counters, db_router, deletion, interactions, notifications, pagination, perf, search, suggestions, timeline, trends
+from .graph import graph
+from .models import Comment, FollowSuggestion, Notification, Post, PostHashtag, TimelineEntry, TrendBucket, User
+
+USERS = 300
+POSTS_PER_USER = 20
+FOLLOWS_PER_USER = 30
+LIKES = 20000
+COMMENTS = 3000
+REPOSTS = 1000
+NOTIFICATIONS = 4000
+
+# Trabalho de fundo feito na hora e sem amostragem de desempenho: os testes conferem
+# o resultado logo depois da ação e contam as queries sem as do perfilador
+inline_background = override_settings(NOTIFICATIONS_ASYNC=False, MEDIA_ASYNC=False, TIMELINE_ASYNC=False, PERF_SAMPLE_RATE=0.0)
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+BIG_TABLES = ('twitter_post', 'twitter_post_likes', 'twitter_comment', 'twitter_notification', 'twitter_timelineentry', 'twitter_user_following')
+FULL_SCAN = re.compile(r'\bSCAN (%s)\b' % '|'.join(BIG_TABLES))
+
+# Teto de queries por requisição (sessão, usuário, badge e sidebar incluídos)
+QUERY_BUDGET = {
+    'home': 9, # + versões dos posts da página para o ETag (um 304 economiza todo o resto)
+    'profile': 10,
+    'notifications': 7, # + COUNT das não lidas: só as mostradas são marcadas, o badge não zera; + quem seguir
+    'retweet': 13,
+}
+
+
+class SyntheticGraphMixin:
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        User.objects.bulk_create([User(username=f'user{i}', password='!') for i in range(USERS)])
+        user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+        cls.viewer = User.objects.get(pk=user_ids[0])
+        cls.quiet = User.objects.get(pk=user_ids[-1])
+
+        Post.objects.bulk_create([
+            Post(author_id=author_id, content=f'post {n} de {author_id}')
+            for author_id in user_ids for n in range(POSTS_PER_USER)
+        ])
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        reposts = {(rng.choice(user_ids), rng.choice(post_ids)) for _ in range(REPOSTS)} # Um retweet por (autor, post)
+        Post.objects.bulk_create([Post(author_id=u, repost_of_id=p) for u, p in reposts])
+
+        Follow = User.following.through
+        follows = {(u, t) for u in user_ids for t in rng.sample(user_ids, FOLLOWS_PER_USER) if u != t}
+        Follow.objects.bulk_create([Follow(from_user_id=u, to_user_id=t) for u, t in follows])
+
+        Like = Post.likes.through
+        likes = {(rng.choice(post_ids), rng.choice(user_ids)) for _ in range(LIKES)}
+        Like.objects.bulk_create([Like(post_id=p, user_id=u) for p, u in likes])
+
+        Comment.objects.bulk_create([Comment(post_id=rng.choice(post_ids), author_id=rng.choice(user_ids), content='comentário') for _ in range(COMMENTS)])
+
+        # Quase todas as notificações vão para o `viewer`; o `quiet` recebe poucas
+        Notification.objects.bulk_create([
+            Notification(to_user_id=cls.viewer.pk if n % 40 else cls.quiet.pk, from_user_id=rng.choice(user_ids), notification_type='L', post_id=rng.choice(post_ids), is_read=n % 3 == 0)
+            for n in range(NOTIFICATIONS)
+        ])
+
+        counters.recount(Post, User, Comment)
+        for user in (cls.viewer, cls.quiet):
+            timeline.rebuild(user.pk)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE') # Estatísticas como num banco de produção
+
+    def setUp(self):
+        clear_caches()
+        self.client.force_login(self.viewer)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Os planos esperados são os do SQLite')
+@inline_background
+class QueryPlanTests(SyntheticGraphMixin, TestCase):
+    def plan(self, sql_or_queryset):
+        if isinstance(sql_or_queryset, str):
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql_or_queryset)
+                return '\n'.join(row[-1] for row in cursor.fetchall())
+        return sql_or_queryset.explain()
+
+    def assertUsesIndex(self, queryset, index):
+        plan = self.plan(queryset)
+        self.assertIn(index, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertIsNone(FULL_SCAN.search(plan), plan)
+
+    def test_profile_feed_uses_author_created_index(self):
+        queryset = Post.objects.filter(author=self.viewer).order_by('-created_at', '-pk')[:21]
+        self.assertUsesIndex(queryset, 'post_author_created_idx')
+
+    def assertVisibilityJoinsUsePrimaryKeys(self, plan, searches):
+        # VISIBLE_POSTS junta o autor, o original e o autor do original: cada junção é uma busca pela pk
+        self.assertEqual(len(re.findall(r'SEARCH \S+ USING INTEGER PRIMARY KEY', plan)), searches, plan)
+        self.assertIsNone(re.search(r'\bSCAN\b', plan), plan)
+
+    def test_profile_feed_visibility_joins_use_primary_keys(self):
+        plan = self.plan(Post.objects.filter(author=self.viewer).order_by('-created_at', '-pk')[:21])
+        self.assertIn('post_author_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertVisibilityJoinsUsePrimaryKeys(plan, 3)
+
+    def test_feed_page_visibility_joins_use_primary_keys(self):
+        # A mesma consulta de views._feed_posts: uma página de ids da timeline, com o estado do leitor
+        post_ids = [pid for _, pid in timeline.get_backend().fetch(self.viewer.pk, limit=settings.FEED_PAGE_SIZE)]
+        queryset = Post.objects.filter(pk__in=post_ids).with_viewer_state(self.viewer)
+        plan = self.plan(queryset.select_related('author', 'repost_of', 'repost_of__author').order_by('-created_at', '-pk'))
+        self.assertVisibilityJoinsUsePrimaryKeys(plan, 4) # O próprio post também vem pela pk
+
+    def test_retweet_lookup_uses_unique_repost_index(self):
+        post = Post.objects.exclude(author=self.viewer).first()
+        queryset = Post.all_objects.filter(author=self.viewer, repost_of=post, deleted_at__isnull=True).order_by() # Como no toggle
+        self.assertUsesIndex(queryset, 'unique_author_repost')
+
+    def test_unread_count_uses_unread_index(self):
+        queryset = Notification.objects.filter(to_user=self.viewer, is_read=False).order_by() # Como no count()
+        self.assertIn('notif_user_unread_idx', self.plan(queryset.values('pk')))
+
+    def test_notification_list_uses_created_index(self):
+        queryset = self.viewer.notifications.order_by('-created_at')[:50]
+        self.assertUsesIndex(queryset, 'notif_user_created_idx')
+
+    def test_comment_page_uses_post_created_index(self):
+        post = Post.objects.order_by('-comment_count').first()
+        queryset = Comment.objects.filter(post=post).order_by('-created_at', '-pk')[:21]
+        self.assertUsesIndex(queryset, 'comment_post_created_idx')
+
+    def test_timeline_fetch_uses_timeline_index(self):
+        queryset = timeline.get_backend().model.objects.filter(user=self.viewer).order_by('-created_at', '-post_id')[:21]
+        self.assertUsesIndex(queryset, 'timeline_user_created_idx')
+
+    def test_views_never_scan_large_tables(self):
+        for url in (reverse('home'), reverse('profile', args=[self.viewer.username]), reverse('notifications')):
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+                response.getvalue() # Páginas em streaming consultam o banco enquanto o corpo é lido
+                self.assertEqual(response.status_code, 200)
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                with self.subTest(url=url, sql=sql[:120]):
+                    self.assertIsNone(FULL_SCAN.search(self.plan(sql)))
+
+
+@inline_background
+class QueryCountTests(SyntheticGraphMixin, TestCase):
+    def count_queries(self, url):
+        clear_caches() # Sempre com o cache frio: o pior caso
+        graph.forget()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            response.getvalue()
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def assertConstantQueries(self, name, url):
+        # Um bloco de streaming por página: com o cache frio cada bloco busca os comentários dos seus cards
+        with override_settings(FEED_PAGE_SIZE=5, STREAM_CHUNK_SIZE=5):
+            small = self.count_queries(url)
+        with override_settings(FEED_PAGE_SIZE=20, STREAM_CHUNK_SIZE=20):
+            large = self.count_queries(url)
+        self.assertEqual(small, large, f'{name}: o número de queries cresce com a página (N+1)')
+        self.assertLessEqual(large, QUERY_BUDGET[name])
+
+    def test_home(self):
+        self.assertConstantQueries('home', reverse('home'))
+
+    def test_profile(self):
+        self.assertConstantQueries('profile', reverse('profile', args=[self.viewer.username]))
+
+    def test_notifications(self):
+        many = self.count_queries(reverse('notifications'))
+        self.client.force_login(self.quiet)
+        few = self.count_queries(reverse('notifications'))
+        self.assertEqual(many, few, 'notifications: o número de queries cresce com a lista (N+1)')
+        self.assertLessEqual(many, QUERY_BUDGET['notifications'])
+
+    def test_notifications_pages_have_constant_queries(self):
+        url = reverse('notifications')
+        with override_settings(NOTIFICATION_PAGE_SIZE=5):
+            small = self.count_queries(url)
+        with override_settings(NOTIFICATION_PAGE_SIZE=30):
+            large = self.count_queries(url)
+        self.assertEqual(small, large)
+
+    def test_not_modified_skips_the_page_queries(self):
+        for url in (reverse('home'), reverse('profile', args=[self.viewer.username])):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, headers={'if-none-match': etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertLessEqual(len(queries), 5) # Sessão, usuário e as consultas pequenas do ETag
+
+    def test_retweet_toggle(self):
+        post = Post.objects.exclude(author=self.viewer).filter(repost_of__isnull=True).order_by('-repost_count').first()
+        url = reverse('retweet', args=[post.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            added = self.count_queries(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            removed = self.count_queries(url)
+        self.assertFalse(Post.objects.filter(author=self.viewer, repost_of=post).exists())
+        self.assertLessEqual(added, QUERY_BUDGET['retweet'])
+        self.assertLessEqual(removed, QUERY_BUDGET['retweet'])
+
+
+@inline_background
+class SocialGraphTests(SyntheticGraphMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        graph.forget()
+        self.viewer.refresh_from_db() # Contadores depois do recount do setUpTestData
+
+    def test_matches_database(self):
+        Follow = User.following.through
+        for user in (self.viewer, self.quiet):
+            following = sorted(Follow.objects.filter(from_user=user).values_list('to_user_id', flat=True))
+            followers = sorted(Follow.objects.filter(to_user=user).values_list('from_user_id', flat=True))
+            self.assertEqual(list(graph.following(user)), following)
+            self.assertEqual(list(graph.followers(user)), followers)
+            self.assertEqual(graph.mutuals(user), sorted(set(following) & set(followers)))
+
+    def test_queries_hit_memory_after_first_load(self):
+        other = User.objects.exclude(pk=self.viewer.pk).order_by('-follower_count').first()
+        graph.followed_by_followed(self.viewer, other)
+        with self.assertNumQueries(0):
+            graph.is_following(self.viewer, other)
+            graph.is_following(self.viewer.pk, other.pk)
+            graph.followed_by_followed(self.viewer, other)
+
+    def test_write_through_on_follow_and_unfollow(self):
+        target = User.objects.exclude(pk__in=graph.following(self.viewer)).exclude(pk=self.viewer.pk).first()
+        graph.followers(target)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('follow_unfollow', args=[target.username]))
+        self.viewer.refresh_from_db()
+        target.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.viewer, target))
+            self.assertIn(self.viewer.pk, graph.followers(target))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('follow_unfollow', args=[target.username]))
+        self.viewer.refresh_from_db()
+        self.assertFalse(graph.is_following(self.viewer, target))
+
+    def test_stale_array_is_reloaded_when_counter_differs(self):
+        target = User.objects.exclude(pk__in=graph.following(self.viewer)).exclude(pk=self.viewer.pk).first()
+        self.viewer.following.add(target) # Sem on_commit: o array em memória fica velho
+        self.viewer.refresh_from_db()
+        self.assertTrue(graph.is_following(self.viewer, target))
+
+    @override_settings(USER_LIST_PAGE_SIZE=7)
+    def test_follower_list_pages(self):
+        url = reverse('followers_list', args=[self.viewer.username])
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {}, headers={'X-Requested-With': 'XMLHttpRequest'})
+            data = response.json()
+            seen += re.findall(r'@(user\d+)', data['html'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), sorted(self.viewer.followers.values_list('username', flat=True)))
+
+
+@inline_background
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        perf.registry.clear()
+        self.user = User.objects.create_user('perf', password='x')
+        self.client.force_login(self.user)
+
+    @override_settings(PERF_SAMPLE_RATE=1.0)
+    def test_sampled_request_gets_server_timing_and_log(self):
+        with self.assertLogs('twitter.perf', 'INFO') as logs:
+            response = self.client.get(reverse('home'))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, cache;desc="\d+ hit \d+ miss", total;dur=')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['route'], 'home')
+        self.assertGreater(line['queries'], 0)
+        self.assertGreater(line['template_ms'], 0)
+
+    @override_settings(PERF_DUPLICATE_THRESHOLD=3)
+    def test_repeated_queries_are_reported_as_n_plus_one(self):
+        for n in range(2):
+            User.objects.create_user(f'outro{n}')
+        sample = perf.Sample()
+        with perf._wrap_connections(sample):
+            for user in User.objects.all():
+                list(user.posts.all()) # Um SELECT por usuário
+        self.assertEqual([count for _, count in sample.duplicates()], [3])
+
+    def test_unsampled_requests_still_feed_histogram(self):
+        for _ in range(3):
+            response = self.client.get(reverse('notifications'))
+        self.assertNotIn('Server-Timing', response)
+        route = next(row for row in perf.registry.report()['routes'] if row['route'] == 'notifications')
+        self.assertEqual(route['requests'], 3)
+        self.assertEqual(route['sampled'], 0)
+
+    def test_report_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('perf_report')).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('perf_report') + '?format=json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('home', [row['route'] for row in response.json()['routes']])
+
+
+@override_settings(DB_REPLICAS=['replica1.internal'], REPLICA_VIEWS={'home'})
+class ReplicaRouterTests(SimpleTestCase):
+    # SimpleTestCase: sem a transação do TestCase, que manda toda leitura para o principal
+    def route(self, request, write=False):
+        """Para onde iriam as leituras feitas dentro da view (sem executar nada)."""
+        seen = []
+
+        def view(request):
+            if write:
+                router.db_for_write(Post)
+            seen.append(router.db_for_read(Post))
+            return HttpResponse()
+
+        def handler(request):
+            # O que o Django faz entre os middlewares e a view
+            request.resolver_match = resolve(request.path)
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = db_router.ReplicaMiddleware(handler)
+        response = middleware(request)
+        return seen[0], response
+
+    def test_read_heavy_view_reads_from_replica(self):
+        self.assertEqual(self.route(RequestFactory().get(reverse('home')))[0], 'replica1')
+
+    def test_other_views_and_posts_read_from_primary(self):
+        self.assertEqual(self.route(RequestFactory().get(reverse('notifications')))[0], 'default')
+        self.assertEqual(self.route(RequestFactory().post(reverse('home')))[0], 'default')
+
+    def test_write_pins_user_to_primary(self):
+        alias, response = self.route(RequestFactory().get(reverse('home')), write=True)
+        self.assertEqual(alias, 'default') # Leitura depois da escrita, na mesma requisição
+        cookie = response.cookies[db_router.STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+
+        request = RequestFactory().get(reverse('home'))
+        request.COOKIES[db_router.STICKY_COOKIE] = cookie.value
+        self.assertEqual(self.route(request)[0], 'default')
+
+    def test_outside_requests_reads_from_primary(self):
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+
+class PaginationTests(SimpleTestCase):
+    def test_cursor_round_trip(self):
+        created_at = timezone.now()
+        self.assertEqual(pagination.decode_cursor(pagination.encode_cursor(created_at, 42)), (created_at, 42))
+        self.assertIsNone(pagination.decode_cursor(''))
+
+    def test_bad_or_tampered_cursors_are_rejected(self):
+        encode = lambda raw: base64.urlsafe_b64encode(raw).decode().rstrip('=')
+        for cursor in ('!!!', 'abc', encode(b'sem-separador'), encode(b'ontem|1'), encode(b'2024-01-01T00:00:00|um'), encode(b'a|b|c'), encode(b'\xff\xfe|1')):
+            with self.subTest(cursor=cursor), self.assertRaises(BadRequest):
+                pagination.decode_cursor(cursor)
+
+
+@inline_background
+class LoadGeneratorTests(TestCase):
+    def test_run_builds_a_small_skewed_graph(self):
+        from .loadgen import LoadGenerator
+
+        logs = []
+        user_ids = LoadGenerator(users=30, posts_per_user=4, follows_per_user=5, likes=200, comments=20, notifications=40, days=2, batch_size=7, log=logs.append).run()
+        self.assertEqual(len(user_ids), 30)
+        self.assertEqual(len(logs), 8) # Uma linha por etapa
+        self.assertEqual(Post.all_objects.filter(repost_of__isnull=True).count(), 120)
+        self.assertEqual((Comment.objects.count(), Notification.objects.count()), (20, 40))
+        self.assertTrue(0 < Post.likes.through.objects.count() <= 200)
+
+        Follow = User.following.through
+        self.assertFalse(Follow.objects.filter(from_user=F('to_user')).exists())
+        followers = Counter(Follow.objects.values_list('to_user_id', flat=True))
+        self.assertGreater(followers[user_ids[0]], followers[user_ids[-1]]) # Zipf: o primeiro é o mais seguido
+
+        oldest = Post.all_objects.order_by('created_at').values_list('created_at', flat=True).first()
+        self.assertLess(oldest, timezone.now() - timedelta(hours=1)) # Datas geradas, não o auto_now_add
+        tagged = PostHashtag.objects.count()
+        self.assertEqual(tagged, Post.all_objects.filter(content__contains='#').count())
+        self.assertEqual(TrendBucket.objects.aggregate(n=Sum('count'))['n'] or 0, tagged)
+
+    def test_benchmark_skips_post_routes_without_posts(self):
+        from .benchmark import routes, sample_kwargs
+
+        user = User.objects.create_user('sozinha', password='x')
+        Post.objects.create(author=user, content='só meu')
+        patterns = dict(routes())
+        self.assertIsNone(sample_kwargs(patterns['post_comments'], user, random.Random(0)))
+        self.assertEqual(sample_kwargs(patterns['profile'], user, random.Random(0)), {'username': 'sozinha'})
+
+    def test_clear_removes_generated_users_with_raw_batched_deletes(self):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        generate = lambda: call_command(
+            'generate_load', '--clear', '--users', '12', '--likes', '40', '--comments', '10', '--notifications', '20',
+            '--batch-size', '5', stdout=StringIO(),
+        )
+        generate()
+        outsider = User.objects.create_user('de_fora', password='x')
+        load_post = Post.objects.filter(author__username__startswith='load_').first()
+        interactions.like(outsider, load_post.pk)
+        interactions.follow(outsider, load_post.author_id)
+        outsider_post = Post.objects.create(author=outsider, content='meu')
+        interactions.retweet(load_post.author, outsider_post.pk)
+        deletion.delete_user(User.objects.filter(username__startswith='load_').last()) # Tombstone: some do manager padrão
+
+        with CaptureQueriesContext(connection) as ctx:
+            generate()
+        deletes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('DELETE FROM "twitter_user"')]
+        self.assertTrue(deletes)
+        self.assertTrue(all(sql.startswith('DELETE FROM "twitter_user" WHERE "id" IN') for sql in deletes)) # DELETE direto, sem o coletor
+        self.assertEqual(User.all_objects.filter(username__startswith='load_').count(), 12)
+        outsider.refresh_from_db()
+        outsider_post.refresh_from_db()
+        self.assertEqual((outsider.following_count, outsider_post.repost_count), (0, 0)) # Contadores refeitos pelo recount
+        self.assertFalse(outsider.liked_posts.exists())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Backend FTS5 do SQLite')
+@inline_background
+class SearchTests(TestCase):
+    def setUp(self):
+        self.backend = search.get_backend()
+        if not isinstance(self.backend, search.SQLiteFTSBackend):
+            self.skipTest('SQLite sem FTS5')
+
+    def test_username_outranks_bio_and_denser_posts_come_first(self):
+        fan = User.objects.create_user('ana', password='x', bio='adoro gatos')
+        owner = User.objects.create_user('gatos', password='x')
+        passing = Post.objects.create(author=fan, content='hoje vi um gato na rua a caminho do trabalho, bem cedo')
+        about = Post.objects.create(author=fan, content='gato gato gato')
+        self.assertEqual(self.backend.user_ids('gatos'), [owner.pk, fan.pk])
+        self.assertEqual(self.backend.post_ids('gato'), [about.pk, passing.pk])
+
+    def test_autocomplete_matches_username_prefixes_only(self):
+        matches = [User.objects.create_user(name, password='x').pk for name in ('mariana', 'marcos')]
+        User.objects.create_user('joão', password='x', bio='fã da mariana')
+        self.assertCountEqual(self.backend.autocomplete_ids('mar'), matches)
+        self.assertEqual(self.backend.autocomplete_ids('mari'), matches[:1])
+        self.assertEqual(self.backend.autocomplete_ids('!!'), [])
+
+
+@inline_background
+class TrendTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('autora', password='x')
+
+    def test_record_post_syncs_tags_and_counts_only_new_uses(self):
+        post = Post.objects.create(author=self.author, content='#Django e #django com #python')
+        self.assertEqual(sorted(PostHashtag.objects.filter(post=post).values_list('hashtag__name', flat=True)), ['django', 'python'])
+        post.content = 'só #python agora'
+        post.save()
+        self.assertEqual(list(PostHashtag.objects.filter(post=post).values_list('hashtag__name', flat=True)), ['python'])
+        self.assertEqual(dict(TrendBucket.objects.values_list('hashtag__name', 'count')), {'django': 1, 'python': 1})
+
+    def test_refresh_decays_old_uses(self):
+        now = timezone.now()
+        for n in range(4):
+            Post.objects.create(author=self.author, content=f'#antiga {n}')
+        TrendBucket.objects.update(bucket=trends.bucket_start(now - timedelta(hours=3 * settings.TRENDS_HALF_LIFE_HOURS)))
+        Post.objects.create(author=self.author, content='#nova')
+        Post.objects.create(author=self.author, content='#expirada')
+        TrendBucket.objects.filter(hashtag__name='expirada').update(bucket=now - timedelta(hours=settings.TRENDS_WINDOW_HOURS + 2))
+
+        rows = trends.refresh(now)
+        self.assertEqual([(row.hashtag.name, row.post_count) for row in rows], [('nova', 1), ('antiga', 4)])
+        self.assertAlmostEqual(rows[1].score, 4 / 8, delta=0.06) # Três meias-vidas (até 1h a mais pelo bucket): cada uso vale ~1/8
+        self.assertEqual(trends.get_trending(), [{'name': 'nova', 'post_count': 1}, {'name': 'antiga', 'post_count': 4}])
+
+
+@inline_background
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.author, self.fan, self.stranger = [User.objects.create_user(name, password='x') for name in ('autora', 'fã', 'estranho')]
+        with self.captureOnCommitCallbacks(execute=True):
+            interactions.follow(self.fan, self.author.pk)
+
+    def entries(self, user):
+        return [pid for _, pid in timeline.get_backend().fetch(user.pk, limit=50)]
+
+    def test_fan_out_reaches_followers_and_the_author(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.author, content='oi')
+        self.assertEqual(self.entries(self.author), [post.pk])
+        self.assertEqual(self.entries(self.fan), [post.pk])
+        self.assertEqual(self.entries(self.stranger), [])
+
+    def test_unfollow_drops_the_authors_posts_and_follow_brings_them_back(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            posts = [Post.objects.create(author=self.author, content=f'post {n}') for n in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            interactions.follow(self.fan, self.author.pk, value=False)
+        self.assertEqual(self.entries(self.fan), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            interactions.follow(self.fan, self.author.pk, value=True)
+        self.assertEqual(self.entries(self.fan), [post.pk for post in reversed(posts)])
+
+    def test_rebuild_matches_the_fan_out(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(3):
+                Post.objects.create(author=self.author, content=f'post {n}')
+                Post.objects.create(author=self.fan, content=f'meu {n}')
+        pushed = self.entries(self.fan)
+        self.assertEqual(len(pushed), 6)
+        TimelineEntry.objects.all().delete()
+        timeline.rebuild(self.fan.pk)
+        self.assertEqual(self.entries(self.fan), pushed)
+
+    def test_post_deleted_while_queued_is_not_fanned_out(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            post = Post.objects.create(author=self.author, content='apagado')
+        deletion.delete_post(post)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.entries(self.fan), [])
+
+
+@inline_background
+class TimelineTrimTests(TestCase):
+    def test_trim_many_keeps_only_the_newest_entries(self):
+        author, a, b = [User.objects.create_user(name, password='x') for name in ('autora', 'a', 'b')]
+        posts = [Post.objects.create(author=author, content=f'post {n}') for n in range(5)]
+        backend = timeline.DatabaseTimelineBackend(max_length=3)
+        for post in posts:
+            backend.push([a.pk, b.pk], post.pk, post.created_at)
+        backend.push([author.pk], posts[0].pk, posts[0].created_at)
+
+        self.assertEqual(backend.trim_many(), 2)
+        newest = [post.pk for post in reversed(posts[2:])]
+        for user in (a, b):
+            self.assertEqual([pid for _, pid in backend.fetch(user.pk, limit=10)], newest)
+        self.assertEqual(backend.trim_many([a.pk, author.pk]), 0)
+
+
+@inline_background
+class CounterTests(TestCase):
+    def snapshot(self):
+        posts = list(Post.all_objects.order_by('pk').values_list('like_count', 'repost_count', 'comment_count'))
+        users = list(User.all_objects.order_by('pk').values_list('follower_count', 'following_count'))
+        return posts, users
+
+    def test_recount_agrees_with_the_signals(self):
+        author, a, b = [User.objects.create_user(name, password='x') for name in ('autora', 'a', 'b')]
+        post = Post.objects.create(author=author, content='oi')
+        other = Post.objects.create(author=a, content='outro')
+        # Pelo ORM (m2m_changed e post_save) e pelas interações atômicas
+        post.likes.add(a, b)
+        other.likes.add(author)
+        post.likes.remove(b)
+        a.following.add(author, b)
+        interactions.follow(b, author.pk)
+        Post.objects.create(author=b, repost_of=post)
+        interactions.retweet(a, post.pk)
+        Comment.objects.create(post=post, author=a, content='legal')
+        interactions.comment(b, post.pk, 'uau')
+
+        signals = self.snapshot()
+        self.assertEqual(signals[0][0], (1, 2, 2))
+        self.assertEqual(signals[1], [(2, 0), (0, 2), (1, 1)])
+
+        Post.all_objects.update(like_count=9, repost_count=9, comment_count=9)
+        User.all_objects.update(follower_count=9, following_count=9)
+        counters.recount(Post, User, Comment)
+        self.assertEqual(self.snapshot(), signals)
+
+
+@inline_background
+class InteractionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('fã', password='x')
+        self.author = User.objects.create_user('autor', password='x')
+        self.post = Post.objects.create(author=self.author, content='oi')
+        self.client.force_login(self.user)
+
+    def batch(self, *actions):
+        response = self.client.post(reverse('interactions_batch'), {'actions': list(actions)}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_like_is_idempotent_with_explicit_value(self):
+        for _ in range(3):
+            self.assertEqual(interactions.like(self.user, self.post.pk, True), {'liked': True, 'count': 1})
+        self.assertEqual(self.post.likes.count(), 1)
+        self.assertEqual(interactions.like(self.user, self.post.pk, False), {'liked': False, 'count': 0})
+        self.assertEqual(interactions.like(self.user, self.post.pk, False), {'liked': False, 'count': 0})
+
+    def test_like_toggle_statements(self):
+        with self.assertNumQueries(3): # DELETE (nada), INSERT e UPDATE ... RETURNING
+            self.assertTrue(interactions.like(self.user, self.post.pk)['liked'])
+        with self.assertNumQueries(2): # DELETE e UPDATE ... RETURNING
+            self.assertFalse(interactions.like(self.user, self.post.pk)['liked'])
+
+    def test_one_repost_per_author_and_post(self):
+        interactions.retweet(self.user, self.post.pk, True)
+        result = interactions.retweet(self.user, self.post.pk, True)
+        self.assertEqual(result, {'retweeted': True, 'count': 1, 'post_id': self.post.pk})
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Post.objects.create(author=self.user, repost_of=self.post)
+        self.assertEqual(Post.objects.filter(repost_of=self.post).count(), 1)
+
+    def test_follow_updates_counters_and_graph(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(interactions.follow(self.user, self.author.pk), {'following': True, 'followers': 1})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 1)
+        self.assertTrue(graph.is_following(self.user, self.author))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(interactions.follow(self.user, self.author.pk), {'following': False, 'followers': 0})
+        self.user.refresh_from_db()
+        self.assertFalse(graph.is_following(self.user, self.author))
+
+    def test_batch_applies_each_action_independently(self):
+        results = self.batch(
+            {'type': 'like', 'post_id': self.post.pk, 'value': True},
+            {'type': 'retweet', 'post_id': self.post.pk},
+            {'type': 'like', 'post_id': 999999, 'value': True},
+            {'type': 'follow', 'user_id': self.author.pk, 'value': True},
+            {'type': 'comment', 'post_id': self.post.pk, 'content': 'legal'},
+            {'type': 'dançar'},
+        )
+        self.assertEqual([r['ok'] for r in results], [True, True, False, True, True, False])
+        self.assertEqual(results[2]['error'], 'not_found')
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.repost_count, self.post.comment_count), (1, 1, 1))
+        self.assertTrue(User.following.through.objects.filter(from_user=self.user, to_user=self.author).exists())
+
+    def test_tombstoned_targets_cannot_be_liked_or_followed(self):
+        other = Post.objects.create(author=self.user, content='meu')
+        deletion.delete_post(self.post)
+        deletion.delete_user(self.author)
+        results = self.batch(
+            {'type': 'like', 'post_id': self.post.pk, 'value': True},
+            {'type': 'follow', 'user_id': self.author.pk, 'value': True},
+        )
+        self.assertEqual(results, [{'ok': False, 'error': 'not_found'}] * 2)
+        post = Post.all_objects.get(pk=self.post.pk)
+        author = User.all_objects.get(pk=self.author.pk)
+        self.assertEqual((post.like_count, post.version, author.follower_count), (0, self.post.version, 0))
+        self.assertFalse(Post.likes.through.objects.exists() or User.following.through.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+        self.assertTrue(self.batch({'type': 'like', 'post_id': other.pk, 'value': True})[0]['ok']) # Um post visível continua normal
+
+    def test_batch_rejects_integer_values(self):
+        # 1 == True em Python: sem a checagem de tipo, reenviar o lote alternaria o like
+        for _ in range(2):
+            self.assertEqual(self.batch({'type': 'like', 'post_id': self.post.pk, 'value': 1}), [{'ok': False, 'error': 'invalid'}])
+        self.assertFalse(self.post.likes.exists())
+
+    def test_viewer_state_flags_follow_the_shown_post(self):
+        liked = self.post
+        reposted = Post.objects.create(author=self.author, content='dois')
+        untouched = Post.objects.create(author=self.author, content='três')
+        interactions.like(self.user, liked.pk)
+        interactions.retweet(self.user, reposted.pk)
+        gone = Post.objects.create(author=self.author, content='quatro')
+        interactions.retweet(self.user, gone.pk)
+        deletion.delete_post(Post.objects.get(author=self.user, repost_of=gone))
+        # Retweet de outra pessoa mostra o estado do original
+        other = User.objects.create_user('outra', password='x')
+        shared = Post.objects.create(author=other, repost_of=liked)
+
+        flags = {p.pk: (p.viewer_liked, p.viewer_reposted) for p in Post.objects.with_viewer_state(self.user)}
+        self.assertEqual(flags[liked.pk], (True, False))
+        self.assertEqual(flags[shared.pk], (True, False))
+        self.assertEqual(flags[reposted.pk], (False, True))
+        self.assertEqual(flags[untouched.pk], (False, False))
+        self.assertEqual(flags[gone.pk], (False, False)) # O retweet excluído não conta
+
+    def test_batch_limit(self):
+        with override_settings(INTERACTION_BATCH_MAX=2):
+            response = self.client.post(reverse('interactions_batch'), {'actions': [{}] * 3}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@inline_background
+class NotificationQueueTests(TestCase):
+    def setUp(self):
+        self.owner, self.a, self.b, self.c = [User.objects.create_user(name, password='x') for name in ('dona', 'a', 'b', 'c')]
+        self.post = Post.objects.create(author=self.owner, content='oi')
+
+    def test_put_coalesces_and_cancel_drops_pending_events(self):
+        queue = notifications.NotificationQueue()
+        with override_settings(NOTIFICATIONS_ASYNC=True, NOTIFICATION_FLUSH_INTERVAL=3600):
+            for actor in (self.a, self.b, self.a): # Repetido: só vai para o fim
+                queue.put(self.owner.pk, actor.pk, 'L', self.post.pk)
+            queue.put(self.owner.pk, self.c.pk, 'F')
+            self.assertTrue(queue.cancel(self.owner.pk, self.c.pk, 'F'))
+            self.assertFalse(queue.cancel(self.owner.pk, self.c.pk, 'F'))
+            queue.flush()
+        [notification] = Notification.objects.filter(to_user=self.owner)
+        self.assertEqual((notification.notification_type, notification.from_user, notification.others_count), ('L', self.a, 1))
+
+    def test_write_batch_merges_into_the_existing_unread_row(self):
+        read = Notification.objects.create(to_user=self.owner, from_user=self.b, notification_type='L', post=self.post, is_read=True)
+        Notification.objects.create(to_user=self.owner, from_user=self.a, notification_type='L', post=self.post)
+        notifications.write_batch({(self.owner.pk, 'L', self.post.pk): {self.b.pk: None, self.c.pk: None}})
+
+        unread = Notification.objects.get(to_user=self.owner, is_read=False)
+        self.assertEqual((unread.from_user, unread.others_count), (self.c, 2)) # b e a no "e mais 2"
+        self.assertTrue(Notification.objects.filter(pk=read.pk).exists()) # As lidas ficam como estão
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.unread_count, 1)
+
+
+@inline_background
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('dona', password='x')
+        self.fans = [User.objects.create_user(f'fã{i}', password='x') for i in range(4)]
+        self.post = Post.objects.create(author=self.user, content='oi')
+        self.client.force_login(self.user)
+
+    def notify(self, from_user, kind='L', post=None, **fields):
+        return Notification.objects.create(to_user=self.user, from_user=from_user, notification_type=kind, post=post, **fields)
+
+    def test_only_shown_page_is_marked_read(self):
+        for fan in self.fans:
+            self.notify(fan, 'F')
+        with override_settings(NOTIFICATION_PAGE_SIZE=3):
+            response = self.client.get(reverse('notifications'))
+        self.assertEqual(self.user.notifications.filter(is_read=False).count(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications_count, 1)
+        with override_settings(NOTIFICATION_PAGE_SIZE=3):
+            page = self.client.get(reverse('notifications'), {'cursor': response.context['next_cursor']}, headers={'x-requested-with': 'XMLHttpRequest'}).json()
+        self.assertIsNone(page['next_cursor'])
+        self.assertEqual(self.user.notifications.filter(is_read=False).count(), 0)
+
+    def test_unread_badge_is_shared_by_every_worker(self):
+        # O badge é uma coluna: outro processo (aqui, o cache limpo) vê o mesmo valor
+        self.notify(self.fans[0], 'F')
+        notifications.write_batch({(self.user.pk, 'L', self.post.pk): {self.fans[1].pk: None}})
+        notifications.write_batch({(self.user.pk, 'L', self.post.pk): {self.fans[2].pk: None}}) # Junta com a não lida
+        cache.clear()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_notifications_count, 2)
+        Notification.objects.filter(notification_type='F').delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_count, 1)
+
+    def test_realtime_events_stay_off_unless_enabled(self):
+        # Sob WSGI o /events/ não entrega nada: a página não deve ficar reconectando
+        self.assertNotIn('EventSource(', self.client.get(reverse('notifications')).getvalue().decode())
+        self.assertEqual(self.client.get(reverse('event_stream')).status_code, 204)
+        with override_settings(REALTIME_EVENTS=True):
+            self.assertIn('EventSource(', self.client.get(reverse('notifications')).getvalue().decode())
+
+    def test_page_is_grouped_by_type_and_post(self):
+        for fan in self.fans[:3]:
+            self.notify(fan, 'L', self.post, is_read=True, others_count=1)
+        self.notify(self.fans[3], 'F')
+        groups = self.client.get(reverse('notifications')).context['groups']
+        self.assertEqual([g['latest'].notification_type for g in groups], ['F', 'L'])
+        self.assertEqual(len(groups[1]['actors']), 3)
+        self.assertEqual(groups[1]['others'], 3)
+
+    def test_compact_merges_old_read_and_prunes_expired(self):
+        now = timezone.now()
+        old = [self.notify(fan, 'L', self.post, is_read=True, others_count=2) for fan in self.fans[:3]]
+        expired = self.notify(self.fans[3], 'F')
+        recent = self.notify(self.fans[3], 'L', self.post, is_read=True)
+        Notification.objects.filter(pk__in=[n.pk for n in old]).update(created_at=now - timedelta(days=settings.NOTIFICATION_COMPACT_AFTER_DAYS + 1))
+        Notification.objects.filter(pk=expired.pk).update(created_at=now - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS + 1))
+
+        self.assertEqual(notifications.compact(now, batch_size=1), (2, 1))
+        kept = self.user.notifications.order_by('pk')
+        self.assertEqual([n.pk for n in kept], [old[-1].pk, recent.pk])
+        self.assertEqual(kept[0].others_count, 3 * 3 - 1)
+
+
+@inline_background
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('leitor', password='x')
+        self.author = User.objects.create_user('autora', password='x')
+        self.post = Post.objects.create(author=self.author, content='oi')
+        self.client.force_login(self.user)
+
+    def revalidate(self, url, etag, **headers):
+        return self.client.get(url, headers={'if-none-match': etag, **headers})
+
+    def test_profile_etag_changes_with_counters_and_viewer(self):
+        url = reverse('profile', args=[self.author.username])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.revalidate(url, etag).status_code, 304)
+
+        interactions.like(self.author, self.post.pk, True) # Sobe Post.version
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.author)
+        self.assertEqual(self.revalidate(url, etag).status_code, 200)
+
+    def test_login_again_gets_a_fresh_page_with_the_new_csrf_token(self):
+        from django.test import Client
+
+        client = Client(enforce_csrf_checks=True)
+        token = lambda response: re.search(r'name="csrfmiddlewaretoken" value="(\w+)"', response.getvalue().decode()).group(1)
+
+        def login():
+            page = client.get(reverse('login'))
+            client.post(reverse('login'), {'username': 'leitor', 'password': 'x', 'csrfmiddlewaretoken': token(page)})
+
+        login()
+        home = client.get(reverse('home'))
+        client.post(reverse('logout'), {'csrfmiddlewaretoken': token(home)})
+        login()
+        response = client.get(reverse('home'), headers={'if-none-match': home['ETag']})
+        self.assertEqual(response.status_code, 200)
+        posted = client.post(reverse('home'), {'content': 'de volta', 'csrfmiddlewaretoken': token(response)})
+        self.assertEqual(posted.status_code, 302)
+
+    def test_user_list_varies_on_ajax(self):
+        url = reverse('followers_list', args=[self.author.username])
+        response = self.client.get(url)
+        self.assertIn('X-Requested-With', response['Vary'])
+        ajax = self.revalidate(url, response['ETag'], **{'x-requested-with': 'XMLHttpRequest'})
+        self.assertEqual(ajax.status_code, 200)
+        self.assertEqual(ajax['Content-Type'], 'application/json')
+
+    def test_toggles_are_compact_and_not_stored(self):
+        response = self.client.post(reverse('like_post', args=[self.post.pk]), headers={'x-requested-with': 'XMLHttpRequest'})
+        self.assertEqual(response.content, b'{"liked":true,"count":1}')
+        self.assertIn('no-store', response['Cache-Control'])
+
+
+@inline_background
+class LazyCommentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('leitora', password='x')
+        self.post = Post.objects.create(author=self.user, content='oi')
+        Comment.objects.bulk_create([Comment(post=self.post, author=self.user, content=f'comentário {n}') for n in range(7)])
+        counters.recount(Post, User, Comment, post_ids=[self.post.pk])
+        self.client.force_login(self.user)
+
+    def test_card_ships_only_the_preview(self):
+        clear_caches()
+        with override_settings(COMMENT_PREVIEW_SIZE=2):
+            html = self.client.get(reverse('profile', args=[self.user.username])).getvalue().decode()
+        self.assertEqual(html.count('comentário '), 2)
+        self.assertTrue(reverse('post_comments', args=[self.post.pk]) in html)
+
+    def test_cards_have_their_own_cache(self):
+        # Um 'default' cheio não expulsa os cards, e vice-versa
+        clear_caches()
+        cards.attach([self.post])
+        key = cards.card_key(self.post)
+        self.assertIsNotNone(caches['cards'].get(key))
+        self.assertIsNone(cache.get(key))
+        for n in range(settings.CACHES['default']['OPTIONS']['MAX_ENTRIES'] + 1):
+            cache.set(f'outra:{n}', n)
+        self.assertIsNotNone(caches['cards'].get(key))
+
+    def test_version_bump_invalidates_the_cached_card(self):
+        clear_caches()
+        [post] = cards.attach([Post.objects.get(pk=self.post.pk)])
+        self.assertIn('oi', post.card_body)
+        interactions.like(User.objects.create_user('fã', password='x'), self.post.pk)
+        self.post.refresh_from_db()
+        self.post.content = 'editado'
+        self.post.save()
+
+        [post] = cards.attach([Post.objects.get(pk=self.post.pk)])
+        self.assertEqual(post.version, 2) # Like e edição
+        self.assertIn('editado', post.card_body)
+        self.assertRegex(post.card_body, r'like-count">1<')
+        # Um retweet sobe a versão do original e mostra o card dele
+        repost = Post.objects.create(author=self.user, repost_of=post)
+        [shared] = cards.attach([Post.objects.select_related('repost_of').get(pk=repost.pk)])
+        self.assertRegex(shared.card_body, r'rt-count">1<')
+        self.assertEqual(shared.card_body, cards.attach([Post.objects.get(pk=self.post.pk)])[0].card_body)
+
+    def test_comments_endpoint_pages_newest_first(self):
+        url = reverse('post_comments', args=[self.post.pk])
+        seen, cursor = [], None
+        with override_settings(COMMENT_PAGE_SIZE=3):
+            while True:
+                data = self.client.get(url, {'cursor': cursor} if cursor else {}).json()
+                seen += re.findall(r'comentário (\d)', data['html'])
+                cursor = data['next_cursor']
+                if not cursor:
+                    break
+        self.assertEqual(seen, [str(n) for n in reversed(range(7))])
+        self.assertEqual(self.client.get(reverse('post_comments', args=[999999])).status_code, 404)
+
+
+@inline_background
+class StreamingPageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('leitor', password='x')
+        Post.objects.bulk_create([Post(author=self.user, content=f'post número {n}') for n in range(12)])
+        self.client.force_login(self.user)
+
+    @override_settings(STREAM_CHUNK_SIZE=5, FEED_PAGE_SIZE=10)
+    def test_shell_first_then_posts_in_chunks(self):
+        response = self.client.get(reverse('profile', args=[self.user.username]))
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertIn('<head>', chunks[0])
+        self.assertNotIn('post número', chunks[0])
+        self.assertEqual([chunk.count('class="post-card') for chunk in chunks[1:-1]], [5, 5])
+        self.assertIn('feed-more', chunks[-1])
+        numbers = re.findall(r'post número (\d+)', ''.join(chunks))
+        self.assertEqual(numbers, [str(n) for n in range(11, 1, -1)])
+
+    async def test_asgi_gets_an_async_iterator(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('profile', args=[self.user.username]))
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertIn('post número 11', body.decode())
+        self.assertIn(b'</html>', body)
+
+    def test_same_page_without_streaming(self):
+        streamed = self.client.get(reverse('home')).getvalue().decode()
+        with override_settings(STREAMING_PAGES=False):
+            rendered = self.client.get(reverse('home')).content.decode()
+        strip = lambda html: re.sub(r'value="\w+"|content="\w+"|\s+', '', html) # Token CSRF e espaços
+        self.assertEqual(strip(streamed), strip(rendered))
+
+
+@override_settings(REAPER_THROTTLE=0, REAPER_PAUSE=0)
+@inline_background
+class DeletionTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('autora', password='x')
+        self.fans = [User.objects.create_user(f'fã{i}', password='x') for i in range(3)]
+        for fan in self.fans:
+            interactions.follow(fan, self.author.pk)
+        self.post = Post.objects.create(author=self.author, content='viral')
+        for fan in self.fans:
+            interactions.like(fan, self.post.pk)
+            interactions.retweet(fan, self.post.pk)
+            interactions.comment(fan, self.post.pk, 'uau')
+
+    def test_deleted_post_and_its_retweets_disappear_at_once(self):
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('delete_post', args=[self.post.pk]))
+        self.assertFalse(any(q['sql'].startswith('DELETE') for q in ctx.captured_queries))
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertFalse(Post.objects.filter(repost_of=self.post).exists())
+        self.assertEqual(Post.all_objects.filter(repost_of=self.post).count(), 3)
+        self.client.force_login(self.fans[0])
+        self.assertNotContains(self.client.get(reverse('home')), 'viral')
+
+    def test_reaper_removes_dependents_in_batches(self):
+        deletion.delete_post(self.post)
+        with CaptureQueriesContext(connection) as ctx:
+            counts = deletion.reap(batch_size=2)
+        self.assertFalse(Post.all_objects.exists())
+        self.assertFalse(Comment.objects.exists() or Notification.objects.filter(post__isnull=False).exists())
+        self.assertEqual(counts['twitter_comment'], 3)
+        # 3 comentários em lotes de 2
+        self.assertEqual(sum(q['sql'].startswith('DELETE FROM "twitter_comment"') for q in ctx.captured_queries), 2)
+
+    def test_deleting_own_retweet_allows_retweeting_again(self):
+        repost = Post.objects.get(author=self.fans[0], repost_of=self.post)
+        deletion.delete_post(repost)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).repost_count, 2)
+        self.assertTrue(interactions.retweet(self.fans[0], self.post.pk)['retweeted'])
+        deletion.reap()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).repost_count, 3)
+
+    def test_deleted_account_is_hidden_then_reaped_with_counters_fixed(self):
+        fan = self.fans[0]
+        deletion.delete_user(fan)
+        self.assertFalse(self.client.login(username=fan.username, password='x'))
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(reverse('profile', args=[fan.username])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('post_comments', args=[self.post.pk])).json()['html'].count('uau'), 2)
+
+        deletion.reap(batch_size=1)
+        self.assertFalse(User.all_objects.filter(pk=fan.pk).exists())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.like_count, post.repost_count, post.comment_count), (2, 2, 2))
+        self.assertEqual(User.objects.get(pk=self.author.pk).follower_count, 2)
+
+    def test_media_files_are_removed_with_the_post(self):
+        import tempfile
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            image = default_storage.save('post_images/foto.png', ContentFile(b'png'))
+            webp = default_storage.save('post_images/foto.320w.webp', ContentFile(b'webp'))
+            orphan = default_storage.save('post_images/perdida.png', ContentFile(b'png'))
+            post = Post.objects.create(author=self.author, image=image, image_variants={'webp': {'320': webp}})
+            deletion.delete_post(post)
+            self.assertEqual(deletion.reap()['files'], 2)
+            self.assertFalse(default_storage.exists(image) or default_storage.exists(webp))
+            self.assertEqual(deletion.sweep_media(grace_hours=0), 1)
+            self.assertFalse(default_storage.exists(orphan))
+
+
+@inline_background
+class SuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.me, self.friend, self.fof, self.twin, self.star = [User.objects.create_user(name, password='x') for name in ('eu', 'amiga', 'amiga_da_amiga', 'gêmea', 'estrela')]
+        interactions.follow(self.me, self.friend.pk)
+        interactions.follow(self.friend, self.fof.pk)
+        post = Post.objects.create(author=self.star, content='todo mundo curtiu')
+        for user in (self.me, self.twin):
+            interactions.like(user, post.pk)
+
+    def test_ranks_friends_of_friends_co_likers_and_engagement(self):
+        suggestions.compute()
+        rows = FollowSuggestion.objects.filter(user=self.me)
+        self.assertEqual([row.suggested for row in rows][:3], [self.star, self.fof, self.twin])
+        self.assertEqual(rows.get(suggested=self.fof).mutual_count, 1)
+        self.assertFalse(rows.filter(suggested__in=[self.me, self.friend]).exists())
+
+    def test_new_account_gets_the_most_followed(self):
+        newcomer = User.objects.create_user('novata', password='x')
+        suggestions.compute(user_ids=[newcomer.pk])
+        self.assertEqual(FollowSuggestion.objects.filter(user=newcomer).first().suggested, self.friend)
+
+    def test_sidebar_is_one_indexed_read_and_drops_who_was_followed(self):
+        suggestions.compute()
+        with self.assertNumQueries(1):
+            suggestions.for_user(self.me)
+        with self.assertNumQueries(0):
+            suggestions.for_user(self.me)
+        self.client.force_login(self.me)
+        self.assertContains(self.client.get(reverse('search_users')), '@estrela')
+        interactions.follow(self.me, self.star.pk)
+        self.me.refresh_from_db()
+        self.assertNotIn(self.star, [s.suggested for s in suggestions.for_user(self.me)])
+
+
+class WarmupTests(SimpleTestCase):
+    def test_warm_compiles_every_template_and_the_url_resolver(self):
+        from django.template import engines
+
+        from . import warmup
+
+        names = warmup.template_names(engines['django'])
+        self.assertIn('twitter/base.html', names)
+        timings = warmup.warm(database=False)
+        self.assertEqual(timings['templates'][0], len(names))
+        self.assertGreater(timings['urls'][0], 0)
+
+    def test_signup_form_classes_are_set_once_on_the_class(self):
+        from django.contrib.auth.forms import UserCreationForm
+
+        from .forms import SIGNUP_INPUT_CLASS, CustomUserCreationForm
+
+        self.assertEqual({f.widget.attrs['class'] for f in CustomUserCreationForm.base_fields.values()}, {SIGNUP_INPUT_CLASS})
+        self.assertNotIn('class', UserCreationForm.base_fields['password1'].widget.attrs) # O do admin fica intacto
+        self.assertEqual(CustomUserCreationForm().fields['password1'].widget.attrs['class'], SIGNUP_INPUT_CLASS)
+
+
+@inline_background
+class MediaProcessingTests(TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.user = User.objects.create_user('fotógrafa', password='x')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def process(self, size):
+        from io import BytesIO
+
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from PIL import Image
+
+        from . import media
+
+        buffer = BytesIO()
+        Image.new('RGB', size, 'teal').save(buffer, format='PNG')
+        name = default_storage.save('post_images/foto.png', ContentFile(buffer.getvalue()))
+        post = Post.objects.create(author=self.user, image=name)
+        media.process_image(Post, post.pk, 'image')
+        post.refresh_from_db()
+        return post
+
+    def test_process_image_writes_webp_variants_no_wider_than_asked(self):
+        from django.core.files.storage import default_storage
+        from PIL import Image
+
+        with override_settings(MEDIA_ROOT=self.tmp.name):
+            post = self.process((2000, 1000))
+            variants = post.image_variants
+            self.assertEqual((variants['source'], variants['width'], variants['height']), (post.image.name, 2000, 1000))
+            self.assertEqual(sorted(variants['webp']), ['1280', '640'])
+            for width, name in variants['webp'].items():
+                with default_storage.open(name) as f:
+                    image = Image.open(f)
+                    self.assertEqual((image.format, image.size), ('WEBP', (int(width), int(width) // 2)))
+            self.assertEqual(post.version, 1) # URLs novas: card em cache invalidado
+
+            small = self.process((300, 200))
+            self.assertEqual(list(small.image_variants['webp']), ['640']) # Não amplia: uma variante só, do tamanho original
+
+    def test_blurhash_is_28_base83_chars_for_4x3_components(self):
+        from PIL import Image
+
+        from . import media
+
+        teal, red = media.blurhash(Image.new('RGB', (64, 48), 'teal')), media.blurhash(Image.new('RGB', (64, 48), 'red'))
+        for value in (teal, red):
+            self.assertEqual(len(value), 1 + 1 + 4 + 2 * (4 * 3 - 1)) # Componentes, máximo AC, DC e 11 AC
+            self.assertTrue(set(value) <= set(media._BASE83))
+            self.assertEqual(value[0], media._BASE83[(4 - 1) + (3 - 1) * 9]) # Número de componentes
+        self.assertNotEqual(teal, red)
+        self.assertEqual(media.blurhash(Image.new('RGB', (64, 48), 'teal')), teal)
+
+
+@inline_background
+class MediaSafetyTests(TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.user = User.objects.create_user('cineasta', password='x')
+        self.client.force_login(self.user)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_upload_accepts_only_video_types(self):
+        start = lambda **data: self.client.post(reverse('video_upload_start'), json.dumps({'size': 10, **data}), content_type='application/json')
+        with override_settings(VIDEO_UPLOAD_TEMP_DIR=self.tmp.name):
+            self.assertEqual(start(filename='x.html').status_code, 400)
+            self.assertEqual(start(filename='x.svg', type='image/svg+xml').status_code, 400)
+            self.assertEqual(start(filename='x.mp4', type='text/html').status_code, 400)
+            self.assertEqual(start(filename='x.MP4', type='video/mp4').status_code, 201)
+
+    def test_served_media_never_renders_as_html_or_svg(self):
+        from pathlib import Path
+
+        for name, body in (('x.html', b'<script>alert(1)</script>'), ('x.svg', b'<svg onload="alert(1)"/>'), ('x.png', b'png')):
+            (Path(self.tmp.name) / name).write_bytes(body)
+        with override_settings(MEDIA_ROOT=self.tmp.name):
+            for name in ('x.html', 'x.svg'):
+                response = self.client.get(f'{settings.MEDIA_URL}{name}')
+                self.assertEqual(response['Content-Type'], 'application/octet-stream')
+                self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+                self.assertEqual(response['Content-Disposition'], 'attachment')
+            response = self.client.get(f'{settings.MEDIA_URL}x.png')
+            self.assertEqual(response['Content-Type'], 'image/png')
+            self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+            response.close()
+
+    def test_exif_strip_switches_the_field_before_deleting_the_original(self):
+        from io import BytesIO
+
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        from PIL import Image
+
+        from . import media
+
+        exif = Image.Exif()
+        exif[0x010F] = 'Câmera'
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, format='JPEG', exif=exif)
+        with override_settings(MEDIA_ROOT=self.tmp.name):
+            original = default_storage.save('post_images/foto.jpg', ContentFile(buffer.getvalue()))
+            post = Post.objects.create(author=self.user, image=original)
+            media.process_image(Post, post.pk, 'image')
+            post.refresh_from_db()
+            self.assertNotEqual(post.image.name, original)
+            self.assertFalse(default_storage.exists(original))
+            with default_storage.open(post.image.name) as f:
+                self.assertFalse(Image.open(f).info.get('exif'))
+            self.assertEqual(post.image_variants['source'], post.image.name)
@@ -0,0 +1,303 @@
+"""
+Timeline materializada da página inicial (fan-out na escrita).
+
+Quando um post (ou retweet) é criado, o id dele é empurrado para a timeline
+de cada seguidor do autor e do próprio autor. A `home` só lê uma lista de ids
+já ordenada e limitada, em vez de montar o feed com um OR sobre todos os posts.
+
+O armazenamento é plugável via `settings.TIMELINE_BACKEND`:
+- `DatabaseTimelineBackend` (padrão): tabela `TimelineEntry`.
+- `LocMemTimelineBackend`: sorted sets em memória no estilo do Redis
+  (ZADD / ZREVRANGEBYSCORE / ZREMRANGEBYRANK), por processo.
+
+O fan-out custa O(seguidores), então não roda na requisição: o post entra na
+timeline do autor no commit e o resto vai para um pool de threads
+(`TIMELINE_ASYNC`, `TIMELINE_WORKERS`), como o processamento de mídia.
+
+Cada timeline guarda até `TIMELINE_MAX_LENGTH` posts. `follow` e `rebuild`
+cortam a timeline logo depois de gravar. O `push` de cada post novo não
+corta ninguém (seria uma consulta por seguidor), mas uma fração
+`TIMELINE_TRIM_SAMPLE_RATE` dos fan-outs corta os destinatários que
+passaram do limite, e o comando `trim_timelines` (cron) corta o resto.
+"""
+import bisect
+import functools
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+class BaseTimelineBackend:
+    def __init__(self, max_length=None):
+        self.max_length = max_length or settings.TIMELINE_MAX_LENGTH
+
+    def push(self, user_ids, post_id, created_at):
+        """Adiciona um post na timeline de vários usuários."""
+        raise NotImplementedError
+
+    def push_many(self, user_id, entries):
+        """Adiciona vários posts [(created_at, post_id)] na timeline de um usuário."""
+        raise NotImplementedError
+
+    def remove(self, post_ids, user_id=None):
+        """Remove posts de uma timeline (ou de todas, se user_id for None)."""
+        raise NotImplementedError
+
+    def remove_authors(self, user_id, author_ids):
+        """Remove da timeline do usuário todos os posts desses autores (unfollow)."""
+        raise NotImplementedError
+
+    def fetch(self, user_id, limit, before=None):
+        """Retorna até `limit` pares (created_at, post_id), do mais novo ao mais antigo.
+
+        `before` é um par (created_at, post_id) exclusivo, usado para paginar.
+        """
+        raise NotImplementedError
+
+    def replace(self, user_id, entries):
+        """Substitui a timeline inteira de um usuário (usado na reconstrução)."""
+        raise NotImplementedError
+
+    def trim(self, user_id):
+        """Descarta as entradas mais antigas além de `max_length`."""
+        raise NotImplementedError
+
+    def trim_many(self, user_ids=None):
+        """Corta as timelines (desses usuários, ou de todos) que passaram de `max_length`. Retorna quantas."""
+        raise NotImplementedError
+
+
+class DatabaseTimelineBackend(BaseTimelineBackend):
+    batch_size = 1000
+
+    @property
+    def model(self):
+        from .models import TimelineEntry
+        return TimelineEntry
+
+    def push(self, user_ids, post_id, created_at):
+        entries = [self.model(user_id=uid, post_id=post_id, created_at=created_at) for uid in user_ids]
+        self.model.objects.bulk_create(entries, batch_size=self.batch_size, ignore_conflicts=True)
+
+    def push_many(self, user_id, entries):
+        objs = [self.model(user_id=user_id, post_id=pid, created_at=ts) for ts, pid in entries]
+        self.model.objects.bulk_create(objs, batch_size=self.batch_size, ignore_conflicts=True)
+
+    def remove(self, post_ids, user_id=None):
+        qs = self.model.objects.filter(post_id__in=post_ids)
+        if user_id is not None:
+            qs = qs.filter(user_id=user_id)
+        qs.delete()
+
+    def remove_authors(self, user_id, author_ids):
+        self.model.objects.filter(user_id=user_id, post__author_id__in=author_ids).delete()
+
+    def fetch(self, user_id, limit, before=None):
+        from django.db.models import Q
+
+        qs = self.model.objects.filter(user_id=user_id)
+        if before is not None:
+            ts, pid = before
+            qs = qs.filter(Q(created_at__lt=ts) | Q(created_at=ts, post_id__lt=pid))
+        return list(qs.order_by('-created_at', '-post_id').values_list('created_at', 'post_id')[:limit])
+
+    def replace(self, user_id, entries):
+        self.model.objects.filter(user_id=user_id).delete()
+        self.push_many(user_id, entries[:self.max_length])
+
+    def trim(self, user_id):
+        from django.db.models import Q
+
+        # A primeira entrada que sobra, pelo índice (user, created_at); apaga dela para trás
+        qs = self.model.objects.filter(user_id=user_id)
+        cutoff = list(qs.order_by('-created_at', '-post_id').values_list('created_at', 'post_id')[self.max_length:self.max_length + 1])
+        if cutoff:
+            ts, pid = cutoff[0]
+            qs.filter(Q(created_at__lt=ts) | Q(created_at=ts, post_id__lte=pid)).delete()
+
+    def trim_many(self, user_ids=None):
+        from django.db.models import Count
+
+        qs = self.model.objects.all()
+        if user_ids is not None:
+            qs = qs.filter(user_id__in=user_ids)
+        over = qs.order_by().values('user_id').annotate(n=Count('id')).filter(n__gt=self.max_length).values_list('user_id', flat=True)
+        trimmed = 0
+        for user_id in list(over):
+            self.trim(user_id)
+            trimmed += 1
+        return trimmed
+
+
+class LocMemTimelineBackend(BaseTimelineBackend):
+    """Sorted sets em memória. Timelines ausentes são reconstruídas do banco na primeira leitura."""
+
+    def __init__(self, max_length=None):
+        super().__init__(max_length)
+        self._lock = threading.Lock()
+        self._zsets = {}      # user_id -> lista crescente de (created_at, post_id)
+        self._members = {}    # post_id -> set(user_id), para remover sem varrer tudo
+
+    def _insert(self, user_id, entry):
+        zset = self._zsets.setdefault(user_id, [])
+        i = bisect.bisect_left(zset, entry)
+        if i < len(zset) and zset[i] == entry:
+            return
+        zset.insert(i, entry)
+        self._members.setdefault(entry[1], set()).add(user_id)
+        if len(zset) > self.max_length:
+            for _, pid in zset[:-self.max_length]:
+                self._members.get(pid, set()).discard(user_id)
+            del zset[:-self.max_length]
+
+    def push(self, user_ids, post_id, created_at):
+        with self._lock:
+            for uid in user_ids:
+                # Só empurra para timelines já carregadas; as outras serão reconstruídas do banco
+                if uid in self._zsets:
+                    self._insert(uid, (created_at, post_id))
+
+    def push_many(self, user_id, entries):
+        with self._lock:
+            if user_id in self._zsets:
+                for entry in entries:
+                    self._insert(user_id, tuple(entry))
+
+    def remove(self, post_ids, user_id=None):
+        with self._lock:
+            for pid in post_ids:
+                owners = self._members.get(pid, set())
+                targets = [user_id] if user_id is not None else list(owners)
+                for uid in targets:
+                    zset = self._zsets.get(uid)
+                    if zset:
+                        self._zsets[uid] = [e for e in zset if e[1] != pid]
+                    owners.discard(uid)
+                if not owners:
+                    self._members.pop(pid, None)
+
+    def remove_authors(self, user_id, author_ids):
+        from .models import Post
+
+        with self._lock:
+            post_ids = [pid for _, pid in self._zsets.get(user_id, [])]
+        if post_ids:
+            drop = list(Post.all_objects.filter(id__in=post_ids, author_id__in=author_ids).values_list('id', flat=True)) # Inclusive os já ocultos
+            self.remove(drop, user_id=user_id)
+
+    def fetch(self, user_id, limit, before=None):
+        with self._lock:
+            loaded = user_id in self._zsets
+        if not loaded:
+            self.replace(user_id, load_entries(user_id, self.max_length))
+        with self._lock:
+            zset = self._zsets.get(user_id, [])
+            end = bisect.bisect_left(zset, tuple(before)) if before is not None else len(zset)
+            return list(reversed(zset[max(0, end - limit):end]))
+
+    def replace(self, user_id, entries):
+        with self._lock:
+            for _, pid in self._zsets.get(user_id, []):
+                self._members.get(pid, set()).discard(user_id)
+            self._zsets[user_id] = []
+            for entry in entries[:self.max_length]:
+                self._insert(user_id, tuple(entry))
+
+    def trim(self, user_id):
+        with self._lock:
+            zset = self._zsets.get(user_id)
+            if zset and len(zset) > self.max_length:
+                for _, pid in zset[:-self.max_length]:
+                    self._members.get(pid, set()).discard(user_id)
+                del zset[:-self.max_length]
+
+    def trim_many(self, user_ids=None):
+        # `_insert` já corta a cada post; isto só cobre quem chamar depois de mudar `max_length`
+        with self._lock:
+            targets = [uid for uid in (self._zsets if user_ids is None else user_ids) if len(self._zsets.get(uid, ())) > self.max_length]
+        for user_id in targets:
+            self.trim(user_id)
+        return len(targets)
+
+
+def submit(fn, *args):
+    """Roda fn(*args) no pool da timeline (ou na hora, se TIMELINE_ASYNC for False)."""
+    global _executor
+    if not settings.TIMELINE_ASYNC:
+        return fn(*args)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.TIMELINE_WORKERS, thread_name_prefix='timeline')
+    _executor.submit(_run_job, fn, *args)
+
+
+def _run_job(fn, *args):
+    close_old_connections()
+    try:
+        fn(*args)
+    except Exception:
+        logger.exception('Falha no fan-out da timeline: %s%r', fn.__name__, args)
+    finally:
+        close_old_connections()
+
+
+@functools.cache
+def get_backend():
+    return import_string(settings.TIMELINE_BACKEND)()
+
+
+def recipients(author_id):
+    """Ids que recebem um post do autor: os seguidores e o próprio autor."""
+    from .models import User
+
+    Follow = User.following.through
+    ids = set(Follow.objects.filter(to_user_id=author_id).values_list('from_user_id', flat=True))
+    ids.add(author_id)
+    return ids
+
+
+def load_entries(user_id, limit, author_ids=None):
+    """Lê do banco os posts mais recentes que deveriam estar na timeline do usuário."""
+    from .models import Post, User
+
+    if author_ids is None:
+        Follow = User.following.through
+        author_ids = list(Follow.objects.filter(from_user_id=user_id).values_list('to_user_id', flat=True))
+        author_ids.append(user_id)
+    qs = Post.objects.filter(author_id__in=author_ids).order_by('-created_at', '-id')
+    return list(qs.values_list('created_at', 'id')[:limit])
+
+
+def fan_out(post):
+    """Empurra o post para as timelines e retorna os ids que o receberam."""
+    user_ids = recipients(post.author_id)
+    backend = get_backend()
+    backend.push(user_ids, post.id, post.created_at)
+    if random.random() < settings.TIMELINE_TRIM_SAMPLE_RATE:
+        backend.trim_many(user_ids)
+    return user_ids
+
+
+def follow(user_id, author_ids):
+    """Ao seguir alguém, traz os posts recentes dele para a timeline do usuário."""
+    backend = get_backend()
+    backend.push_many(user_id, load_entries(user_id, backend.max_length, author_ids=author_ids))
+    backend.trim(user_id)
+
+
+def unfollow(user_id, author_ids):
+    get_backend().remove_authors(user_id, author_ids)
+
+
+def rebuild(user_id):
+    backend = get_backend()
+    backend.replace(user_id, load_entries(user_id, backend.max_length))
+    backend.trim(user_id) # Um fan-out no meio da reconstrução pode ter passado do limite
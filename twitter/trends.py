@@ -0,0 +1,99 @@
+"""
+Hashtags e assuntos do momento.
+
+Ao salvar um post, as hashtags do texto vão para `PostHashtag` (indexada para o
+feed `/tag/<nome>/`) e cada uso soma 1 no contador da janela de uma hora em
+`TrendBucket`. O comando `refresh_trends` (rodar pelo cron a cada poucos
+minutos) lê só os buckets recentes, aplica decaimento exponencial por idade e
+grava o top-K em `TrendingTag`. A barra lateral lê esse resultado do cache ou
+da tabela, então nenhuma requisição agrega sobre os posts.
+"""
+import heapq
+import math
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+HASHTAG_RE = re.compile(r'(?<![\w&])#(\w{1,100})', re.UNICODE)
+CACHE_KEY = 'trends:top'
+
+
+def extract_hashtags(text):
+    """Nomes únicos (em minúsculas, sem '#'), na ordem em que aparecem."""
+    return list(dict.fromkeys(name.lower() for name in HASHTAG_RE.findall(text or '')))
+
+
+def bucket_start(when):
+    return when.replace(minute=0, second=0, microsecond=0)
+
+
+def record_post(post):
+    """Sincroniza as hashtags de um post; só usos novos contam para os trends."""
+    from .models import Hashtag, PostHashtag, TrendBucket
+
+    names = extract_hashtags(post.content)
+    current = dict(PostHashtag.objects.filter(post=post).values_list('hashtag__name', 'id'))
+    removed = [pk for name, pk in current.items() if name not in names]
+    if removed:
+        PostHashtag.objects.filter(pk__in=removed).delete()
+    added = [name for name in names if name not in current]
+    if not added:
+        return
+
+    Hashtag.objects.bulk_create([Hashtag(name=name) for name in added], ignore_conflicts=True)
+    tag_ids = list(Hashtag.objects.filter(name__in=added).values_list('id', flat=True))
+    PostHashtag.objects.bulk_create(
+        [PostHashtag(post=post, hashtag_id=tag_id, created_at=post.created_at) for tag_id in tag_ids],
+        ignore_conflicts=True,
+    )
+    bucket = bucket_start(post.created_at)
+    TrendBucket.objects.bulk_create([TrendBucket(hashtag_id=tag_id, bucket=bucket) for tag_id in tag_ids], ignore_conflicts=True)
+    TrendBucket.objects.filter(hashtag_id__in=tag_ids, bucket=bucket).update(count=F('count') + 1)
+
+
+def refresh(now=None):
+    """Recalcula o top-K a partir dos buckets da janela. Retorna a lista gravada."""
+    from .models import TrendBucket, TrendingTag
+
+    now = now or timezone.now()
+    window = timedelta(hours=settings.TRENDS_WINDOW_HOURS)
+    half_life = settings.TRENDS_HALF_LIFE_HOURS
+    scores, totals = {}, {}
+    buckets = TrendBucket.objects.filter(bucket__gte=bucket_start(now - window)).values_list('hashtag_id', 'bucket', 'count')
+    for tag_id, bucket, count in buckets.iterator(chunk_size=2000):
+        age_hours = max((now - bucket).total_seconds() / 3600, 0)
+        scores[tag_id] = scores.get(tag_id, 0) + count * math.pow(0.5, age_hours / half_life)
+        totals[tag_id] = totals.get(tag_id, 0) + count
+
+    top = heapq.nlargest(settings.TRENDS_TOP_K, scores.items(), key=lambda item: item[1])
+    rows = [TrendingTag(hashtag_id=tag_id, rank=rank, score=score, post_count=totals[tag_id]) for rank, (tag_id, score) in enumerate(top, 1)]
+    with transaction.atomic():
+        TrendingTag.objects.all().delete()
+        TrendingTag.objects.bulk_create(rows)
+    cache.delete(CACHE_KEY)
+    return rows
+
+
+def prune(older_than_days=7):
+    """Apaga buckets antigos que já não entram em nenhuma janela."""
+    from .models import TrendBucket
+
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return TrendBucket.objects.filter(bucket__lt=cutoff).delete()[0]
+
+
+def get_trending(limit=5):
+    """Lista [{'name', 'post_count'}] do cache; na falta, uma leitura indexada de TrendingTag."""
+    top = cache.get(CACHE_KEY)
+    if top is None:
+        from .models import TrendingTag
+
+        rows = TrendingTag.objects.select_related('hashtag')[:settings.TRENDS_TOP_K]
+        top = [{'name': t.hashtag.name, 'post_count': t.post_count} for t in rows]
+        cache.set(CACHE_KEY, top, settings.TRENDS_CACHE_TIMEOUT)
+    return top[:limit]
@@ -0,0 +1,125 @@
+"""
+Upload de vídeo em partes, com retomada.
+
+1. POST `/uploads/video/` com {filename, size} cria um `VideoUpload` e
+   devolve o id.
+2. Cada parte vai num PUT `/uploads/video/<id>/` com o cabeçalho
+   `Content-Range: bytes início-fim/total`. O corpo é copiado do socket
+   direto para o arquivo `.part` em blocos, sem carregar a parte inteira na
+   memória. A parte só é aceita se começar exatamente no offset já gravado.
+3. Se a conexão cair, um GET no mesmo endereço devolve o offset e o cliente
+   continua dali.
+4. Com o upload completo, o formulário do post manda só o id
+   (`video_upload`). O `.part` é movido (rename, sem cópia) para o storage.
+
+Só vídeo entra: extensão e tipo em `VIDEO_TYPES` na abertura, e o `ffprobe`
+precisa achar uma stream de vídeo no arquivo completo. Sem isso um `.html`
+ou `.svg` seria servido como mídia pela própria origem do site (XSS).
+"""
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.core.files import File
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from . import media
+
+COPY_BLOCK_SIZE = 64 * 1024
+VIDEO_TYPES = {'.mp4': {'video/mp4'}, '.webm': {'video/webm'}, '.mov': {'video/quicktime'}}
+_CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class _PartFile(File):
+    # Com temporary_file_path o FileSystemStorage move o arquivo em vez de copiá-lo
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(upload):
+    return Path(settings.VIDEO_UPLOAD_TEMP_DIR) / f'{upload.pk}.part'
+
+
+def parse_content_range(header):
+    """'bytes 0-1023/4096' -> (0, 1023, 4096). Cabeçalho inválido é 400."""
+    match = _CONTENT_RANGE.match(header or '')
+    if not match:
+        raise BadRequest('Content-Range inválido.')
+    start, end, total = map(int, match.groups())
+    if start > end or end >= total:
+        raise BadRequest('Content-Range inválido.')
+    return start, end, total
+
+
+def check_video_type(filename, content_type=None):
+    """Recusa (400) o que não for mp4, webm ou mov, pela extensão e pelo tipo informado."""
+    allowed = VIDEO_TYPES.get(os.path.splitext(filename)[1].lower())
+    if allowed is None or (content_type and content_type.split(';')[0].strip().lower() not in allowed):
+        raise BadRequest('Formato de vídeo não suportado (use mp4, webm ou mov).')
+
+
+def start_upload(user, filename, size, content_type=None):
+    from .models import VideoUpload
+
+    if size <= 0 or size > settings.VIDEO_UPLOAD_MAX_SIZE:
+        raise BadRequest('Tamanho de vídeo inválido.')
+    filename = get_valid_filename(os.path.basename(filename))
+    check_video_type(filename, content_type)
+    upload = VideoUpload.objects.create(user=user, filename=filename, size=size)
+    Path(settings.VIDEO_UPLOAD_TEMP_DIR).mkdir(parents=True, exist_ok=True)
+    part_path(upload).touch()
+    return upload
+
+
+def write_chunk(upload, stream, start, end):
+    """Grava os bytes [start, end] lidos de `stream` e devolve o novo offset.
+
+    Se o corpo vier incompleto (conexão caiu), grava o que chegou: o cliente
+    retoma a partir do offset devolvido.
+    """
+    from .models import VideoUpload
+
+    with open(part_path(upload), 'r+b') as f:
+        f.seek(start)
+        f.truncate()
+        remaining = end - start + 1
+        while remaining:
+            data = stream.read(min(COPY_BLOCK_SIZE, remaining))
+            if not data:
+                break
+            f.write(data)
+            remaining -= len(data)
+    received = end + 1 - remaining
+    # Só avança se ninguém gravou outra parte no meio tempo
+    updated = VideoUpload.objects.filter(pk=upload.pk, received=start).update(received=received, updated_at=timezone.now())
+    if updated:
+        upload.received = received
+    return upload.received
+
+
+def take(upload, field_file):
+    """Move o upload completo para o storage de `field_file` e apaga o registro."""
+    if not upload.complete:
+        raise BadRequest('Upload de vídeo incompleto.')
+    path = part_path(upload)
+    if media.has_video_stream(path) is False:
+        raise BadRequest('O arquivo enviado não é um vídeo.')
+    with open(path, 'rb') as f:
+        field_file.save(upload.filename, _PartFile(f, name=str(path)), save=False)
+    if path.exists():
+        path.unlink() # Storages que copiam (S3 etc.) deixam o .part para trás
+    upload.delete()
+
+
+def expire(older_than):
+    """Apaga uploads abandonados (sem partes novas desde `older_than`)."""
+    from .models import VideoUpload
+
+    stale = list(VideoUpload.objects.filter(updated_at__lt=older_than))
+    for upload in stale:
+        part_path(upload).unlink(missing_ok=True)
+    VideoUpload.objects.filter(pk__in=[u.pk for u in stale]).delete()
+    return len(stale)
@@ -5,6 +5,11 @@ from django.contrib.auth import views as auth_views
 urlpatterns = [
     # Página Inicial e Feed
     path('', views.home, name='home'),
+    path('feed/', views.home_feed, name='home_feed'),
+
+    # Upload de vídeo em partes (retomável)
+    path('uploads/video/', views.video_upload_start, name='video_upload_start'),
+    path('uploads/video/<uuid:upload_id>/', views.video_upload_chunk, name='video_upload_chunk'),
     
     # Autenticação (Login, Logout e Cadastro)
     path('signup/', views.signup, name='signup'),
@@ -16,20 +21,33 @@ urlpatterns = [
 
     # Perfil e Edição
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('profile/<str:username>/feed/', views.profile_feed, name='profile_feed'),
     path('edit-profile/', views.edit_profile, name='edit_profile'),
+    path('delete-account/', views.delete_account, name='delete_account'),
     
     # Busca e Notificações
     path('search/', views.search_users, name='search_users'),
-    path('notifications/', views.notifications, name='notifications'),
+    path('search/autocomplete/', views.search_autocomplete, name='search_autocomplete'),
+    path('tag/<str:name>/', views.tag_feed, name='tag_feed'),
+    path('tag/<str:name>/feed/', views.tag_feed_page, name='tag_feed_page'),
+    path('notifications/', views.notifications_view, name='notifications'),
+
+    # Tempo real (Server-Sent Events, via ASGI)
+    path('events/', views.event_stream, name='event_stream'),
 
     # Interações (Likes, Follow, Retweet e Comentários)
     path('follow/<str:username>/', views.follow_unfollow, name='follow_unfollow'),
     path('like/<int:post_id>/', views.like_post, name='like_post'),
     path('retweet/<int:post_id>/', views.retweet, name='retweet'),
     path('comment/<int:post_id>/', views.add_comment, name='add_comment'),
+    path('post/<int:post_id>/comments/', views.post_comments, name='post_comments'),
     path('delete-post/<int:post_id>/', views.delete_post, name='delete_post'),
+    path('interactions/batch/', views.interactions_batch, name='interactions_batch'),
 
     # Listas de Seguidores e Seguindo
     path('profile/<str:username>/followers/', views.followers_list, name='followers_list'),
     path('profile/<str:username>/following/', views.following_list, name='following_list'),
+
+    # Desempenho por rota (só staff)
+    path('perf/', views.perf_report, name='perf_report'),
 ]
\ No newline at end of file
@@ -1,30 +1,132 @@
+import asyncio
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, update_session_auth_hash
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.exceptions import BadRequest
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.conf import settings
 from django.db.models import Q
-from .models import Post, User, Comment, Notification
+from django.template.loader import render_to_string
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.http import condition, require_http_methods, require_POST
+from django.views.decorators.vary import vary_on_headers
+from .models import Comment, Post, User, Hashtag, PostHashtag, VideoUpload
 from .forms import CustomUserCreationForm, UserUpdateForm, PostForm
+from . import cards, conditional, deletion, events, interactions, notifications, perf, search, streaming, timeline, uploads
+from .graph import graph
+from .pagination import encode_cursor, paginate
+
+def _in_order(queryset, ids):
+    """Busca os objetos pelos ids mantendo a ordem da lista (timeline, ranking da busca)."""
+    by_id = queryset.in_bulk(ids)
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+def _feed_posts(request, post_ids):
+    """Queryset (ainda não avaliado) dos posts, na ordem dos feeds: created_at e id decrescentes."""
+    posts = Post.objects.filter(pk__in=post_ids).with_viewer_state(request.user)
+    return posts.select_related('author', 'repost_of', 'repost_of__author').order_by('-created_at', '-pk')
+
+def _home_posts(request):
+    """Uma página da timeline materializada, a partir do cursor (?cursor=): (posts, próximo cursor)."""
+    page_size = settings.FEED_PAGE_SIZE
+    entries = conditional.home_entries(request) # Já lida pelo ETag
+    next_cursor = encode_cursor(*entries[page_size - 1]) if len(entries) > page_size else None
+    # A timeline guarda o created_at do próprio post, então a ordem é a mesma
+    return _feed_posts(request, [post_id for _, post_id in entries[:page_size]]), next_cursor
+
+def _profile_posts(request, view_user):
+    keys, next_cursor = conditional.profile_keys(request, view_user) # Já lidas pelo ETag
+    return _feed_posts(request, [post.pk for post in keys]), next_cursor
+
+def _home_page(request):
+    posts, next_cursor = _home_posts(request)
+    return cards.attach(list(posts)), next_cursor
+
+def _profile_page(request, view_user):
+    posts, next_cursor = _profile_posts(request, view_user)
+    return cards.attach(list(posts)), next_cursor
+
+def _render_feed(request, template_name, context, posts):
+    """Página com uma lista de posts: em streaming (STREAMING_PAGES, ver twitter/streaming.py) ou de uma vez"""
+    if settings.STREAMING_PAGES:
+        items = posts.iterator(chunk_size=settings.STREAM_CHUNK_SIZE)
+        return streaming.render(request, template_name, context, items, 'twitter/partials/post_list.html', 'posts', prepare=cards.attach)
+    return render(request, template_name, {**context, 'posts': cards.attach(list(posts))})
+
+def _tag_page(request, hashtag):
+    links, next_cursor = paginate(PostHashtag.objects.filter(hashtag=hashtag), request.GET.get('cursor'), settings.FEED_PAGE_SIZE)
+    posts = Post.objects.with_viewer_state(request.user).select_related('author', 'repost_of', 'repost_of__author')
+    return cards.attach(_in_order(posts, [link.post_id for link in links])), next_cursor
+
+def _json(data, **kwargs):
+    """JsonResponse compacto (sem espaços depois de ',' e ':')"""
+    return JsonResponse(data, json_dumps_params={'separators': (',', ':')}, **kwargs)
+
+# Páginas com ETag (twitter/conditional.py): o navegador revalida sempre (no-cache) e
+# recebe 304 se nada mudou; private impede proxies de guardar a página de outra pessoa.
+revalidate = cache_control(private=True, no_cache=True)
 
 @login_required
+@revalidate
+@condition(etag_func=conditional.home_etag)
 def home(request):
-    # Otimização: traz o autor, o post original (se for RT) e pre-carrega likes e comentários
-    followed_users = request.user.following.all()
-    posts = Post.objects.filter(
-        Q(author__in=followed_users) | Q(author=request.user)
-    ).distinct().select_related('author', 'repost_of', 'repost_of__author').prefetch_related('likes', 'comments__author')
-
     # request.FILES é obrigatório para imagens e vídeos
     form = PostForm(request.POST or None, request.FILES or None)
     if request.method == 'POST' and form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
+        upload_id = form.cleaned_data.get('video_upload')
+        if upload_id and not post.video:
+            uploads.take(get_object_or_404(VideoUpload, pk=upload_id, user=request.user), post.video)
         post.save()
         return redirect('home')
     
-    return render(request, 'twitter/home.html', {'posts': posts, 'form': form})
+    # A timeline já vem pronta e ordenada (fan-out na escrita), só buscamos os posts da página
+    posts, next_cursor = _home_posts(request)
+    return _render_feed(request, 'twitter/home.html', {'next_cursor': next_cursor, 'form': form}, posts)
+
+@login_required
+@require_POST
+def video_upload_start(request):
+    """Abre um upload de vídeo em partes. Corpo JSON: {filename, size, type}."""
+    try:
+        data = json.loads(request.body)
+        upload = uploads.start_upload(request.user, str(data['filename']), int(data['size']), str(data.get('type') or ''))
+    except (ValueError, KeyError, TypeError):
+        raise BadRequest('Dados do upload inválidos.')
+    return JsonResponse({'id': str(upload.pk), 'offset': 0, 'chunk_size': settings.VIDEO_UPLOAD_CHUNK_SIZE}, status=201)
+
+@login_required
+@require_http_methods(['GET', 'PUT'])
+def video_upload_chunk(request, upload_id):
+    """GET devolve o offset para retomar; PUT grava uma parte (Content-Range)."""
+    upload = get_object_or_404(VideoUpload, pk=upload_id, user=request.user)
+    if request.method == 'PUT':
+        start, end, total = uploads.parse_content_range(request.headers.get('Content-Range'))
+        if total != upload.size:
+            raise BadRequest('Tamanho total diferente do anunciado.')
+        if end - start + 1 > settings.VIDEO_UPLOAD_CHUNK_SIZE:
+            return JsonResponse({'offset': upload.received}, status=413)
+        if start != upload.received:
+            # Parte fora de ordem (ou repetida): o cliente retoma do offset certo
+            return JsonResponse({'offset': upload.received}, status=409)
+        uploads.write_chunk(upload, request, start, end)
+    return JsonResponse({'offset': upload.received, 'complete': upload.complete, 'chunk_size': settings.VIDEO_UPLOAD_CHUNK_SIZE})
+
+@login_required
+@revalidate
+@condition(etag_func=conditional.home_etag)
+def home_feed(request):
+    """Próxima página do feed em JSON (HTML pronto + cursor), usada pelo scroll infinito"""
+    posts, next_cursor = _home_page(request)
+    html = render_to_string('twitter/partials/post_list.html', {'posts': posts}, request=request)
+    return _json({'html': html, 'next_cursor': next_cursor})
 
 def signup(request):
     if request.user.is_authenticated:
@@ -41,10 +143,45 @@ def logout_view(request):
     return redirect('login')
 
 @login_required
+@revalidate
+@condition(etag_func=conditional.profile_etag)
 def profile(request, username):
-    view_user = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=view_user).select_related('author', 'repost_of').prefetch_related('likes', 'comments')
-    return render(request, 'twitter/profile.html', {'view_user': view_user, 'posts': posts})
+    view_user = conditional.profile_user(request, username)
+    posts, next_cursor = _profile_posts(request, view_user)
+    post_count = conditional.post_count(request, view_user)
+    context = {'view_user': view_user, 'post_count': post_count, 'next_cursor': next_cursor}
+    if view_user != request.user:
+        # Tudo pelo grafo em memória: nenhuma query se os arrays já estiverem carregados
+        known = graph.followed_by_followed(request.user, view_user)
+        context.update({
+            'is_following': graph.is_following(request.user, view_user),
+            'follows_you': graph.is_following(view_user, request.user),
+            'known_followers': _in_order(User.objects.all(), known[:3]) if known else [],
+            'known_followers_more': max(len(known) - 3, 0),
+        })
+    return _render_feed(request, 'twitter/profile.html', context, posts)
+
+@login_required
+@revalidate
+@condition(etag_func=conditional.profile_etag)
+def profile_feed(request, username):
+    view_user = conditional.profile_user(request, username)
+    posts, next_cursor = _profile_page(request, view_user)
+    html = render_to_string('twitter/partials/post_list.html', {'posts': posts}, request=request)
+    return _json({'html': html, 'next_cursor': next_cursor})
+
+@login_required
+def tag_feed(request, name):
+    hashtag = get_object_or_404(Hashtag, name=name.lower())
+    posts, next_cursor = _tag_page(request, hashtag)
+    return render(request, 'twitter/tag.html', {'hashtag': hashtag, 'posts': posts, 'next_cursor': next_cursor})
+
+@login_required
+def tag_feed_page(request, name):
+    hashtag = get_object_or_404(Hashtag, name=name.lower())
+    posts, next_cursor = _tag_page(request, hashtag)
+    html = render_to_string('twitter/partials/post_list.html', {'posts': posts}, request=request)
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
 
 @login_required
 def edit_profile(request):
@@ -54,6 +191,19 @@ def edit_profile(request):
         return redirect('profile', username=request.user.username)
     return render(request, 'twitter/edit_profile.html', {'form': form})
 
+@login_required
+def delete_account(request):
+    """Exclui a conta depois de confirmar a senha; o conteúdo some na hora e o reaper apaga depois"""
+    error = None
+    if request.method == 'POST':
+        if request.user.check_password(request.POST.get('password', '')):
+            deletion.delete_user(request.user)
+            logout(request)
+            messages.success(request, 'Sua conta foi excluída.')
+            return redirect('login')
+        error = 'Senha incorreta.'
+    return render(request, 'twitter/delete_account.html', {'error': error})
+
 @login_required
 def password_change_custom(request):
     """Troca a senha, desloga e manda para a tela de login limpa"""
@@ -69,96 +219,194 @@ def password_change_custom(request):
         form = PasswordChangeForm(request.user)
     return render(request, 'registration/password_change.html', {'form': form})
 
+def _is_ajax(request):
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
 @login_required
+@never_cache
 def like_post(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    liked = False
-    if request.user in post.likes.all():
-        post.likes.remove(request.user)
-        liked = False
-    else:
-        post.likes.add(request.user)
-        liked = True
-        if post.author != request.user:
-            Notification.objects.create(to_user=post.author, from_user=request.user, notification_type='L', post=post)
-    
+    try:
+        result = interactions.like(request.user, post_id)
+    except Post.DoesNotExist:
+        raise Http404
     # Suporte a AJAX (Não recarrega a página)
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        return JsonResponse({'liked': liked, 'count': post.likes.count()})
-        
+    if _is_ajax(request):
+        return _json(result)
     return redirect(request.META.get('HTTP_REFERER', 'home'))
 
 @login_required
+@never_cache
 def retweet(request, post_id):
-    original_post = get_object_or_404(Post, id=post_id)
-    # Sempre retuita o post original de verdade
-    source_post = original_post.repost_of if original_post.repost_of else original_post
-    
-    # Lógica de RETWEET ÚNICO (Toggle)
-    existing_rt = Post.objects.filter(author=request.user, repost_of=source_post).first()
-    
-    retweeted = False
-    if existing_rt:
-        existing_rt.delete()
-        retweeted = False
-    else:
-        new_rt = Post.objects.create(author=request.user, repost_of=source_post)
-        retweeted = True
-        if source_post.author != request.user:
-            Notification.objects.create(to_user=source_post.author, from_user=request.user, notification_type='R', post=new_rt)
-
+    # Sempre retuita o post original de verdade (um por pessoa: constraint unique_author_repost)
+    try:
+        result = interactions.retweet(request.user, post_id)
+    except Post.DoesNotExist:
+        raise Http404
     # Suporte a AJAX
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        return JsonResponse({'retweeted': retweeted, 'count': source_post.reposts.count()})
-        
+    if _is_ajax(request):
+        return _json({'retweeted': result['retweeted'], 'count': result['count']})
     return redirect(request.META.get('HTTP_REFERER', 'home'))
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    content = request.POST.get('content')
+    content = request.POST.get('content', '').strip()
     if content:
-        Comment.objects.create(post=post, author=request.user, content=content)
-        if post.author != request.user:
-            Notification.objects.create(to_user=post.author, from_user=request.user, notification_type='C', post=post)
+        try:
+            interactions.comment(request.user, post_id, content)
+        except Post.DoesNotExist:
+            raise Http404
     return redirect(request.META.get('HTTP_REFERER', 'home'))
 
+@login_required
+def post_comments(request, post_id):
+    """Comentários de um post, do mais novo para o mais antigo, em JSON (HTML pronto + cursor)"""
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments, next_cursor = paginate(
+        Comment.objects.filter(post_id=post_id, author__deleted_at__isnull=True).select_related('author'),
+        request.GET.get('cursor'), settings.COMMENT_PAGE_SIZE,
+    )
+    html = render_to_string('twitter/partials/comment_rows.html', {'comments': comments}, request=request)
+    return _json({'html': html, 'next_cursor': next_cursor})
+
 @login_required
 def follow_unfollow(request, username):
     target_user = get_object_or_404(User, username=username)
     if target_user != request.user:
-        if target_user in request.user.following.all():
-            request.user.following.remove(target_user)
-        else:
-            request.user.following.add(target_user)
-            Notification.objects.create(to_user=target_user, from_user=request.user, notification_type='F')
+        interactions.follow(request.user, target_user.pk)
     return redirect('profile', username=username)
 
 @login_required
-def notifications(request):
-    notifs = request.user.notifications.all()
-    notifs.filter(is_read=False).update(is_read=True)
-    return render(request, 'twitter/notifications.html', {'notifications': notifs})
+@never_cache
+@require_POST
+def interactions_batch(request):
+    """Várias interações da fila do front numa requisição e numa transação só.
+
+    Corpo: {"actions": [{"type": "like", "post_id": 1, "value": true}, ...]}
+    (tipos: like, retweet, follow com user_id, comment com content).
+    """
+    try:
+        actions = json.loads(request.body)['actions']
+    except (ValueError, KeyError, TypeError):
+        raise BadRequest('JSON inválido.')
+    if not isinstance(actions, list) or len(actions) > settings.INTERACTION_BATCH_MAX:
+        raise BadRequest(f'Envie até {settings.INTERACTION_BATCH_MAX} ações.')
+    return _json({'results': interactions.apply_batch(request.user, actions)})
+
+@login_required
+def notifications_view(request):
+    """Uma página de notificações (cursor), agrupada por post e tipo; só as mostradas ficam lidas"""
+    # Sem as de contas e posts excluídos (o reaper apaga depois)
+    visible = Q(post__isnull=True) | Q(post__deleted_at__isnull=True)
+    notifs, next_cursor = paginate(
+        request.user.notifications.filter(visible, from_user__deleted_at__isnull=True).select_related('from_user', 'post'),
+        request.GET.get('cursor'), settings.NOTIFICATION_PAGE_SIZE,
+    )
+    notifications.mark_read(request.user, notifs)
+    groups = notifications.group(notifs)
+    if _is_ajax(request):
+        html = render_to_string('twitter/partials/notification_rows.html', {'groups': groups}, request=request)
+        return _json({'html': html, 'next_cursor': next_cursor})
+    context = {'groups': groups, 'next_cursor': next_cursor}
+    if settings.STREAMING_PAGES:
+        return streaming.render(request, 'twitter/notifications.html', context, groups, 'twitter/partials/notification_rows.html', 'groups')
+    return render(request, 'twitter/notifications.html', context)
+
+@login_required
+async def event_stream(request):
+    """Server-Sent Events: notificações novas, contador de não lidas e aviso de novos posts"""
+    if not settings.REALTIME_EVENTS or not isinstance(request, ASGIRequest):
+        # Sob WSGI a conexão prenderia um worker inteiro; o 204 faz o EventSource parar de tentar
+        return HttpResponse(status=204)
+    user = await request.auser()
+
+    async def stream():
+        queue = events.broker.subscribe(user.pk)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=settings.EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: {event}\ndata: {json.dumps(data)}\n\n'
+        finally:
+            events.broker.unsubscribe(user.pk, queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Desliga o buffer do nginx
+    return response
 
 @login_required
 def delete_post(request, post_id):
     # Garante que só o autor pode deletar o post ou o retweet
     post = get_object_or_404(Post, id=post_id, author=request.user)
-    post.delete()
+    deletion.delete_post(post) # Some na hora; o comando reap_deleted apaga o resto em segundo plano
     return redirect(request.META.get('HTTP_REFERER', 'home'))
 
 @login_required
 def search_users(request):
-    query = request.GET.get('q', '')
-    results = User.objects.filter(username__icontains=query).exclude(id=request.user.id) if query else []
-    return render(request, 'twitter/search.html', {'results': results, 'query': query})
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    results, posts, has_next = [], [], False
+    if query:
+        backend = search.get_backend()
+        per_page = settings.SEARCH_PAGE_SIZE
+        user_ids = backend.user_ids(query, page, per_page)
+        post_ids = backend.post_ids(query, page, per_page)
+        results = _in_order(User.objects.exclude(id=request.user.id), user_ids)
+        posts = _in_order(Post.objects.select_related('author'), post_ids)
+        has_next = per_page in (len(user_ids), len(post_ids)) and page < search.MAX_PAGES
+    return render(request, 'twitter/search.html', {'results': results, 'posts': posts, 'query': query, 'page': page, 'has_next': has_next})
+
+@login_required
+def search_autocomplete(request):
+    """Sugestões de usuários pelo prefixo do nome (JSON), enquanto a pessoa digita"""
+    prefix = request.GET.get('q', '').strip()
+    ids = search.get_backend().autocomplete_ids(prefix) if prefix else []
+    users = _in_order(User.objects.only('username', 'profile_pic'), ids)
+    return JsonResponse({'results': [{'username': u.username, 'profile_pic': u.profile_pic.url} for u in users]})
 
 @login_required
+@revalidate
+@vary_on_headers('X-Requested-With') # Mesma URL em HTML ou JSON (scroll infinito)
+@condition(etag_func=conditional.followers_etag)
 def followers_list(request, username):
-    view_user = get_object_or_404(User, username=username)
-    return render(request, 'twitter/user_list.html', {'title': 'Seguidores', 'users': view_user.followers.all()})
+    view_user = conditional.profile_user(request, username)
+    return _user_list(request, 'Seguidores', graph.followers(view_user))
 
 @login_required
+@revalidate
+@vary_on_headers('X-Requested-With')
+@condition(etag_func=conditional.following_etag)
 def following_list(request, username):
-    view_user = get_object_or_404(User, username=username)
-    return render(request, 'twitter/user_list.html', {'title': 'Seguindo', 'users': view_user.following.all()})
\ No newline at end of file
+    view_user = conditional.profile_user(request, username)
+    return _user_list(request, 'Seguindo', graph.following(view_user))
+
+def _user_list(request, title, ids):
+    """Uma página da lista de ids do grafo (ordenada por id; ?cursor= é o último id visto)"""
+    users, next_cursor = conditional.list_users(request, ids)
+    if _is_ajax(request):
+        html = render_to_string('twitter/partials/user_rows.html', {'users': users}, request=request)
+        return _json({'html': html, 'next_cursor': next_cursor})
+    return render(request, 'twitter/user_list.html', {'title': title, 'users': users, 'next_cursor': next_cursor})
+
+@staff_member_required
+def perf_report(request):
+    """Rotas mais lentas, N+1 e queries lentas deste processo (?format=json para scripts)"""
+    if request.method == 'POST':
+        perf.registry.clear()
+        return redirect('perf_report')
+    report = perf.registry.report()
+    if request.GET.get('format') == 'json':
+        return JsonResponse(report)
+    return render(request, 'twitter/perf.html', {
+        'report': report,
+        'window': settings.PERF_WINDOW_MINUTES,
+        'sample_rate': settings.PERF_SAMPLE_RATE,
+    })
@@ -0,0 +1,125 @@
+"""
+Aquecimento do processo antes da primeira requisição.
+
+Sem isso cada worker do gunicorn paga na primeira requisição: importar as
+views (pelo urlconf), montar o resolver de URLs, ler e compilar cada template
+e abrir a conexão com o banco (no SQLite, rodar os PRAGMAs).
+
+Com `preload_app` (gunicorn.conf.py), `warm()` roda uma vez no mestre, antes
+do fork: os workers já nascem com as views importadas, o resolver montado e os
+templates compilados no cached loader (memória compartilhada por
+copy-on-write). A conexão com o banco não pode atravessar o fork: o mestre
+fecha as dele e cada worker abre a sua em `connect()` (só vale a pena com
+conexões persistentes, `CONN_MAX_AGE` > 0 ou pool).
+
+`probe()` é o processo filho do comando `startup_benchmark`: mede a importação
+e as primeiras requisições de um processo novo, como um worker recém-criado
+depois de um autoscaling.
+"""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+
+def _elapsed(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def template_names(engine):
+    """Nomes de todos os templates que os loaders do engine enxergam."""
+    names = set()
+    loaders = list(engine.engine.template_loaders)
+    while loaders:
+        loader = loaders.pop()
+        loaders.extend(getattr(loader, 'loaders', ())) # O cached loader embrulha os outros
+        for directory in getattr(loader, 'get_dirs', lambda: ())():
+            root = Path(directory)
+            names.update(str(path.relative_to(root)) for path in root.rglob('*.html'))
+    return sorted(names)
+
+
+def warm_urls():
+    from django.urls import get_resolver, reverse
+
+    resolver = get_resolver()
+    resolver.url_patterns # Importa o urlconf e, com ele, as views
+    reverse('home') # Monta os dicionários de reverse
+    return len(resolver.reverse_dict)
+
+
+def warm_templates():
+    from django.template import engines
+
+    compiled = 0
+    for engine in engines.all():
+        for name in template_names(engine):
+            engine.get_template(name)
+            compiled += 1
+    return compiled
+
+
+def connect():
+    """Abre as conexões persistentes do processo (no worker, depois do fork). Retorna quantas."""
+    from django.db import connections
+
+    # Com CONN_MAX_AGE = 0 e sem pool a conexão fecharia no começo da primeira requisição
+    persistent = [c for c in connections.all() if c.settings_dict['CONN_MAX_AGE'] or c.settings_dict['OPTIONS'].get('pool')]
+    for connection in persistent:
+        connection.ensure_connection()
+    return len(persistent)
+
+
+def warm(database=True):
+    """Aquece URLs, templates e (opcional) o banco. Retorna {etapa: (itens, ms)}."""
+    steps = [('urls', warm_urls), ('templates', warm_templates)]
+    if database:
+        steps.append(('database', connect))
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        timings[name] = (step(), _elapsed(started))
+    return timings
+
+
+def probe(paths, username=None, warmup=False, repeat=2):
+    """Mede um processo novo: setup do Django, urlconf, aquecimento e as primeiras requisições."""
+    started = time.perf_counter()
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    django.setup()
+    result = {'pid': os.getpid(), 'setup_ms': _elapsed(started)}
+
+    started = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+
+    get_wsgi_application() # Carrega os middlewares, como o worker
+    warm_urls()
+    result['import_ms'] = _elapsed(started)
+    if warmup:
+        result['warmup'] = warm()
+
+    from django.test import Client
+
+    client = Client()
+    if username:
+        from .models import User
+
+        client.force_login(User.objects.get(username=username))
+    result['requests'] = {}
+    for path in paths:
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(path)
+            response.getvalue() # Lê o corpo inteiro, inclusive em streaming
+            latencies.append(_elapsed(started))
+        result['requests'][path] = {'status': response.status_code, 'ms': latencies}
+    return result
+
+
+if __name__ == '__main__':
+    # Filho do startup_benchmark: argumentos e resultado em JSON
+    print(json.dumps(probe(**json.loads(sys.argv[1]))))